@@ -1,59 +1,177 @@
 from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
+from bson.codec_options import CodecOptions
+from bson.raw_bson import RawBSONDocument
+import asyncio
+import logging
 import os
 from typing import Optional
 
+from pymongo.errors import ConnectionFailure, PyMongoError
+
+from memory_store import MemoryDatabase
+
+logger = logging.getLogger(__name__)
+
 class Database:
     client: Optional[AsyncIOMotorClient] = None
     database: Optional[AsyncIOMotorDatabase] = None
+    ready: bool = False
+    error: Optional[str] = None
 
 db = Database()
 
+def _memory_backend() -> bool:
+    return os.environ.get('STORAGE_BACKEND', 'mongo').lower() == 'memory'
+
 async def get_database() -> AsyncIOMotorDatabase:
+    if db.database is None and _memory_backend():
+        # Scripts and tests that skip the lifespan get an indexed in-memory store
+        db.database = MemoryDatabase(os.environ.get('DB_NAME') or 'virtual_studio')
+        await create_indexes()
     return db.database
 
-async def connect_to_mongo():
-    """Create database connection"""
-    mongo_url = os.environ.get('MONGO_URL')
-    db_name = os.environ.get('DB_NAME', 'virtual_studio')
+def _int_env(name: str, default: Optional[int]) -> Optional[int]:
+    value = os.environ.get(name)
+    return int(value) if value else default
+
+# Raw reads: documents stay as the driver's BSON buffers until the response encodes them
+RAW_CODEC_OPTIONS = CodecOptions(document_class=RawBSONDocument)
+RAW_BATCH_SIZE = _int_env('MONGO_RAW_BATCH_SIZE', 1000)
+
+def raw_collection(name: str):
+    """Collection returning RawBSONDocument (Mongo only; None on the in-memory backend)"""
+    if db.client is None or db.database is None:
+        return None
+    return db.database.get_collection(name, codec_options=RAW_CODEC_OPTIONS)
+
+def raw_find(name: str, query: dict, projection: Optional[dict] = None):
+    """RawBSONDocument cursor sized to fetch a room's listing in one batch, or None (in-memory backend)"""
+    collection = raw_collection(name)
+    if collection is None:
+        return None
+    return collection.find(query, projection).batch_size(RAW_BATCH_SIZE)
+
+async def connect_to_mongo() -> AsyncIOMotorDatabase:
+    """
+    Create the process-wide client (the driver connects lazily; warm_up() opens
+    the pool). Settings come from the environment:
+    MONGO_URL / MONGO_URI, DB_NAME (default: the URI's database, else virtual_studio),
+    MONGO_MAX_POOL_SIZE, MONGO_MIN_POOL_SIZE, MONGO_MAX_IDLE_TIME_MS,
+    MONGO_CONNECT_TIMEOUT_MS, MONGO_SERVER_SELECTION_TIMEOUT_MS, MONGO_SOCKET_TIMEOUT_MS.
+    STORAGE_BACKEND=memory uses the in-memory store instead (single node, tests):
+    same collection API and indexes, nothing persisted.
+    """
+    db.ready = False
+    db.error = None
+    if _memory_backend():
+        db.client = None
+        db.database = MemoryDatabase(os.environ.get('DB_NAME') or 'virtual_studio')
+        return db.database
     
-    db.client = AsyncIOMotorClient(mongo_url)
-    db.database = db.client[db_name]
+    mongo_url = os.environ.get('MONGO_URL') or os.environ.get('MONGO_URI') or 'mongodb://localhost:27017'
     
-    # Create indexes for performance
-    await create_indexes()
+    db.client = AsyncIOMotorClient(
+        mongo_url,
+        maxPoolSize=_int_env('MONGO_MAX_POOL_SIZE', 100),
+        minPoolSize=_int_env('MONGO_MIN_POOL_SIZE', 10),
+        maxIdleTimeMS=_int_env('MONGO_MAX_IDLE_TIME_MS', 300000),
+        connectTimeoutMS=_int_env('MONGO_CONNECT_TIMEOUT_MS', 5000),
+        serverSelectionTimeoutMS=_int_env('MONGO_SERVER_SELECTION_TIMEOUT_MS', 5000),
+        socketTimeoutMS=_int_env('MONGO_SOCKET_TIMEOUT_MS', None),
+    )
+    db_name = os.environ.get('DB_NAME')
+    if db_name:
+        db.database = db.client[db_name]
+    else:
+        db.database = db.client.get_default_database('virtual_studio')
+    return db.database
+
+async def warm_up(retry_seconds: float = 2.0):
+    """
+    Open min-pool-size connections with concurrent pings, then create the
+    indexes; retries while the server is unreachable (ConnectionFailure covers
+    server selection and network timeouts). Any other error (a failing index
+    build, bad credentials) will not fix itself: it is logged, kept in db.error
+    and db.ready stays False, so /ready reports it. db.ready flips only at the end.
+    """
+    if db.client is None:
+        await create_indexes()
+        db.ready = True
+        logger.info("In-memory storage ready", extra={"fields": {"database": db.database.name}})
+        return
+    connections = max(1, db.client.options.pool_options.min_pool_size)
+    while True:
+        try:
+            await asyncio.gather(*[db.client.admin.command('ping') for _ in range(connections)])
+            await create_indexes()
+            break
+        except ConnectionFailure as e:
+            db.error = str(e)
+            logger.warning("MongoDB not ready, retrying", extra={"fields": {"error": db.error}})
+            await asyncio.sleep(retry_seconds)
+        except PyMongoError as e:
+            db.error = str(e)
+            logger.error("MongoDB setup failed", extra={"fields": {"error": db.error}})
+            return
+    db.ready = True
+    db.error = None
+    logger.info("MongoDB pool warm", extra={"fields": {"connections": connections, "database": db.database.name}})
 
 async def close_mongo_connection():
     """Close database connection"""
+    db.ready = False
     if db.client:
         db.client.close()
 
 async def create_indexes():
     """Create database indexes for optimal performance"""
-    if not db.database:
+    if db.database is None:
         return
     
     # Rooms collection indexes
+    await db.database.rooms.create_index("id", unique=True)
     await db.database.rooms.create_index("invite_code", unique=True)
     await db.database.rooms.create_index("director_id")
     await db.database.rooms.create_index("status")
     
     # Participants collection indexes
-    await db.database.participants.create_index("room_id")
+    await db.database.participants.create_index("id", unique=True)
+    await db.database.participants.create_index([("room_id", 1), ("id", 1)])
     await db.database.participants.create_index([("room_id", 1), ("name", 1)])
     
     # Audio sources collection indexes
+    await db.database.audio_sources.create_index("id", unique=True)
     await db.database.audio_sources.create_index("room_id")
     await db.database.audio_sources.create_index("participant_id")
     
     # Video sources collection indexes
+    await db.database.video_sources.create_index("id", unique=True)
     await db.database.video_sources.create_index("room_id")
     await db.database.video_sources.create_index("participant_id")
     
     # Routes collection indexes
+    await db.database.routes.create_index("id", unique=True)
     await db.database.routes.create_index("room_id")
     await db.database.routes.create_index("source_id")
+    await db.database.routes.create_index("destinations")  # multikey
+    
+    # Routing graph documents (one per room)
+    await db.database.routing_graphs.create_index("room_id", unique=True)
+    
+    # Routing matrix epoch, version and patch history (one per room, shared by all workers)
+    await db.database.matrix_state.create_index("room_id", unique=True)
+    
+    # MIDI devices collection indexes
+    await db.database.midi_devices.create_index("id", unique=True)
+    await db.database.midi_devices.create_index("room_id")
+    
+    # Users collection indexes (login by email or name)
+    await db.database.users.create_index("id", unique=True)
+    await db.database.users.create_index("email")
+    await db.database.users.create_index("name")
     
     # Sessions collection indexes
+    await db.database.sessions.create_index("id", unique=True)
     await db.database.sessions.create_index("room_id", unique=True)
     
     # Signaling collection indexes (for WebRTC)
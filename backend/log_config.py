@@ -0,0 +1,60 @@
+import logging
+import logging.handlers
+import os
+import queue
+from typing import Optional
+
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s%(fields)s'
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+class StructuredFormatter(logging.Formatter):
+    """Añade el extra `fields` del registro como pares clave=valor"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        fields = getattr(record, "fields", None)
+        record.fields = "".join(f" {key}={value}" for key, value in fields.items()) if fields else ""
+        return super().format(record)
+
+
+def setup_logging(level: Optional[str] = None):
+    """
+    Envía todo el logging a través de un QueueHandler: el event loop solo
+    encola los registros y un hilo en segundo plano hace la escritura
+    bloqueante a stdout.
+    """
+    global _listener
+    if _listener is not None:
+        return
+
+    handler = logging.StreamHandler()
+    handler.setFormatter(StructuredFormatter(LOG_FORMAT))
+
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    root = logging.getLogger()
+    root.handlers[:] = [logging.handlers.QueueHandler(log_queue)]
+    root.setLevel(level or os.environ.get("LOG_LEVEL", "INFO").upper())
+
+    _listener = logging.handlers.QueueListener(log_queue, handler, respect_handler_level=True)
+    _listener.start()
+
+
+def shutdown_logging():
+    """Vacía los registros pendientes y detiene el hilo de escritura"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+class LogSampler:
+    """Deja pasar una de cada `every` llamadas, para las líneas de debug por mensaje"""
+
+    def __init__(self, every: int = 100):
+        self.every = max(1, every)
+        self._count = 0
+
+    def __call__(self) -> bool:
+        self._count += 1
+        return self._count % self.every == 1 or self.every == 1
@@ -1,7 +1,10 @@
+import asyncio
 import os
+from contextlib import asynccontextmanager
 from pathlib import Path
 from dotenv import load_dotenv
 from fastapi import FastAPI
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 import socketio
 
@@ -9,15 +12,61 @@ import socketio
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / ".env")
 
+# ---- Logging: cola no bloqueante, nivel con LOG_LEVEL ----
+from log_config import setup_logging, shutdown_logging
+setup_logging()
+
 # ---- Import API routers ----
+import database
+from responses import FastJSONResponse
 from routes import api_router  # import desde __init__.py de routes
-from services import sio_manager  # nuestro SocketManager global
+from services import sio_manager, ice_coalescer  # nuestro SocketManager global
+from services.sfu_service import sfu_service
+from services.mixer_engine import mixer_engine
+from services.metering import metering_service
+from services.control_channel import control_channel
+from services.midi_service import midi_service
+from services.routing_matrix import routing_matrix
+from services.audio_service import audio_service
+from services.video_service import video_service
+from services.room_service import room_service
+from services.routing_service import routing_service
+from services.session_service import session_service
+
+# ---- Ciclo de vida ----
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Startup: un único cliente Mongo para todo el proceso, compartido por los servicios;
+    # el pool se calienta (y se crean los índices) en segundo plano, /ready espera a que termine
+    mongo = await database.connect_to_mongo()
+    for service in (audio_service, video_service, room_service, routing_service, session_service, midi_service):
+        service.db = mongo
+    warm_up = asyncio.create_task(database.warm_up())
+    # Conecta el backplane de señalización (si SIGNALING_BACKPLANE_URL está definido)
+    await sio_manager.start()
+    mixer_engine.start()  # solo si MIXER_ENABLED
+    if mixer_engine.enabled:
+        metering_service.start()
+    control_channel.start()
+    yield
+    # Shutdown
+    await mixer_engine.stop()
+    await metering_service.stop()
+    await control_channel.stop()  # último flush de faders pendientes
+    await sfu_service.stop()
+    await sio_manager.stop()
+    warm_up.cancel()
+    await asyncio.gather(warm_up, return_exceptions=True)
+    await database.close_mongo_connection()
+    shutdown_logging()
 
 # ---- FastAPI config ----
 app = FastAPI(
     title="EMVID API",
     description="Backend para videoconferencias y streaming",
     version="1.0.0",
+    lifespan=lifespan,
+    default_response_class=FastJSONResponse,  # orjson para todas las respuestas
 )
 
 # ---- CORS ----
@@ -43,6 +92,15 @@ sio = socketio.AsyncServer(
     cors_allowed_origins=origins,
 )
 asgi_app = socketio.ASGIApp(sio, other_asgi_app=app)
+sio_manager.attach(sio)
+sfu_service.attach(sio_manager)
+metering_service.attach(sio_manager)
+control_channel.attach(sio_manager)
+routing_matrix.attach(sio_manager)
+mixer_engine.add_listener(metering_service.on_mix)
+sio_manager.add_expiry_listener(routing_matrix.remove_room)
+sio_manager.add_expiry_listener(mixer_engine.remove_room)
+sio_manager.add_expiry_listener(metering_service.remove_room)
 
 # ---- Socket.IO events ----
 @sio.event
@@ -51,29 +109,72 @@ async def connect(sid, environ):
 
 @sio.event
 async def disconnect(sid):
+    await sfu_service.leave(sid)
     await sio_manager.on_disconnect(sid)
 
 @sio.event
 async def join_room(sid, data):
     await sio_manager.join_room(sid, data["room_id"])
+    # Por encima de SFU_MESH_LIMIT miembros el cliente publica una sola vez al backend
+    mode = sfu_service.media_mode(sio_manager.room_member_count(data["room_id"]))
+    await sio.emit("media-mode", {"room_id": data["room_id"], "mode": mode}, to=sid)
+    # Orden de canales de los frames "meters" de la sala (si el mezclador la está procesando)
+    await metering_service.send_layout(data["room_id"], sid)
+
+@sio.event
+async def leave_room(sid, data):
+    await sio_manager.leave_room(sid, data["room_id"])
 
 @sio.event
 async def offer(sid, data):
-    await sio_manager.forward_to_peer("offer", data)
+    await ice_coalescer.flush_room(data.get("room_id"))
+    await sio_manager.forward_to_peer("offer", data, sender_sid=sid)
 
 @sio.event
 async def answer(sid, data):
-    await sio_manager.forward_to_peer("answer", data)
+    await ice_coalescer.flush_room(data.get("room_id"))
+    await sio_manager.forward_to_peer("answer", data, sender_sid=sid)
 
 @sio.event
 async def ice_candidate(sid, data):
-    await sio_manager.forward_to_peer("ice-candidate", data)
+    await ice_coalescer.add(data, sender_sid=sid)
+
+# ---- SFU (opcional, SFU_ENABLED=1 y aiortc instalado) ----
+# Los handlers devuelven el SDP como ack del evento
+@sio.event
+async def control(sid, data):
+    # Faders/MIDI: se aplica en memoria y se difunde al instante, Mongo se actualiza por lotes
+    return await control_channel.handle(sid, data)
+
+@sio.event
+async def midi(sid, data):
+    # MIDI crudo en lote (bytes o [[status, data1, data2], ...]) evaluado con los mapeos de la sala
+    return await midi_service.handle(sid, data)
+
+@sio.event
+async def sfu_publish(sid, data):
+    return await sfu_service.publish(data["room_id"], data["participant_id"], sid, data["offer"])
+
+@sio.event
+async def sfu_subscribe(sid, data):
+    return await sfu_service.subscribe(data["room_id"], data["participant_id"], sid)
+
+@sio.event
+async def sfu_answer(sid, data):
+    await sfu_service.accept_answer(sid, data["answer"])
 
 # ---- Healthcheck ----
 @app.get("/health")
 async def health():
     return {"status": "ok"}
 
+# Listo para tráfico solo con el pool de Mongo caliente y los índices creados
+@app.get("/ready")
+async def ready():
+    if not database.db.ready:
+        return JSONResponse(status_code=503, content={"status": "starting", "error": database.db.error})
+    return {"status": "ready"}
+
 # ---- Run local (solo desarrollo) ----
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,579 @@
+"""
+In-memory storage backend (STORAGE_BACKEND=memory).
+
+Implements the part of Motor's database/collection API the services use
+(find/find_one/insert/update/delete/find_one_and_*, bulk_write, aggregate
+with $match/$limit/$lookup/$project, create_index), so the services run
+unchanged on a single node or in fast tests without a MongoDB server.
+
+Every create_index() builds a hash index on the index's first field (array
+values are indexed per element, like a multikey index); queries with an
+equality or $in on an indexed field only look at the matching documents, so
+lookups by id, room_id, participant_id, invite_code or email cost O(result)
+instead of a scan. Unique indexes raise DuplicateKeyError as Mongo would.
+"""
+
+import asyncio
+import copy
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from bson import ObjectId
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from pymongo.results import BulkWriteResult, DeleteResult, InsertManyResult, InsertOneResult, UpdateResult
+
+_MISSING = object()
+
+
+def _get(document: dict, path: str):
+    value = document
+    for part in path.split("."):
+        if isinstance(value, dict):
+            value = value.get(part, _MISSING)
+        else:
+            return _MISSING
+        if value is _MISSING:
+            return _MISSING
+    return value
+
+
+def _hashable(value):
+    try:
+        hash(value)
+        return True
+    except TypeError:
+        return False
+
+
+# ---- Expressions ($expr, pipeline updates) ----
+def evaluate(expression, document: dict):
+    if isinstance(expression, str):
+        if expression == "$$NOW":
+            return datetime.utcnow()
+        if expression.startswith("$"):
+            value = _get(document, expression[1:])
+            return None if value is _MISSING else value
+        return expression
+    if isinstance(expression, list):
+        return [evaluate(item, document) for item in expression]
+    if not isinstance(expression, dict) or len(expression) != 1 or not next(iter(expression)).startswith("$"):
+        return expression if not isinstance(expression, dict) else \
+            {key: evaluate(value, document) for key, value in expression.items()}
+
+    (operator, args), = expression.items()
+    if operator == "$literal":
+        return args
+    values = [evaluate(arg, document) for arg in args] if isinstance(args, list) else [evaluate(args, document)]
+    if operator == "$not":
+        return not values[0]
+    if operator == "$ifNull":
+        return next((value for value in values[:-1] if value is not None), values[-1])
+    if operator == "$cond":
+        if isinstance(args, dict):
+            return evaluate(args["then"] if evaluate(args["if"], document) else args["else"], document)
+        return values[1] if values[0] else values[2]
+    if operator == "$size":
+        return len(values[0])
+    if operator == "$and":
+        return all(values)
+    if operator == "$or":
+        return any(values)
+    if operator in _COMPARISONS:
+        return _compare(operator, values[0], values[1])
+    raise NotImplementedError(f"Expression operator {operator} is not supported by the memory backend")
+
+
+_COMPARISONS = {"$eq", "$ne", "$gt", "$gte", "$lt", "$lte"}
+
+
+def _compare(operator: str, left, right) -> bool:
+    if operator == "$eq":
+        return left == right
+    if operator == "$ne":
+        return left != right
+    try:
+        if operator == "$gt":
+            return left > right
+        if operator == "$gte":
+            return left >= right
+        if operator == "$lt":
+            return left < right
+        return left <= right
+    except TypeError:
+        return False
+
+
+# ---- Query matching ----
+def _equals(value, expected) -> bool:
+    if isinstance(value, list) and not isinstance(expected, list):
+        return expected in value
+    return value == expected
+
+
+def _match_field(value, condition) -> bool:
+    if isinstance(condition, dict) and condition and all(key.startswith("$") for key in condition):
+        present = value is not _MISSING
+        value = None if value is _MISSING else value
+        for operator, argument in condition.items():
+            if operator == "$in":
+                if not any(_equals(value, item) for item in argument):
+                    return False
+            elif operator == "$nin":
+                if any(_equals(value, item) for item in argument):
+                    return False
+            elif operator == "$ne":
+                if _equals(value, argument):
+                    return False
+            elif operator == "$exists":
+                if present != bool(argument):
+                    return False
+            elif operator in _COMPARISONS:
+                if not _compare(operator, value, argument):
+                    return False
+            else:
+                raise NotImplementedError(f"Query operator {operator} is not supported by the memory backend")
+        return True
+    return _equals(None if value is _MISSING else value, condition)
+
+
+def matches(document: dict, query: Optional[dict]) -> bool:
+    for key, condition in (query or {}).items():
+        if key == "$or":
+            if not any(matches(document, branch) for branch in condition):
+                return False
+        elif key == "$and":
+            if not all(matches(document, branch) for branch in condition):
+                return False
+        elif key == "$expr":
+            if not evaluate(condition, document):
+                return False
+        elif not _match_field(_get(document, key), condition):
+            return False
+    return True
+
+
+def project(document: dict, projection: Optional[dict]) -> dict:
+    if not projection:
+        return document
+    include = {key for key, value in projection.items() if value and key != "_id"}
+    if include:
+        result = {key: document[key] for key in include if key in document}
+        if projection.get("_id", 1) and "_id" in document:
+            result["_id"] = document["_id"]
+        return result
+    result = dict(document)
+    for key, value in projection.items():
+        if not value:
+            if "." in key:
+                field, subfield = key.split(".", 1)
+                if isinstance(result.get(field), list):
+                    result[field] = [{k: v for k, v in item.items() if k != subfield} if isinstance(item, dict)
+                                     else item for item in result[field]]
+            else:
+                result.pop(key, None)
+    return result
+
+
+# ---- Updates ----
+def apply_update(document: dict, update) -> dict:
+    """New version of document after an update document or an aggregation-pipeline update"""
+    document = copy.deepcopy(document)
+    if isinstance(update, list):
+        for stage in update:
+            (operator, fields), = stage.items()
+            if operator in ("$set", "$addFields"):
+                values = {key: evaluate(value, document) for key, value in fields.items()}
+                document.update(values)
+            elif operator == "$unset":
+                for key in [fields] if isinstance(fields, str) else fields:
+                    document.pop(key, None)
+            else:
+                raise NotImplementedError(f"Pipeline stage {operator} is not supported by the memory backend")
+        return document
+
+    for operator, fields in update.items():
+        for key, value in fields.items():
+            if operator == "$set":
+                document[key] = copy.deepcopy(value)
+            elif operator == "$unset":
+                document.pop(key, None)
+            elif operator == "$inc":
+                document[key] = document.get(key, 0) + value
+            elif operator == "$push":
+                items = list(document.get(key) or [])
+                if isinstance(value, dict) and "$each" in value:
+                    items.extend(copy.deepcopy(value["$each"]))
+                    if "$slice" in value:
+                        items = items[value["$slice"]:] if value["$slice"] < 0 else items[:value["$slice"]]
+                else:
+                    items.append(copy.deepcopy(value))
+                document[key] = items
+            elif operator == "$addToSet":
+                items = list(document.get(key) or [])
+                for item in value["$each"] if isinstance(value, dict) and "$each" in value else [value]:
+                    if item not in items:
+                        items.append(copy.deepcopy(item))
+                document[key] = items
+            elif operator == "$pull":
+                document[key] = [item for item in document.get(key) or []
+                                 if not (_match_field(item, value) if isinstance(value, dict) else item == value)]
+            elif operator == "$setOnInsert":
+                continue
+            else:
+                raise NotImplementedError(f"Update operator {operator} is not supported by the memory backend")
+    return document
+
+
+def _upsert_seed(query: dict, update) -> dict:
+    """Equality fields of the filter, plus $setOnInsert, for an upserted document"""
+    seed = {key: copy.deepcopy(value) for key, value in query.items()
+            if not key.startswith("$") and not (isinstance(value, dict) and any(k.startswith("$") for k in value))}
+    if isinstance(update, dict):
+        seed.update(copy.deepcopy(update.get("$setOnInsert", {})))
+    return seed
+
+
+class MemoryCursor:
+    """Enough of AsyncIOMotorCursor: to_list, async iteration, sort/skip/limit/batch_size"""
+
+    def __init__(self, documents: List[dict]):
+        self._documents = documents
+        self._skip = 0
+        self._limit = 0
+
+    def sort(self, key_or_list, direction: int = 1):
+        keys = [(key_or_list, direction)] if isinstance(key_or_list, str) else list(key_or_list)
+        for key, key_direction in reversed(keys):
+            self._documents.sort(key=lambda document: (_get(document, key) is _MISSING, _get(document, key)),
+                                 reverse=key_direction < 0)
+        return self
+
+    def skip(self, count: int):
+        self._skip = count
+        return self
+
+    def limit(self, count: int):
+        self._limit = count
+        return self
+
+    def batch_size(self, size: int):
+        return self
+
+    def _results(self) -> List[dict]:
+        documents = self._documents[self._skip:]
+        return documents[:self._limit] if self._limit else documents
+
+    async def to_list(self, length: Optional[int] = None) -> List[dict]:
+        documents = self._results()
+        return documents[:length] if length else documents
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for document in self._results():
+            yield document
+
+
+class MemoryCollection:
+    def __init__(self, database: "MemoryDatabase", name: str):
+        self.database = database
+        self.name = name
+        self._documents: "OrderedDict[Any, dict]" = OrderedDict()  # {_id: document}
+        self._indexes: Dict[str, Dict[Any, Set[Any]]] = {}         # {field: {value: {_id}}}
+        self._unique: Dict[str, str] = {}                            # {index name: field}
+
+    # ---- Indexes ----
+    async def create_index(self, keys, unique: bool = False, name: Optional[str] = None, **kwargs) -> str:
+        fields = [keys] if isinstance(keys, str) else [key for key, _ in keys]
+        index_name = name or "_".join(f"{field}_1" for field in fields)
+        field = fields[0]
+        if field not in self._indexes:
+            index: Dict[Any, Set[Any]] = {}
+            for document_id, document in self._documents.items():
+                for value in self._index_values(document, field):
+                    index.setdefault(value, set()).add(document_id)
+            self._indexes[field] = index
+        if unique and len(fields) == 1:
+            self._unique[index_name] = field
+        return index_name
+
+    @staticmethod
+    def _index_values(document: dict, field: str) -> Iterable:
+        value = _get(document, field)
+        if value is _MISSING:
+            return ()
+        values = value if isinstance(value, list) else [value]
+        return [item for item in values if _hashable(item)]
+
+    def _check_unique(self, document: dict, document_id):
+        for index_name, field in self._unique.items():
+            value = _get(document, field)
+            if value is _MISSING or value is None or not _hashable(value):
+                continue
+            if self._indexes[field].get(value, set()) - {document_id}:
+                raise DuplicateKeyError(f"E11000 duplicate key error collection: {self.database.name}.{self.name} "
+                                        f"index: {index_name} dup key: {{ {field}: {value!r} }}")
+
+    def _index(self, document_id, document: dict):
+        for field, index in self._indexes.items():
+            for value in self._index_values(document, field):
+                index.setdefault(value, set()).add(document_id)
+
+    def _unindex(self, document_id, document: dict):
+        for field, index in self._indexes.items():
+            for value in self._index_values(document, field):
+                ids = index.get(value)
+                if ids is not None:
+                    ids.discard(document_id)
+                    if not ids:
+                        del index[value]
+
+    def _candidates(self, query: Optional[dict]) -> Iterable:
+        """_ids worth matching: the smallest indexed equality/$in lookup in the filter, else every document"""
+        best = None
+        for key, condition in (query or {}).items():
+            index = self._indexes.get(key)
+            if index is None:
+                continue
+            if isinstance(condition, dict) and set(condition) == {"$in"}:
+                values = condition["$in"]
+            elif isinstance(condition, dict) and any(operator.startswith("$") for operator in condition):
+                continue
+            else:
+                values = [condition]
+            if not all(_hashable(value) for value in values):
+                continue
+            ids: Set[Any] = set()
+            for value in values:
+                ids |= index.get(value, set())
+            if best is None or len(ids) < len(best):
+                best = ids
+        if best is None:
+            return list(self._documents)
+        # Insertion order, like a natural-order scan, without walking the collection
+        return sorted(best, key=lambda document_id: self._documents[document_id]["_position"])
+
+    def _matching(self, query: Optional[dict]) -> List[Any]:
+        return [document_id for document_id in self._candidates(query)
+                if matches(self._documents[document_id], query)]
+
+    def _store(self, document_id, document: dict, previous: Optional[dict] = None):
+        self._check_unique(document, document_id)
+        if previous is not None:
+            self._unindex(document_id, previous)
+        self._documents[document_id] = document
+        self._index(document_id, document)
+
+    def _public(self, document: dict, projection: Optional[dict] = None) -> dict:
+        document = {key: value for key, value in document.items() if key != "_position"}
+        return copy.deepcopy(project(document, projection))
+
+    # ---- Reads ----
+    def find(self, query: Optional[dict] = None, projection: Optional[dict] = None, **kwargs) -> MemoryCursor:
+        return MemoryCursor([self._public(self._documents[document_id], projection)
+                             for document_id in self._matching(query)])
+
+    async def find_one(self, query: Optional[dict] = None, projection: Optional[dict] = None, **kwargs):
+        for document_id in self._candidates(query):
+            document = self._documents[document_id]
+            if matches(document, query):
+                return self._public(document, projection)
+        return None
+
+    async def count_documents(self, query: dict, **kwargs) -> int:
+        return len(self._matching(query))
+
+    # ---- Writes ----
+    def _prepare(self, document: dict) -> dict:
+        if "_id" not in document:
+            document["_id"] = ObjectId()  # the driver sets _id on the caller's document too
+        stored = copy.deepcopy(document)
+        self.database.inserts += 1
+        stored["_position"] = self.database.inserts
+        return stored
+
+    async def insert_one(self, document: dict, **kwargs) -> InsertOneResult:
+        stored = self._prepare(document)
+        if stored["_id"] in self._documents:
+            raise DuplicateKeyError(f"E11000 duplicate key error collection: {self.name} index: _id_")
+        self._store(stored["_id"], stored)
+        return InsertOneResult(stored["_id"], True)
+
+    async def insert_many(self, documents: List[dict], ordered: bool = True, **kwargs) -> InsertManyResult:
+        inserted = []
+        for document in documents:
+            inserted.append((await self.insert_one(document)).inserted_id)
+        return InsertManyResult(inserted, True)
+
+    async def replace_one(self, query: dict, replacement: dict, upsert: bool = False, **kwargs) -> UpdateResult:
+        ids = self._matching(query)[:1]
+        if ids:
+            previous = self._documents[ids[0]]
+            stored = copy.deepcopy(replacement)
+            stored["_id"], stored["_position"] = previous["_id"], previous["_position"]
+            self._store(ids[0], stored, previous)
+            return UpdateResult({"n": 1, "nModified": 1}, True)
+        if upsert:
+            stored = self._prepare({**_upsert_seed(query, {}), **replacement})
+            self._store(stored["_id"], stored)
+            return UpdateResult({"n": 0, "nModified": 0, "upserted": stored["_id"]}, True)
+        return UpdateResult({"n": 0, "nModified": 0}, True)
+
+    def _update_ids(self, ids: List[Any], update) -> int:
+        modified = 0
+        for document_id in ids:
+            previous = self._documents[document_id]
+            document = apply_update(previous, update)
+            if document != previous:
+                self._store(document_id, document, previous)
+                modified += 1
+        return modified
+
+    def _upsert(self, query: dict, update) -> dict:
+        seed = self._prepare(_upsert_seed(query, update))
+        document = apply_update(seed, update)
+        self._store(document["_id"], document)
+        return document
+
+    async def update_one(self, query: dict, update, upsert: bool = False, **kwargs) -> UpdateResult:
+        ids = self._matching(query)[:1]
+        if not ids and upsert:
+            document = self._upsert(query, update)
+            return UpdateResult({"n": 0, "nModified": 0, "upserted": document["_id"]}, True)
+        return UpdateResult({"n": len(ids), "nModified": self._update_ids(ids, update)}, True)
+
+    async def update_many(self, query: dict, update, upsert: bool = False, **kwargs) -> UpdateResult:
+        ids = self._matching(query)
+        if not ids and upsert:
+            document = self._upsert(query, update)
+            return UpdateResult({"n": 0, "nModified": 0, "upserted": document["_id"]}, True)
+        return UpdateResult({"n": len(ids), "nModified": self._update_ids(ids, update)}, True)
+
+    async def find_one_and_update(self, query: dict, update, projection: Optional[dict] = None,
+                                  upsert: bool = False, return_document: bool = ReturnDocument.BEFORE, **kwargs):
+        ids = self._matching(query)[:1]
+        if not ids:
+            if not upsert:
+                return None
+            document = self._upsert(query, update)
+            return self._public(document, projection) if return_document == ReturnDocument.AFTER else None
+        previous = self._documents[ids[0]]
+        self._update_ids(ids, update)
+        document = self._documents[ids[0]] if return_document == ReturnDocument.AFTER else previous
+        return self._public(document, projection)
+
+    async def find_one_and_delete(self, query: dict, projection: Optional[dict] = None, **kwargs):
+        ids = self._matching(query)[:1]
+        if not ids:
+            return None
+        document = self._documents.pop(ids[0])
+        self._unindex(ids[0], document)
+        return self._public(document, projection)
+
+    async def delete_one(self, query: dict, **kwargs) -> DeleteResult:
+        ids = self._matching(query)[:1]
+        return DeleteResult({"n": self._delete(ids)}, True)
+
+    async def delete_many(self, query: dict, **kwargs) -> DeleteResult:
+        return DeleteResult({"n": self._delete(self._matching(query))}, True)
+
+    def _delete(self, ids: List[Any]) -> int:
+        for document_id in ids:
+            self._unindex(document_id, self._documents.pop(document_id))
+        return len(ids)
+
+    async def bulk_write(self, requests: list, ordered: bool = True, **kwargs) -> BulkWriteResult:
+        """UpdateOne/UpdateMany/DeleteOne/DeleteMany/InsertOne/ReplaceOne request objects"""
+        matched = modified = deleted = inserted = 0
+        for request in requests:
+            kind = type(request).__name__
+            document = getattr(request, "_doc", None)
+            query = getattr(request, "_filter", None)
+            upsert = bool(getattr(request, "_upsert", False))
+            if kind == "InsertOne":
+                await self.insert_one(document)
+                inserted += 1
+            elif kind in ("UpdateOne", "UpdateMany"):
+                result = await (self.update_one if kind == "UpdateOne" else self.update_many)(query, document,
+                                                                                           upsert=upsert)
+                matched += result.matched_count
+                modified += result.modified_count
+            elif kind == "ReplaceOne":
+                result = await self.replace_one(query, document, upsert=upsert)
+                matched += result.matched_count
+            elif kind in ("DeleteOne", "DeleteMany"):
+                result = await (self.delete_one if kind == "DeleteOne" else self.delete_many)(query)
+                deleted += result.deleted_count
+            else:
+                raise NotImplementedError(f"Bulk request {kind} is not supported by the memory backend")
+        return BulkWriteResult({"nInserted": inserted, "nMatched": matched, "nModified": modified,
+                                "nRemoved": deleted, "nUpserted": 0, "upserted": []}, True)
+
+    # ---- Aggregation ----
+    def aggregate(self, pipeline: List[dict], **kwargs) -> MemoryCursor:
+        stages = list(pipeline)
+        # A leading $match uses the indexes like find() does
+        if stages and "$match" in stages[0]:
+            documents = [self._public(self._documents[document_id])
+                         for document_id in self._matching(stages.pop(0)["$match"])]
+        else:
+            documents = [self._public(document) for document in self._documents.values()]
+
+        for stage in stages:
+            (operator, argument), = stage.items()
+            if operator == "$match":
+                documents = [document for document in documents if matches(document, argument)]
+            elif operator == "$limit":
+                documents = documents[:argument]
+            elif operator == "$skip":
+                documents = documents[argument:]
+            elif operator == "$project":
+                documents = [project(document, argument) for document in documents]
+            elif operator == "$lookup":
+                foreign = self.database[argument["from"]]
+                for document in documents:
+                    value = _get(document, argument["localField"])
+                    value = None if value is _MISSING else value
+                    query = {argument["foreignField"]: {"$in": value} if isinstance(value, list) else value}
+                    document[argument["as"]] = [foreign._public(foreign._documents[document_id])
+                                                for document_id in foreign._matching(query)]
+            else:
+                raise NotImplementedError(f"Aggregation stage {operator} is not supported by the memory backend")
+        return MemoryCursor(documents)
+
+
+class MemoryDatabase:
+    """Collections are created on first access, like Motor's"""
+
+    def __init__(self, name: str = "virtual_studio"):
+        self.name = name
+        self.client = None  # no sessions/transactions (JOIN_TRANSACTIONS needs MongoDB)
+        self.inserts = 0
+        self._collections: Dict[str, MemoryCollection] = {}
+
+    def __getitem__(self, name: str) -> MemoryCollection:
+        collection = self._collections.get(name)
+        if collection is None:
+            collection = self._collections[name] = MemoryCollection(self, name)
+        return collection
+
+    def __getattr__(self, name: str) -> MemoryCollection:
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return self[name]
+
+    async def list_collection_names(self, **kwargs) -> List[str]:
+        return list(self._collections)
+
+    async def drop_collection(self, name: str, **kwargs):
+        self._collections.pop(name, None)
+
+    async def command(self, command, **kwargs) -> dict:
+        name = command if isinstance(command, str) else next(iter(command))
+        if name == "ping":
+            await asyncio.sleep(0)
+            return {"ok": 1.0}
+        raise NotImplementedError(f"Command {name} is not supported by the memory backend")
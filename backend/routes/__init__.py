@@ -4,6 +4,7 @@ from fastapi import APIRouter
 # Importar todos los routers individuales
 from .audio_routes import router as audio_router
 from .auth_routes import router as auth_router
+from .midi_routes import router as midi_router
 from .room_routes import router as room_router
 from .routing_routes import router as routing_router
 from .session_routes import router as session_router
@@ -19,3 +20,4 @@ api_router.include_router(video_router, prefix="/video")
 api_router.include_router(room_router, prefix="/room")
 api_router.include_router(session_router, prefix="/session")
 api_router.include_router(routing_router, prefix="/routing")
+api_router.include_router(midi_router, prefix="/midi")
@@ -1,19 +1,58 @@
 from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
 from typing import List
 from models import AudioSource, AudioSourceUpdate
 from services.audio_service import audio_service
+from responses import read_response
+from services.mixer_engine import mixer_engine, to_pcm16, wav_stream_header
+from services.room_events import source_changed
+from services.room_service import room_service
+from services.routing_service import OBS_OUTPUTS
 
 router = APIRouter()
 
+OBS_OUTPUT_IDS = {output["id"] for output in OBS_OUTPUTS}
+
 @router.get("/room/{room_id}", response_model=List[AudioSource])
 async def get_audio_sources(room_id: str):
     """Get all audio sources for a room"""
     try:
-        sources = await audio_service.get_audio_sources(room_id)
-        return sources
+        sources = await audio_service.stream_audio_source_documents(room_id)
+        return await read_response(sources)
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
+@router.get("/room/{room_id}/mix/{bus_id}")
+async def stream_mix(room_id: str, bus_id: str):
+    """
+    A mix bus as an endless 48 kHz mono 16-bit WAV stream: obs_main/obs_audio*
+    for an OBS Media Source, or a participant's mix-minus. Silence while nothing
+    is routed to the bus; the stream ends when the room is removed. Unknown
+    rooms and buses that are neither an OBS output nor a member of the room are 404.
+    """
+    if not mixer_engine.enabled:
+        raise HTTPException(status_code=404, detail="Mixer is not enabled")
+    room = await room_service.get_room(room_id)
+    if room is None:
+        raise HTTPException(status_code=404, detail="Room not found")
+    if bus_id not in OBS_OUTPUT_IDS and bus_id not in room.participants:
+        raise HTTPException(status_code=404, detail="Mix bus not found")
+    await mixer_engine.ensure_room(room_id)
+    tap = mixer_engine.open_tap(room_id, bus_id)
+
+    async def body():
+        try:
+            yield wav_stream_header(mixer_engine.sample_rate)
+            while True:
+                block = await tap.read(timeout=2 * mixer_engine.block_seconds)
+                if block is None:
+                    return
+                yield to_pcm16(block).tobytes()
+        finally:
+            mixer_engine.close_tap(tap)
+
+    return StreamingResponse(body(), media_type="audio/wav")
+
 @router.get("/{source_id}", response_model=AudioSource)
 async def get_audio_source(source_id: str):
     """Get specific audio source"""
@@ -32,6 +71,7 @@ async def update_audio_source(source_id: str, update_data: AudioSourceUpdate):
         source = await audio_service.update_audio_source(source_id, update_data)
         if not source:
             raise HTTPException(status_code=404, detail="Audio source not found")
+        await source_changed("audio_sources", source)
         return source
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -43,6 +83,7 @@ async def toggle_mute(source_id: str):
         source = await audio_service.toggle_mute(source_id)
         if not source:
             raise HTTPException(status_code=404, detail="Audio source not found")
+        await source_changed("audio_sources", source)
         return source
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -58,6 +99,7 @@ async def set_volume(source_id: str, volume_data: dict):
         source = await audio_service.set_volume(source_id, volume)
         if not source:
             raise HTTPException(status_code=404, detail="Audio source not found")
+        await source_changed("audio_sources", source)
         return source
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -73,6 +115,7 @@ async def set_gain(source_id: str, gain_data: dict):
         source = await audio_service.set_gain(source_id, gain)
         if not source:
             raise HTTPException(status_code=404, detail="Audio source not found")
+        await source_changed("audio_sources", source)
         return source
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -88,6 +131,7 @@ async def toggle_processing(source_id: str, processing_type: str):
         source = await audio_service.toggle_processing(source_id, processing_type)
         if not source:
             raise HTTPException(status_code=404, detail="Audio source not found")
+        await source_changed("audio_sources", source)
         return source
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
\ No newline at end of file
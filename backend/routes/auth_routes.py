@@ -1,22 +1,30 @@
 from fastapi import APIRouter, HTTPException
+from passlib.context import CryptContext
 from models import User, UserCreate, UserLogin, UserRole
-import uuid
+from database import get_database
 
 router = APIRouter()
 
-# Simple in-memory user store for demo
-# In production, use proper authentication with JWT tokens and password hashing
-users_db = {}
+# Simple user store for demo: the users collection (indexed by id, email and name)
+# In production, use proper authentication with JWT tokens
+
+# Passwords are stored as salted PBKDF2-SHA256 hashes; records written before
+# hashing still hold the plaintext and are rehashed on their next login
+pwd_context = CryptContext(schemes=["pbkdf2_sha256", "plaintext"], deprecated=["plaintext"])
+
+# Never sent back to clients
+PUBLIC_USER_FIELDS = {"_id": 0, "password": 0}
 
 @router.post("/register", response_model=User)
 async def register_user(user_data: UserCreate):
     """Register a new user (director or participant)"""
     
+    db = await get_database()
+    
     # Check if user already exists by email
     if user_data.email:
-        for user in users_db.values():
-            if user.get("email") == user_data.email:
-                raise HTTPException(status_code=400, detail="Email already registered")
+        if await db.users.find_one({"email": user_data.email}, {"_id": 0, "id": 1}):
+            raise HTTPException(status_code=400, detail="Email already registered")
     
     # Create new user
     user = User(
@@ -26,16 +34,15 @@ async def register_user(user_data: UserCreate):
         avatar=f"https://api.dicebear.com/7.x/avataaars/svg?seed={user_data.name}"
     )
     
-    # Store user (in production, hash password and use database)
-    users_db[user.id] = {
+    await db.users.insert_one({
         "id": user.id,
         "name": user.name,
         "email": user.email,
         "role": user.role.value,
         "avatar": user.avatar,
-        "password": user_data.password,  # In production: hash this
+        "password": pwd_context.hash(user_data.password) if user_data.password else None,
         "created_at": user.created_at
-    }
+    })
     
     return user
 
@@ -43,21 +50,13 @@ async def register_user(user_data: UserCreate):
 async def login_user(login_data: UserLogin):
     """Login user (simplified authentication)"""
     
-    # Simple authentication - find user by name or email
-    user_record = None
+    db = await get_database()
     
+    # Simple authentication - find user by email, or by name (for demo purposes)
     if login_data.email:
-        # Login with email
-        for user in users_db.values():
-            if user.get("email") == login_data.email:
-                user_record = user
-                break
+        user_record = await db.users.find_one({"email": login_data.email}, {"_id": 0})
     else:
-        # Login with name (for demo purposes)
-        for user in users_db.values():
-            if user.get("name") == login_data.name:
-                user_record = user
-                break
+        user_record = await db.users.find_one({"name": login_data.name}, {"_id": 0})
     
     if not user_record:
         # For demo purposes, create user if not found
@@ -69,9 +68,14 @@ async def login_user(login_data: UserLogin):
         )
         return await register_user(user_data)
     
-    # In production, verify password hash here
-    if login_data.password and user_record.get("password") != login_data.password:
-        raise HTTPException(status_code=401, detail="Invalid credentials")
+    stored = user_record.pop("password", None)
+    if login_data.password:
+        verified, new_hash = (pwd_context.verify_and_update(login_data.password, stored)
+                              if stored else (False, None))
+        if not verified:
+            raise HTTPException(status_code=401, detail="Invalid credentials")
+        if new_hash:
+            await db.users.update_one({"id": user_record["id"]}, {"$set": {"password": new_hash}})
     
     return User(**user_record)
 
@@ -97,7 +101,8 @@ async def join_room_as_participant(join_data: dict):
 async def get_user(user_id: str):
     """Get user by ID"""
     
-    user_record = users_db.get(user_id)
+    db = await get_database()
+    user_record = await db.users.find_one({"id": user_id}, PUBLIC_USER_FIELDS)
     if not user_record:
         raise HTTPException(status_code=404, detail="User not found")
     
@@ -106,4 +111,5 @@ async def get_user(user_id: str):
 @router.get("/users")
 async def list_users():
     """List all users (for demo purposes)"""
-    return list(users_db.values())
\ No newline at end of file
+    db = await get_database()
+    return await db.users.find({}, PUBLIC_USER_FIELDS).to_list(None)
\ No newline at end of file
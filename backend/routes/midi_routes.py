@@ -0,0 +1,44 @@
+from fastapi import APIRouter, HTTPException
+from typing import List
+from models import MidiDevice, MidiDeviceUpdate
+from services.midi_service import midi_service
+
+router = APIRouter()
+
+@router.get("/room/{room_id}", response_model=List[MidiDevice])
+async def get_midi_devices(room_id: str):
+    """Get all MIDI devices for a room"""
+    try:
+        return await midi_service.get_devices(room_id)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.post("/", response_model=MidiDevice)
+async def create_midi_device(device: MidiDevice):
+    """Register a MIDI device and its mappings"""
+    try:
+        return await midi_service.create_device(device)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.patch("/{device_id}", response_model=MidiDevice)
+async def update_midi_device(device_id: str, update_data: MidiDeviceUpdate):
+    """Update connection state or mappings"""
+    try:
+        device = await midi_service.update_device(device_id, update_data)
+        if not device:
+            raise HTTPException(status_code=404, detail="MIDI device not found")
+        return device
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.delete("/{device_id}")
+async def delete_midi_device(device_id: str):
+    """Delete a MIDI device"""
+    try:
+        success = await midi_service.delete_device(device_id)
+        if not success:
+            raise HTTPException(status_code=404, detail="MIDI device not found")
+        return {"message": "MIDI device deleted successfully"}
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
@@ -2,7 +2,8 @@ from fastapi import APIRouter, HTTPException, Depends
 from typing import List
 from models import Room, RoomCreate, RoomJoin, RoomResponse, Participant
 from services.room_service import room_service
-from services.routing_service import routing_service
+from services.room_events import participant_left, room_changed, room_removed
+from responses import FastJSONResponse, read_response
 
 router = APIRouter()
 
@@ -19,8 +20,8 @@ async def create_room(room_data: RoomCreate, director_id: str = "default_directo
 async def get_rooms(director_id: str = "default_director"):
     """Get all rooms for a director"""
     try:
-        rooms = await room_service.get_rooms(director_id)
-        return rooms
+        rooms = await room_service.get_room_documents(director_id)
+        return FastJSONResponse(rooms)
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
@@ -28,10 +29,10 @@ async def get_rooms(director_id: str = "default_director"):
 async def get_room_details(room_id: str):
     """Get complete room details"""
     try:
-        room_details = await room_service.get_room_details(room_id)
+        room_details = await room_service.stream_room_details(room_id)
         if not room_details:
             raise HTTPException(status_code=404, detail="Room not found")
-        return room_details
+        return await read_response(room_details)
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
@@ -57,11 +58,8 @@ async def join_room(join_data: RoomJoin):
         if not participant:
             raise HTTPException(status_code=404, detail="Room not found")
         
-        # Auto-create routes for the new participant
-        await routing_service.auto_route_participant(
-            participant.room_id,
-            participant.id
-        )
+        # Sources and default routes were created with the participant
+        await room_changed(participant.room_id)
         
         return participant
     except ValueError as e:
@@ -76,6 +74,7 @@ async def leave_room(room_id: str, participant_id: str):
         success = await room_service.leave_room(room_id, participant_id)
         if not success:
             raise HTTPException(status_code=404, detail="Participant not found in room")
+        await participant_left(room_id, participant_id)
         return {"message": "Participant removed from room"}
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -87,6 +86,7 @@ async def delete_room(room_id: str, director_id: str = "default_director"):
         success = await room_service.delete_room(room_id, director_id)
         if not success:
             raise HTTPException(status_code=404, detail="Room not found or access denied")
+        await room_removed(room_id)
         return {"message": "Room deleted"}
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -95,9 +95,9 @@ async def delete_room(room_id: str, director_id: str = "default_director"):
 async def get_room_participants(room_id: str):
     """Get all participants in a room"""
     try:
-        room_details = await room_service.get_room_details(room_id)
+        room_details = await room_service.get_room_details_document(room_id)
         if not room_details:
             raise HTTPException(status_code=404, detail="Room not found")
-        return room_details.participants
+        return FastJSONResponse(room_details["participants"])
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
\ No newline at end of file
@@ -1,15 +1,26 @@
 from fastapi import APIRouter, HTTPException
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 from models import Route, RouteCreate, RouteUpdate
 from services.routing_service import routing_service
+from services.mixer_engine import mixer_engine
+from services.routing_matrix import routing_matrix
+from services.routing_graph import routing_graphs
+from services.room_events import room_changed
+from responses import read_response
 
 router = APIRouter()
 
+async def _routes_changed(room_id: str):
+    """Re-apply a room's routing to the SFU subscriptions, the server-side mix and MIDI targets"""
+    await room_changed(room_id, ("routes",))
+    await routing_graphs.save(room_id)
+
 @router.post("/", response_model=Route)
 async def create_route(route_data: RouteCreate):
     """Create a new audio/video route"""
     try:
         route = await routing_service.create_route(route_data)
+        await _routes_changed(route.room_id)
         return route
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -20,8 +31,8 @@ async def create_route(route_data: RouteCreate):
 async def get_routes(room_id: str):
     """Get all routes for a room"""
     try:
-        routes = await routing_service.get_routes(room_id)
-        return routes
+        routes = await routing_service.stream_route_documents(room_id)
+        return await read_response(routes)
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
@@ -43,6 +54,7 @@ async def update_route(route_id: str, update_data: RouteUpdate):
         route = await routing_service.update_route(route_id, update_data)
         if not route:
             raise HTTPException(status_code=404, detail="Route not found")
+        await _routes_changed(route.room_id)
         return route
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -51,9 +63,12 @@ async def update_route(route_id: str, update_data: RouteUpdate):
 async def delete_route(route_id: str):
     """Delete a route"""
     try:
+        route = await routing_service.get_route(route_id)
         success = await routing_service.delete_route(route_id)
         if not success:
             raise HTTPException(status_code=404, detail="Route not found")
+        if route:
+            await _routes_changed(route.room_id)
         return {"message": "Route deleted"}
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -65,6 +80,7 @@ async def toggle_route(route_id: str):
         route = await routing_service.toggle_route(route_id)
         if not route:
             raise HTTPException(status_code=404, detail="Route not found")
+        await _routes_changed(route.room_id)
         return route
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -80,6 +96,8 @@ async def update_route_volume(route_id: str, volume_data: dict):
         route = await routing_service.update_route_volume(route_id, volume)
         if not route:
             raise HTTPException(status_code=404, detail="Route not found")
+        await mixer_engine.refresh_room(route.room_id)
+        await routing_matrix.put_document("routes", route)
         return route
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -91,6 +109,7 @@ async def add_destination(route_id: str, destination_id: str):
         route = await routing_service.add_destination(route_id, destination_id)
         if not route:
             raise HTTPException(status_code=404, detail="Route not found")
+        await _routes_changed(route.room_id)
         return route
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -102,6 +121,7 @@ async def remove_destination(route_id: str, destination_id: str):
         route = await routing_service.remove_destination(route_id, destination_id)
         if not route:
             raise HTTPException(status_code=404, detail="Route not found")
+        await _routes_changed(route.room_id)
         return route
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -110,8 +130,33 @@ async def remove_destination(route_id: str, destination_id: str):
 async def get_routing_matrix(room_id: str):
     """Get complete routing matrix for a room"""
     try:
-        matrix = await routing_service.get_routing_matrix(room_id)
-        return matrix
+        matrix = await routing_service.stream_routing_matrix(room_id)
+        return await read_response(matrix)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/room/{room_id}/matrix/changes", response_model=Dict[str, Any])
+async def get_routing_matrix_changes(room_id: str, since: int = 0, epoch: Optional[str] = None):
+    """Matrix patches after version `since` of `epoch`, or the full versioned snapshot"""
+    try:
+        return await routing_matrix.get_changes(room_id, since, epoch)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/room/{room_id}/graph", response_model=Dict[str, Any])
+async def get_routing_graph(room_id: str):
+    """Who hears whom, mix-minus per participant, self-monitoring and routing loops"""
+    try:
+        graph = await routing_service.get_routing_graph(room_id)
+        return {
+            "who_hears_whom": graph.who_hears_whom(),
+            "mix_minus": graph.mix_minus(),
+            "self_monitoring": [
+                {"participant_id": participant_id, "source_id": source_id}
+                for participant_id, source_id in graph.self_monitoring()
+            ],
+            "feedback_cycles": graph.feedback_cycles(),
+        }
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
@@ -120,6 +165,7 @@ async def auto_route_participant(room_id: str, participant_id: str):
     """Automatically create routes for a participant"""
     try:
         routes = await routing_service.auto_route_participant(room_id, participant_id)
+        await _routes_changed(room_id)
         return routes
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
\ No newline at end of file
@@ -1,6 +1,7 @@
 from fastapi import APIRouter, HTTPException
 from models import Session, SessionUpdate, SessionResponse
 from services.session_service import session_service
+from responses import FastJSONResponse
 
 router = APIRouter()
 
@@ -8,10 +9,10 @@ router = APIRouter()
 async def get_session(room_id: str):
     """Get session details for a room"""
     try:
-        session_details = await session_service.get_session_details(room_id)
+        session_details = await session_service.get_session_details_document(room_id)
         if not session_details:
             raise HTTPException(status_code=404, detail="Room not found")
-        return session_details
+        return FastJSONResponse(session_details)
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
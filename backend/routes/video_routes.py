@@ -2,6 +2,8 @@ from fastapi import APIRouter, HTTPException
 from typing import List, Dict
 from models import VideoSource, VideoSourceUpdate
 from services.video_service import video_service
+from responses import read_response
+from services.room_events import source_changed
 
 router = APIRouter()
 
@@ -9,8 +11,8 @@ router = APIRouter()
 async def get_video_sources(room_id: str):
     """Get all video sources for a room"""
     try:
-        sources = await video_service.get_video_sources(room_id)
-        return sources
+        sources = await video_service.stream_video_source_documents(room_id)
+        return await read_response(sources)
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
@@ -32,6 +34,7 @@ async def update_video_source(source_id: str, update_data: VideoSourceUpdate):
         source = await video_service.update_video_source(source_id, update_data)
         if not source:
             raise HTTPException(status_code=404, detail="Video source not found")
+        await source_changed("video_sources", source)
         return source
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -43,6 +46,7 @@ async def toggle_video_source(source_id: str):
         source = await video_service.toggle_enable(source_id)
         if not source:
             raise HTTPException(status_code=404, detail="Video source not found")
+        await source_changed("video_sources", source)
         return source
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -58,6 +62,7 @@ async def set_resolution(source_id: str, resolution_data: dict):
         source = await video_service.set_resolution(source_id, resolution)
         if not source:
             raise HTTPException(status_code=404, detail="Video source not found")
+        await source_changed("video_sources", source)
         return source
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -75,6 +80,7 @@ async def set_framerate(source_id: str, fps_data: dict):
         source = await video_service.set_framerate(source_id, fps)
         if not source:
             raise HTTPException(status_code=404, detail="Video source not found")
+        await source_changed("video_sources", source)
         return source
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -5,6 +5,7 @@ Paquete services: centraliza la importación de los servicios de la aplicación
 
 # Socket manager
 from .sockets_manager import sio_manager
+from .ice_coalescer import ice_coalescer
 
 # Servicios de lógica
 from .audio_service import AudioService
@@ -1,7 +1,11 @@
 from typing import List, Optional
 from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ReturnDocument
 from models import AudioSource, AudioSourceUpdate
-from database import get_database
+from database import get_database, raw_find
+from .cache import audio_source_cache
+
+PROCESSING_TYPES = ("lowcut", "compressor", "gate")
 
 
 class AudioService:
@@ -9,52 +13,75 @@ class AudioService:
         self.db: Optional[AsyncIOMotorDatabase] = None
 
     async def get_db(self):
-        if not self.db:
+        if self.db is None:
             self.db = await get_database()
         return self.db
 
     async def get_audio_sources(self, room_id: str) -> List[AudioSource]:
         """Get all audio sources for a room"""
-        db = await self.get_db()
-        sources_cursor = db.audio_sources.find({"room_id": room_id})
-        sources = []
-        async for source_doc in sources_cursor:
-            sources.append(AudioSource(**source_doc))
-        return sources
+        return [AudioSource(**source_doc) for source_doc in await self.get_audio_source_documents(room_id)]
+
+    async def get_audio_source_documents(self, room_id: str) -> List[dict]:
+        """A room's audio sources as stored (no _id), for read endpoints that serialize them directly"""
+        source_docs = audio_source_cache.get_room(room_id)
+        if source_docs is None:
+            db = await self.get_db()
+            source_docs = await db.audio_sources.find({"room_id": room_id}, {"_id": 0}).to_list(None)
+            source_docs = audio_source_cache.put_room(room_id, source_docs)
+        return source_docs
+
+    async def stream_audio_source_documents(self, room_id: str):
+        """
+        A room's audio sources for a streamed response: the cached listing when warm,
+        else a raw BSON cursor (documents decoded only as they are written;
+        the cache is left cold)
+        """
+        source_docs = audio_source_cache.get_room(room_id)
+        if source_docs is not None:
+            return source_docs
+        cursor = raw_find("audio_sources", {"room_id": room_id}, {"_id": 0})
+        return cursor if cursor is not None else await self.get_audio_source_documents(room_id)
 
     async def get_audio_source(self, source_id: str) -> Optional[AudioSource]:
         """Get a specific audio source"""
-        db = await self.get_db()
-        source_doc = await db.audio_sources.find_one({"id": source_id})
+        source_doc = audio_source_cache.get(source_id)
+        if source_doc is None:
+            db = await self.get_db()
+            source_doc = await db.audio_sources.find_one({"id": source_id}, {"_id": 0})
+            if source_doc:
+                source_doc = audio_source_cache.put(source_doc)
         return AudioSource(**source_doc) if source_doc else None
 
     async def update_audio_source(self, source_id: str, update_data: AudioSourceUpdate) -> Optional[AudioSource]:
         """Update audio source settings"""
-        db = await self.get_db()
-        
         # Build update dict, excluding None values
         update_dict = {k: v for k, v in update_data.dict().items() if v is not None}
         
         if not update_dict:
             return await self.get_audio_source(source_id)
 
-        await db.audio_sources.update_one(
+        return await self._find_one_and_update(source_id, {"$set": update_dict})
+
+    async def _find_one_and_update(self, source_id: str, update) -> Optional[AudioSource]:
+        """Apply an update and return the resulting document in one round trip"""
+        db = await self.get_db()
+        source_doc = await db.audio_sources.find_one_and_update(
             {"id": source_id},
-            {"$set": update_dict}
+            update,
+            return_document=ReturnDocument.AFTER
         )
-        
-        return await self.get_audio_source(source_id)
+        if not source_doc:
+            audio_source_cache.remove(source_id)
+            return None
+        return AudioSource(**audio_source_cache.put(source_doc))
+
+    async def _toggle(self, source_id: str, field: str) -> Optional[AudioSource]:
+        """Flip a boolean server-side so concurrent toggles cannot lose a write"""
+        return await self._find_one_and_update(source_id, [{"$set": {field: {"$not": [f"${field}"]}}}])
 
     async def toggle_mute(self, source_id: str) -> Optional[AudioSource]:
         """Toggle mute status of an audio source"""
-        source = await self.get_audio_source(source_id)
-        if not source:
-            return None
-        
-        return await self.update_audio_source(
-            source_id, 
-            AudioSourceUpdate(is_muted=not source.is_muted)
-        )
+        return await self._toggle(source_id, "is_muted")
 
     async def set_volume(self, source_id: str, volume: float) -> Optional[AudioSource]:
         """Set volume of an audio source"""
@@ -78,16 +105,10 @@ class AudioService:
 
     async def toggle_processing(self, source_id: str, processing_type: str) -> Optional[AudioSource]:
         """Toggle audio processing (lowcut, compressor, gate)"""
-        source = await self.get_audio_source(source_id)
-        if not source:
-            return None
+        if processing_type not in PROCESSING_TYPES:
+            raise ValueError(f"Invalid processing type. Must be one of: {list(PROCESSING_TYPES)}")
 
-        current_value = getattr(source, processing_type, False)
-        
-        update_data = AudioSourceUpdate()
-        setattr(update_data, processing_type, not current_value)
-        
-        return await self.update_audio_source(source_id, update_data)
+        return await self._toggle(source_id, processing_type)
 
 
 # Global audio service instance
@@ -0,0 +1,286 @@
+import asyncio
+import json
+import logging
+import uuid
+from abc import ABC, abstractmethod
+from typing import Awaitable, Callable, List, Optional, Set
+from urllib.parse import urlparse
+
+MessageHandler = Callable[[dict], Awaitable[None]]
+
+DEFAULT_CHANNEL = "emvid:signaling"
+
+logger = logging.getLogger(__name__)
+
+
+class Backplane(ABC):
+    """
+    Bus pub/sub que comparte la señalización entre workers.
+    Cada mensaje lleva el node_id del emisor; el propio nodo ignora sus mensajes.
+    """
+
+    def __init__(self, channel: str = DEFAULT_CHANNEL):
+        self.channel = channel
+        self.node_id = uuid.uuid4().hex
+        self._handler: Optional[MessageHandler] = None
+
+    async def start(self, handler: MessageHandler):
+        self._handler = handler
+
+    async def stop(self):
+        self._handler = None
+
+    @abstractmethod
+    async def publish(self, message: dict):
+        """Envía el mensaje a los demás workers"""
+
+    async def _deliver(self, message: dict):
+        if self._handler is None or message.get("node") == self.node_id:
+            return
+        try:
+            await self._handler(message)
+        except Exception:
+            logger.exception("Error procesando mensaje del backplane", extra={"fields": {"type": message.get("type")}})
+
+
+class InProcessBackplane(Backplane):
+    """Backplane dentro del mismo proceso: varias instancias comparten canal (un worker, pruebas)"""
+
+    _subscribers: dict = {}  # {channel: [InProcessBackplane]}
+
+    async def start(self, handler: MessageHandler):
+        await super().start(handler)
+        self._subscribers.setdefault(self.channel, []).append(self)
+
+    async def stop(self):
+        subscribers = self._subscribers.get(self.channel, [])
+        if self in subscribers:
+            subscribers.remove(self)
+        await super().stop()
+
+    async def publish(self, message: dict):
+        message = {**message, "node": self.node_id}
+        for subscriber in list(self._subscribers.get(self.channel, ())):
+            await subscriber._deliver(message)
+
+
+# ---- Protocolo Redis (RESP) ----
+def _encode_command(*args) -> bytes:
+    out = [b"*%d\r\n" % len(args)]
+    for arg in args:
+        if not isinstance(arg, bytes):
+            arg = str(arg).encode()
+        out.append(b"$%d\r\n%s\r\n" % (len(arg), arg))
+    return b"".join(out)
+
+
+async def _read_reply(reader: asyncio.StreamReader):
+    line = await reader.readline()
+    if not line:
+        raise ConnectionError("Conexión cerrada por el servidor")
+    kind, rest = line[:1], line[1:-2]
+    if kind == b"+":
+        return rest
+    if kind == b"-":
+        raise ConnectionError(rest.decode())
+    if kind == b":":
+        return int(rest)
+    if kind == b"$":
+        length = int(rest)
+        if length < 0:
+            return None
+        data = await reader.readexactly(length + 2)
+        return data[:-2]
+    if kind == b"*":
+        length = int(rest)
+        if length < 0:
+            return None
+        return [await _read_reply(reader) for _ in range(length)]
+    raise ConnectionError(f"Respuesta RESP inválida: {line!r}")
+
+
+async def _open_connection(url: str):
+    parsed = urlparse(url)
+    if parsed.scheme == "unix":
+        return await asyncio.open_unix_connection(parsed.path)
+    return await asyncio.open_connection(parsed.hostname or "localhost", parsed.port or 6379)
+
+
+class RedisBackplane(Backplane):
+    """
+    Backplane sobre PUBLISH/SUBSCRIBE de Redis, hablando RESP directamente.
+    Acepta redis://[:password@]host:port o unix:///ruta/al/socket, por lo que
+    también sirve contra PubSubHub en un socket local sin tener Redis instalado.
+    """
+
+    def __init__(self, url: str, channel: str = DEFAULT_CHANNEL, reconnect_delay: float = 1.0):
+        super().__init__(channel)
+        self.url = url
+        self.password = urlparse(url).password
+        self.reconnect_delay = reconnect_delay
+        self._pub_writer: Optional[asyncio.StreamWriter] = None
+        self._tasks: List[asyncio.Task] = []
+        self._drain_task: Optional[asyncio.Task] = None  # una sola, la de la conexión de publicación actual
+        self._subscribed = asyncio.Event()
+
+    async def start(self, handler: MessageHandler):
+        await super().start(handler)
+        await self._connect_publisher()
+        self._tasks.append(asyncio.create_task(self._subscribe_loop()))
+        await self._subscribed.wait()
+
+    async def stop(self):
+        tasks = self._tasks + ([self._drain_task] if self._drain_task is not None else [])
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._tasks.clear()
+        self._drain_task = None
+        if self._pub_writer is not None:
+            self._pub_writer.close()
+            self._pub_writer = None
+        await super().stop()
+
+    async def publish(self, message: dict):
+        data = json.dumps({**message, "node": self.node_id}, default=str)
+        if self._pub_writer is None or self._pub_writer.is_closing():
+            await self._connect_publisher()
+        # Pipelining: las respuestas de PUBLISH las consume _drain_replies
+        self._pub_writer.write(_encode_command("PUBLISH", self.channel, data))
+        await self._pub_writer.drain()
+
+    async def _authenticate(self, reader, writer):
+        if self.password:
+            writer.write(_encode_command("AUTH", self.password))
+            await _read_reply(reader)
+
+    async def _connect_publisher(self):
+        reader, writer = await _open_connection(self.url)
+        await self._authenticate(reader, writer)
+        # Al reconectar se sustituye la conexión anterior y la tarea que leía sus respuestas
+        if self._drain_task is not None:
+            self._drain_task.cancel()
+        if self._pub_writer is not None:
+            self._pub_writer.close()
+        self._pub_writer = writer
+        self._drain_task = asyncio.create_task(self._drain_replies(reader, writer))
+
+    async def _drain_replies(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                await _read_reply(reader)
+        except (ConnectionError, asyncio.IncompleteReadError) as e:
+            logger.warning("Conexión de publicación perdida", extra={"fields": {"error": e}})
+            writer.close()
+            # Solo si sigue siendo la conexión actual (no una ya reemplazada)
+            if self._pub_writer is writer:
+                self._pub_writer = None
+
+    async def _subscribe_loop(self):
+        while True:
+            writer = None
+            try:
+                reader, writer = await _open_connection(self.url)
+                await self._authenticate(reader, writer)
+                writer.write(_encode_command("SUBSCRIBE", self.channel))
+                await _read_reply(reader)  # confirmación de la suscripción
+                self._subscribed.set()
+                while True:
+                    reply = await _read_reply(reader)
+                    if isinstance(reply, list) and len(reply) == 3 and reply[0] == b"message":
+                        try:
+                            message = json.loads(reply[2])
+                        except ValueError as e:
+                            # Un mensaje mal formado no debe terminar la suscripción
+                            logger.warning("Mensaje del backplane no válido", extra={"fields": {"error": e}})
+                            continue
+                        await self._deliver(message)
+            except (ConnectionError, OSError, asyncio.IncompleteReadError) as e:
+                logger.warning("Suscripción perdida, reintentando",
+                               extra={"fields": {"error": e, "retry_in": self.reconnect_delay}})
+                self._subscribed.set()  # no bloquear start() si el bus no está disponible
+                await asyncio.sleep(self.reconnect_delay)
+            finally:
+                if writer is not None:
+                    writer.close()
+
+
+class PubSubHub:
+    """
+    Servidor mínimo compatible con el PUBLISH/SUBSCRIBE de Redis.
+    Permite compartir la señalización entre workers de una misma máquina
+    a través de un socket local: python -m services.backplane unix:///tmp/emvid.sock
+    """
+
+    def __init__(self):
+        self.channels: dict = {}  # {channel: set(StreamWriter)}
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self, url: str):
+        parsed = urlparse(url)
+        if parsed.scheme == "unix":
+            self._server = await asyncio.start_unix_server(self._handle, parsed.path)
+        else:
+            self._server = await asyncio.start_server(self._handle, parsed.hostname or "localhost", parsed.port or 6379)
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        subscriptions: Set[bytes] = set()
+        try:
+            while True:
+                command = await _read_reply(reader)
+                if not isinstance(command, list) or not command:
+                    break
+                name = command[0].upper()
+                if name == b"PUBLISH":
+                    channel, data = command[1], command[2]
+                    receivers = self.channels.get(channel, ())
+                    frame = _encode_command("message", channel, data)
+                    for receiver in list(receivers):
+                        receiver.write(frame)
+                    writer.write(b":%d\r\n" % len(receivers))
+                elif name == b"SUBSCRIBE":
+                    for channel in command[1:]:
+                        self.channels.setdefault(channel, set()).add(writer)
+                        subscriptions.add(channel)
+                        writer.write(_encode_command("subscribe", channel, len(subscriptions)))
+                elif name == b"PING":
+                    writer.write(b"+PONG\r\n")
+                elif name == b"AUTH":
+                    writer.write(b"+OK\r\n")
+                else:
+                    writer.write(b"-ERR comando no soportado\r\n")
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            for channel in subscriptions:
+                self.channels.get(channel, set()).discard(writer)
+            writer.close()
+
+
+def create_backplane(url: Optional[str]) -> Optional[Backplane]:
+    """memory:// -> InProcessBackplane, redis:// o unix:// -> RedisBackplane, vacío -> sin backplane"""
+    if not url:
+        return None
+    if url.startswith("memory://"):
+        return InProcessBackplane()
+    return RedisBackplane(url)
+
+
+if __name__ == "__main__":
+    import sys
+    from log_config import setup_logging
+
+    async def _serve(url: str):
+        hub = PubSubHub()
+        await hub.start(url)
+        logger.info("PubSubHub escuchando", extra={"fields": {"url": url}})
+        await asyncio.Event().wait()
+
+    setup_logging()
+    asyncio.run(_serve(sys.argv[1] if len(sys.argv) > 1 else "unix:///tmp/emvid-signaling.sock"))
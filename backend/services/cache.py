@@ -0,0 +1,170 @@
+import os
+import time
+from collections import Counter, OrderedDict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+
+def _copy(value):
+    """Copy of a document's containers (documents hold only dicts, lists and scalars)"""
+    if isinstance(value, dict):
+        return {key: _copy(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_copy(item) for item in value]
+    return value
+
+
+class DocumentCache:
+    """
+    Per-process write-through cache for documents keyed by "id".
+
+    Services read through it and write Mongo first, then store the document the
+    write returned (or apply the same change here), so a read after a write never
+    goes back to the database. Complete room listings are cached as lists of ids;
+    a listing whose documents were evicted (LRU, max_documents) or expired
+    (ttl_seconds, which bounds staleness when several workers write the same
+    collection) is treated as a miss. Callers always get copies, so changing a
+    returned document never changes the cached one.
+
+    Fields changed in memory but not written yet (the control channel's
+    deferred writes) are held: every document stored afterwards, including
+    one re-read from Mongo for a listing, keeps the held values until they
+    are released once written.
+    """
+
+    def __init__(self, name: str, max_documents: int = 10000, ttl_seconds: float = 30.0):
+        self.name = name
+        self.max_documents = max_documents
+        self.ttl = ttl_seconds
+        self._documents: "OrderedDict[str, Tuple[float, dict]]" = OrderedDict()  # {id: (cached at, document)}
+        self._rooms: Dict[str, Tuple[float, List[str]]] = {}                     # {room_id: (cached at, ids)}
+        self._held: Dict[str, dict] = {}                                          # {id: {field: unwritten value}}
+        self._room_index: Dict[str, Set[str]] = {}                                # {room_id: ids of cached documents}
+        self.stats: Counter = Counter()
+
+    def __len__(self) -> int:
+        return len(self._documents)
+
+    def _fresh(self, cached_at: float) -> bool:
+        return not self.ttl or time.monotonic() - cached_at < self.ttl
+
+    # ---- Documents ----
+    def get(self, document_id: str) -> Optional[dict]:
+        entry = self._documents.get(document_id)
+        if entry is None or not self._fresh(entry[0]):
+            self.stats["miss"] += 1
+            return None
+        self._documents.move_to_end(document_id)
+        self.stats["hit"] += 1
+        return _copy(entry[1])
+
+    def put(self, document: dict) -> dict:
+        """Cache a document as stored in Mongo (Mongo's _id is dropped); new documents join their room's listing"""
+        document = {key: _copy(value) for key, value in document.items() if key != "_id"}
+        document_id = document["id"]
+        held = self._held.get(document_id)
+        if held:
+            document.update(_copy(held))
+        previous = self._documents.get(document_id)
+        if previous is not None:
+            self._unindex(document_id, previous[1])
+        self._documents[document_id] = (time.monotonic(), document)
+        self._documents.move_to_end(document_id)
+        self._room_index.setdefault(document.get("room_id"), set()).add(document_id)
+
+        listing = self._rooms.get(document.get("room_id"))
+        if listing is not None and document_id not in listing[1]:
+            listing[1].append(document_id)
+
+        while len(self._documents) > self.max_documents:
+            evicted_id, (_, evicted) = self._documents.popitem(last=False)
+            self._unindex(evicted_id, evicted)
+            self.stats["evicted"] += 1
+        return _copy(document)
+
+    def update(self, document_id: str, fields: dict) -> Optional[dict]:
+        """Apply a $set already written to Mongo; None when the document is not cached"""
+        entry = self._documents.get(document_id)
+        if entry is None or not self._fresh(entry[0]):
+            return None
+        return self.put({**entry[1], **fields})
+
+    def remove(self, document_id: str):
+        """The document was deleted"""
+        entry = self._documents.pop(document_id, None)
+        if entry is not None:
+            self._unindex(document_id, entry[1])
+            listing = self._rooms.get(entry[1].get("room_id"))
+            if listing is not None and document_id in listing[1]:
+                listing[1].remove(document_id)
+
+    def hold(self, document_id: str, fields: dict):
+        """Fields changed in memory whose write is deferred: they win over what Mongo returns"""
+        self._held.setdefault(document_id, {}).update(fields)
+
+    def release(self, document_id: str, fields: Iterable[str]):
+        """Those fields are now written"""
+        held = self._held.get(document_id)
+        if held is None:
+            return
+        for field in fields:
+            held.pop(field, None)
+        if not held:
+            del self._held[document_id]
+
+    def _unindex(self, document_id: str, document: dict):
+        ids = self._room_index.get(document.get("room_id"))
+        if ids is not None:
+            ids.discard(document_id)
+            if not ids:
+                del self._room_index[document.get("room_id")]
+
+    # ---- Room listings ----
+    def get_room(self, room_id: str) -> Optional[List[dict]]:
+        listing = self._rooms.get(room_id)
+        if listing is None or not self._fresh(listing[0]):
+            self.stats["room_miss"] += 1
+            return None
+
+        documents = []
+        for document_id in listing[1]:
+            document = self.get(document_id)
+            if document is None:
+                # Evicted or expired since the listing was cached
+                del self._rooms[room_id]
+                self.stats["room_miss"] += 1
+                return None
+            documents.append(document)
+        self.stats["room_hit"] += 1
+        return documents
+
+    def put_room(self, room_id: str, documents: Iterable[dict]) -> List[dict]:
+        """Cache the complete set of a room's documents"""
+        cached = [self.put(document) for document in documents]
+        self._rooms[room_id] = (time.monotonic(), [document["id"] for document in cached])
+        return cached
+
+    def invalidate_room(self, room_id: str):
+        """Forget a room's listing and every cached document of that room (bulk writes, deletions)"""
+        self._rooms.pop(room_id, None)
+        for document_id in self._room_index.pop(room_id, ()):
+            del self._documents[document_id]
+
+    def clear(self):
+        self._documents.clear()
+        self._rooms.clear()
+        self._held.clear()
+        self._room_index.clear()
+
+
+def _cache(name: str) -> DocumentCache:
+    return DocumentCache(
+        name,
+        max_documents=int(os.environ.get("DOCUMENT_CACHE_SIZE", "10000")),
+        ttl_seconds=float(os.environ.get("DOCUMENT_CACHE_TTL_SECONDS", "30")),
+    )
+
+
+# Global caches, one per collection
+audio_source_cache = _cache("audio_sources")
+video_source_cache = _cache("video_sources")
+route_cache = _cache("routes")
@@ -0,0 +1,240 @@
+import asyncio
+import logging
+import math
+import os
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+from pymongo import UpdateOne
+
+from database import get_database
+from .audio_service import audio_service
+from .cache import audio_source_cache, route_cache, video_source_cache
+from .mixer_engine import mixer_engine
+from .routing_graph import routing_graphs
+from .routing_matrix import routing_matrix
+from .routing_service import routing_service
+from .sfu_service import sfu_service
+from .video_service import video_service
+
+logger = logging.getLogger(__name__)
+
+
+def _unit(value) -> float:
+    """0..1 level, clamped; non-finite values (nan, inf) are rejected"""
+    number = float(value)
+    if not math.isfinite(number):
+        raise ValueError(f"Expected a finite number, got {value!r}")
+    return max(0.0, min(1.0, number))
+
+
+def strict_bool(value) -> bool:
+    """True/False or 0/1 only: strings such as "false" or "0" are rejected, not read as truthy"""
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, int) and value in (0, 1):
+        return bool(value)
+    raise ValueError(f"Expected a boolean, got {value!r}")
+
+
+# {target: {field: value coercion}}; anything else is rejected
+CONTROL_FIELDS = {
+    "audio_source": {
+        "volume": _unit,
+        "gain": _unit,
+        "is_muted": strict_bool,
+        "lowcut": strict_bool,
+        "compressor": strict_bool,
+        "gate": strict_bool,
+        "is_enabled": strict_bool,
+    },
+    "video_source": {
+        "is_enabled": strict_bool,
+    },
+    "route": {
+        "volume": _unit,
+        "is_active": strict_bool,
+    },
+}
+COLLECTIONS = {"audio_source": "audio_sources", "video_source": "video_sources", "route": "routes"}
+CACHES = {"audio_source": audio_source_cache, "video_source": video_source_cache, "route": route_cache}
+# Fields whose change alters which media the SFU forwards
+SFU_FIELDS = {("route", "is_active"), ("audio_source", "is_enabled"), ("video_source", "is_enabled")}
+
+
+class ControlChannel:
+    """
+    High-rate parameter changes (faders, knobs, mutes) from control surfaces.
+
+    A change is applied at once to the in-memory documents (the services'
+    write-through caches) and to the mixer, and broadcast to the rest of the
+    room as a "control" event with a per-room sequence number. Persistence is
+    deferred: every flush_ms the latest value of each (document, field) is
+    written with one unordered bulk_write per collection, so a 100 Hz fader
+    costs a few writes per second instead of one request per move. Until
+    then the changed fields are held in the caches, so a listing re-read from
+    Mongo (e.g. by the mixer) still sees them; each flush refreshes the mixer
+    of the rooms it wrote.
+    """
+
+    def __init__(self, flush_ms: int = 100):
+        self.flush_interval = flush_ms / 1000
+        self.sio_manager = None
+        self.pending: Dict[Tuple[str, str], Dict[str, object]] = {}  # {(target, id): {field: value}}
+        self.pending_rooms: Dict[Tuple[str, str], str] = {}          # {(target, id): room_id}
+        self.sequences: Dict[str, int] = {}                          # {room_id: last broadcast seq}
+        self.stats: Counter = Counter()
+        self._task: Optional[asyncio.Task] = None
+
+    def attach(self, sio_manager):
+        self.sio_manager = sio_manager
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()  # nothing acknowledged is lost on shutdown
+
+    # ---- Ingestion ----
+    async def handle(self, sid: Optional[str], data) -> dict:
+        """Socket.IO "control" event: one change or a list of changes; returns the ack"""
+        changes = data if isinstance(data, list) else [data]
+        return await self.apply_many(changes, sender_sid=sid)
+
+    async def apply(self, change: dict, sender_sid: Optional[str] = None) -> dict:
+        """
+        change: {"room_id", "target": "audio_source" | "video_source" | "route", "id", "field", "value"}
+        Returns the change as applied (value coerced/clamped, with its room sequence number).
+        """
+        result = await self.apply_many([change], sender_sid=sender_sid)
+        if result["errors"]:
+            raise ValueError(result["errors"][0]["error"])
+        return result["applied"][0]
+
+    async def apply_many(self, changes: List[dict], sender_sid: Optional[str] = None) -> dict:
+        """Apply a batch; the mixer/SFU are refreshed once per affected room, not once per change"""
+        applied = []
+        errors = []
+        mixer_rooms = set()
+        sfu_rooms = set()
+        for change in changes:
+            try:
+                applied.append(await self._apply_one(change))
+            except (KeyError, TypeError, ValueError) as e:
+                self.stats["rejected"] += 1
+                errors.append({"change": change, "error": str(e)})
+                continue
+            mixer_rooms.add(change["room_id"])
+            if (change["target"], change["field"]) in SFU_FIELDS:
+                sfu_rooms.add(change["room_id"])
+
+        for room_id in mixer_rooms:
+            await mixer_engine.refresh_room(room_id)
+        for room_id in sfu_rooms:
+            await sfu_service.refresh_room(room_id)
+
+        # One matrix version per room and batch
+        matrix_changes: Dict[str, List[Tuple[str, str, Dict[str, object]]]] = {}
+        for change in applied:
+            matrix_changes.setdefault(change["room_id"], []).append(
+                (COLLECTIONS[change["target"]], change["id"], {change["field"]: change["value"]}))
+        for room_id, room_changes in matrix_changes.items():
+            await routing_matrix.set_fields(room_id, room_changes)
+
+        if self.sio_manager is not None:
+            for change in applied:
+                await self.sio_manager.forward_to_peer("control", {"room_id": change["room_id"], "payload": change},
+                                                       sender_sid=sender_sid)
+        return {"applied": applied, "errors": errors}
+
+    async def _apply_one(self, change: dict) -> dict:
+        room_id, target, document_id, field = change["room_id"], change["target"], change["id"], change["field"]
+        fields = CONTROL_FIELDS.get(target)
+        if fields is None or field not in fields:
+            raise ValueError(f"Unsupported control {target}.{field}")
+        value = fields[field](change["value"])
+
+        current = await self.load_document(target, document_id)
+        if current is None or current.room_id != room_id:
+            raise ValueError(f"{target} {document_id} not found in room {room_id}")
+
+        CACHES[target].hold(document_id, {field: value})
+        document = CACHES[target].update(document_id, {field: value})
+        if target == "route" and document is not None:
+            routing_graphs.put_route(document)
+        self.pending.setdefault((target, document_id), {})[field] = value
+        self.pending_rooms[(target, document_id)] = room_id
+        self.stats["applied"] += 1
+
+        sequence = self.sequences[room_id] = self.sequences.get(room_id, 0) + 1
+        return {"room_id": room_id, "target": target, "id": document_id, "field": field,
+                "value": value, "seq": sequence}
+
+    async def load_document(self, target: str, document_id: str):
+        """Current document, read through the service so it is cached before the in-memory update"""
+        if target == "audio_source":
+            return await audio_service.get_audio_source(document_id)
+        if target == "video_source":
+            return await video_service.get_video_source(document_id)
+        return await routing_service.get_route(document_id)
+
+    # ---- Persistence ----
+    async def flush(self):
+        """Write the latest value of every pending field (last writer wins)"""
+        if not self.pending:
+            return
+        pending, self.pending = self.pending, {}
+        pending_rooms, self.pending_rooms = self.pending_rooms, {}
+
+        operations: Dict[str, List[UpdateOne]] = {}
+        for (target, document_id), fields in pending.items():
+            operations.setdefault(target, []).append(UpdateOne({"id": document_id}, {"$set": fields}))
+
+        db = await get_database()
+        for target, requests in operations.items():
+            try:
+                await db[COLLECTIONS[target]].bulk_write(requests, ordered=False)
+                self.stats["bulk_writes"] += 1
+                self.stats["documents_written"] += len(requests)
+            except Exception:
+                logger.exception("Control flush failed", extra={"fields": {"target": target, "documents": len(requests)}})
+                # Retry on the next flush, unless newer values arrived meanwhile
+                for key, fields in pending.items():
+                    if key[0] == target:
+                        newer = self.pending.setdefault(key, {})
+                        for field, value in fields.items():
+                            newer.setdefault(field, value)
+                        self.pending_rooms.setdefault(key, pending_rooms[key])
+
+        # A REST write that landed between apply() and the flush may have refreshed the
+        # cache with an older value; the flushed one is what Mongo now holds (fields
+        # changed again during the write keep their newer in-memory value and stay held)
+        rooms = set()
+        for (target, document_id), fields in pending.items():
+            newer = self.pending.get((target, document_id), {})
+            flushed = {field: value for field, value in fields.items() if field not in newer}
+            if flushed:
+                CACHES[target].release(document_id, flushed)
+                CACHES[target].update(document_id, flushed)
+                rooms.add(pending_rooms[(target, document_id)])
+        for room_id in rooms:
+            await mixer_engine.refresh_room(room_id)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Control flush loop error")
+
+
+# Global control channel instance
+control_channel = ControlChannel(
+    flush_ms=int(os.environ.get("CONTROL_FLUSH_MS", "100")),
+)
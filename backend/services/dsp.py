@@ -0,0 +1,196 @@
+import math
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+try:
+    from scipy.signal import lfilter
+    SCIPY_AVAILABLE = True
+except ImportError:  # optional dependency: pip install scipy
+    SCIPY_AVAILABLE = False
+
+SAMPLE_RATE = 48000
+SILENCE_DB = -120.0
+
+
+def db_to_linear(db):
+    return np.power(10.0, np.asarray(db) / 20.0)
+
+
+def linear_to_db(value):
+    return 20.0 * np.log10(np.maximum(value, 10 ** (SILENCE_DB / 20)))
+
+
+def highpass_coefficients(cutoff_hz: float, sample_rate: int, q: float = 1 / math.sqrt(2)) -> Tuple[np.ndarray, np.ndarray]:
+    """Second-order (12 dB/oct) high-pass biquad, RBJ cookbook; returns normalized (b, a)"""
+    w0 = 2 * math.pi * cutoff_hz / sample_rate
+    alpha = math.sin(w0) / (2 * q)
+    cos_w0 = math.cos(w0)
+    b = np.array([(1 + cos_w0) / 2, -(1 + cos_w0), (1 + cos_w0) / 2])
+    a = np.array([1 + alpha, -2 * cos_w0, 1 - alpha])
+    return b / a[0], a / a[0]
+
+
+def biquad_filter(b: np.ndarray, a: np.ndarray, x: np.ndarray, state: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Filter every row of x [channels x samples] with one biquad; state [channels x 2] in, updated state out"""
+    if SCIPY_AVAILABLE:
+        return lfilter(b, a, x, axis=1, zi=state)
+
+    # Sample loop vectorized across channels (transposed direct form II, same state layout as lfilter)
+    b0, b1, b2 = b
+    _, a1, a2 = a
+    z1, z2 = state[:, 0].copy(), state[:, 1].copy()
+    y = np.empty_like(x)
+    for t in range(x.shape[1]):
+        xt = x[:, t]
+        yt = b0 * xt + z1
+        z1 = b1 * xt - a1 * yt + z2
+        z2 = b2 * xt - a2 * yt
+        y[:, t] = yt
+    return y, np.stack([z1, z2], axis=1)
+
+
+def _time_coefficient(time_ms: float, step_ms: float) -> float:
+    """One-pole smoothing coefficient for a control signal updated every step_ms"""
+    return math.exp(-step_ms / time_ms) if time_ms > 0 else 0.0
+
+
+class DspSettings:
+    """Channel-strip parameters shared by every source the bank processes"""
+
+    def __init__(self, lowcut_hz: float = 80.0,
+                 compressor_threshold_db: float = -18.0, compressor_ratio: float = 4.0,
+                 compressor_attack_ms: float = 5.0, compressor_release_ms: float = 120.0,
+                 compressor_makeup_db: float = 0.0,
+                 gate_open_db: float = -45.0, gate_close_db: float = -52.0,
+                 gate_attack_ms: float = 1.0, gate_release_ms: float = 60.0,
+                 gate_hold_ms: float = 50.0, gate_floor_db: float = -80.0,
+                 control_ms: float = 1.0):
+        self.lowcut_hz = lowcut_hz
+        self.compressor_threshold_db = compressor_threshold_db
+        self.compressor_ratio = compressor_ratio
+        self.compressor_attack_ms = compressor_attack_ms
+        self.compressor_release_ms = compressor_release_ms
+        self.compressor_makeup_db = compressor_makeup_db
+        self.gate_open_db = gate_open_db
+        self.gate_close_db = gate_close_db  # below gate_open_db: hysteresis band
+        self.gate_attack_ms = gate_attack_ms
+        self.gate_release_ms = gate_release_ms
+        self.gate_hold_ms = gate_hold_ms
+        self.gate_floor_db = gate_floor_db
+        self.control_ms = control_ms  # envelope/gain update period
+
+
+class DspBank:
+    """
+    Low-cut, noise gate and compressor for many mono sources at once. Every call
+    processes a [sources x samples] block in place; sources whose flag is off
+    pass through that stage untouched. The filter runs per sample, while the gate
+    and compressor gains are computed per control_ms sub-block across all sources
+    and ramped linearly between sub-blocks.
+    """
+
+    def __init__(self, num_sources: int, settings: Optional[DspSettings] = None, sample_rate: int = SAMPLE_RATE):
+        self.settings = settings or DspSettings()
+        self.sample_rate = sample_rate
+        self.num_sources = num_sources
+        s = self.settings
+
+        self.b, self.a = highpass_coefficients(s.lowcut_hz, sample_rate)
+        self.control_size = max(1, int(sample_rate * s.control_ms / 1000))
+        step_ms = 1000.0 * self.control_size / sample_rate
+        self.compressor_attack = _time_coefficient(s.compressor_attack_ms, step_ms)
+        self.compressor_release = _time_coefficient(s.compressor_release_ms, step_ms)
+        self.gate_attack = _time_coefficient(s.gate_attack_ms, step_ms)
+        self.gate_release = _time_coefficient(s.gate_release_ms, step_ms)
+        self.gate_hold_steps = int(round(s.gate_hold_ms / step_ms))
+        self.gate_floor = float(db_to_linear(s.gate_floor_db))
+
+        # Per-source state, carried from block to block
+        self.filter_state = np.zeros((num_sources, 2))          # biquad (transposed direct form II)
+        self.reduction_db = np.zeros(num_sources)               # current compressor gain reduction (<= 0)
+        self.compressor_gain = np.ones(num_sources)             # last applied linear compressor gain
+        self.gate_open = np.zeros(num_sources, dtype=bool)
+        self.gate_hold = np.zeros(num_sources, dtype=np.int64)
+        self.gate_gain = np.full(num_sources, self.gate_floor)  # last applied linear gate gain
+
+    def remap(self, old_ids: List[str], new_ids: List[str]) -> "DspBank":
+        """Bank for a new source list that keeps the state of sources present in both"""
+        bank = DspBank(len(new_ids), self.settings, self.sample_rate)
+        old_index = {source_id: i for i, source_id in enumerate(old_ids)}
+        pairs = [(i, old_index[source_id]) for i, source_id in enumerate(new_ids) if source_id in old_index]
+        if pairs:
+            new_rows, old_rows = (np.array(rows) for rows in zip(*pairs))
+            for name in ("filter_state", "reduction_db", "compressor_gain", "gate_open", "gate_hold", "gate_gain"):
+                getattr(bank, name)[new_rows] = getattr(self, name)[old_rows]
+        return bank
+
+    def process(self, frames: np.ndarray, lowcut: np.ndarray, gate: np.ndarray, compressor: np.ndarray):
+        """Run the enabled stages over frames [sources x samples] in place (lowcut -> gate -> compressor)"""
+        for mask, stage in ((lowcut, self._lowcut), (gate, self._gate), (compressor, self._compress)):
+            rows = np.flatnonzero(mask)
+            if rows.size:
+                frames[rows] = stage(frames[rows].astype(np.float64), rows)
+
+    # ---- Stages ----
+    def _lowcut(self, x: np.ndarray, rows: np.ndarray) -> np.ndarray:
+        y, self.filter_state[rows] = biquad_filter(self.b, self.a, x, self.filter_state[rows])
+        return y
+
+    def _gate(self, x: np.ndarray, rows: np.ndarray) -> np.ndarray:
+        s = self.settings
+        level_db = linear_to_db(np.sqrt(np.mean(self._sub_blocks(x) ** 2, axis=2)))  # RMS per sub-block
+
+        is_open, hold, gain = self.gate_open[rows], self.gate_hold[rows], self.gate_gain[rows]
+        gains = np.empty(level_db.shape)
+        for j in range(level_db.shape[1]):
+            level = level_db[:, j]
+            # Opens above gate_open_db; stays open while above gate_close_db plus the hold time
+            hold = np.where(level >= s.gate_close_db, self.gate_hold_steps, np.maximum(hold - 1, 0))
+            is_open = (level > s.gate_open_db) | (is_open & (hold > 0))
+            target = np.where(is_open, 1.0, self.gate_floor)
+            coefficient = np.where(target > gain, self.gate_attack, self.gate_release)
+            gain = target + coefficient * (gain - target)
+            gains[:, j] = gain
+
+        y = x * self._ramp(self.gate_gain[rows], gains, x.shape[1])
+        self.gate_open[rows], self.gate_hold[rows], self.gate_gain[rows] = is_open, hold, gain
+        return y
+
+    def _compress(self, x: np.ndarray, rows: np.ndarray) -> np.ndarray:
+        s = self.settings
+        level_db = linear_to_db(np.max(np.abs(self._sub_blocks(x)), axis=2))  # peak per sub-block
+        over_db = np.maximum(level_db - s.compressor_threshold_db, 0.0)
+        target_db = -over_db * (1.0 - 1.0 / s.compressor_ratio)
+
+        reduction = self.reduction_db[rows]
+        reductions = np.empty(target_db.shape)
+        for j in range(target_db.shape[1]):
+            target = target_db[:, j]
+            coefficient = np.where(target < reduction, self.compressor_attack, self.compressor_release)
+            reduction = target + coefficient * (reduction - target)
+            reductions[:, j] = reduction
+
+        gains = db_to_linear(reductions + s.compressor_makeup_db)
+        y = x * self._ramp(self.compressor_gain[rows], gains, x.shape[1])
+        self.reduction_db[rows] = reduction
+        self.compressor_gain[rows] = gains[:, -1]
+        return y
+
+    # ---- Control-rate helpers ----
+    def _sub_blocks(self, x: np.ndarray) -> np.ndarray:
+        """[sources x sub-blocks x control_size]; a trailing partial sub-block is measured by the last whole one"""
+        count = max(1, x.shape[1] // self.control_size)
+        size = min(self.control_size, x.shape[1])
+        return x[:, :count * size].reshape(x.shape[0], count, size)
+
+    def _ramp(self, previous: np.ndarray, gains: np.ndarray, samples: int) -> np.ndarray:
+        """Per-sample gain: linear ramps from each sub-block's starting gain to its computed gain"""
+        sources, count = gains.shape
+        size = min(self.control_size, samples)
+        start = np.concatenate([previous[:, np.newaxis], gains[:, :-1]], axis=1)
+        steps = np.arange(1, size + 1) / size
+        curve = (start[:, :, np.newaxis] + (gains - start)[:, :, np.newaxis] * steps).reshape(sources, count * size)
+        if curve.shape[1] < samples:
+            curve = np.concatenate([curve, np.repeat(gains[:, -1:], samples - curve.shape[1], axis=1)], axis=1)
+        return curve
@@ -0,0 +1,95 @@
+import os
+import asyncio
+from typing import Dict, List, Optional, Set, Tuple
+
+from .sockets_manager import SocketManager, sio_manager
+
+# (room_id, target_sid, sender_sid)
+BatchKey = Tuple[str, Optional[str], Optional[str]]
+
+
+class IceCandidateCoalescer:
+    """
+    Agrupa los candidatos ICE que llegan en ráfaga (trickle ICE) y los reenvía
+    como un único evento 'ice-candidates' con la lista de payloads.
+    """
+
+    def __init__(self, manager: SocketManager, window_ms: float = 0, max_batch: int = 32):
+        """
+        window_ms: tiempo que se retienen los candidatos antes de enviarlos; 0 desactiva el batching
+        max_batch: número de candidatos a partir del cual se envía sin esperar a la ventana
+        """
+        self.manager = manager
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self._buffers: Dict[BatchKey, List] = {}
+        self._timers: Dict[BatchKey, asyncio.TimerHandle] = {}
+        self._room_keys: Dict[str, Set[BatchKey]] = {}
+        self._pending_flushes: Set[asyncio.Task] = set()
+
+    @property
+    def enabled(self) -> bool:
+        return self.window > 0
+
+    async def add(self, data: dict, sender_sid: Optional[str] = None):
+        """Encola un candidato; sin batching se reenvía tal cual"""
+        room_id = data.get("room_id")
+        payload = data.get("payload")
+        if not self.enabled or not room_id or payload is None:
+            await self.manager.forward_to_peer("ice-candidate", data, sender_sid=sender_sid)
+            return
+
+        # El emisor forma parte de la clave para poder saltarlo en el broadcast
+        key = (room_id, data.get("target_sid"), sender_sid)
+        buffer = self._buffers.get(key)
+        if buffer is None:
+            buffer = self._buffers[key] = []
+            self._room_keys.setdefault(room_id, set()).add(key)
+            loop = asyncio.get_running_loop()
+            self._timers[key] = loop.call_later(self.window, self._schedule_flush, key)
+        buffer.append(payload)
+
+        if len(buffer) >= self.max_batch:
+            await self._flush(key)
+
+    async def flush_room(self, room_id: Optional[str]):
+        """Envía lo pendiente de una sala; se llama antes de reenviar offer/answer para conservar el orden"""
+        if not room_id:
+            return
+        for key in list(self._room_keys.get(room_id, ())):
+            await self._flush(key)
+
+    def _schedule_flush(self, key: BatchKey):
+        task = asyncio.ensure_future(self._flush(key))
+        self._pending_flushes.add(task)
+        task.add_done_callback(self._pending_flushes.discard)
+
+    async def _flush(self, key: BatchKey):
+        buffer = self._buffers.pop(key, None)
+        timer = self._timers.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+
+        room_id, target_sid, sender_sid = key
+        room_keys = self._room_keys.get(room_id)
+        if room_keys is not None:
+            room_keys.discard(key)
+            if not room_keys:
+                del self._room_keys[room_id]
+
+        if not buffer:
+            return
+
+        data = {"room_id": room_id, "payload": buffer}
+        if target_sid:
+            data["target_sid"] = target_sid
+        await self.manager.forward_to_peer("ice-candidates", data, sender_sid=sender_sid)
+
+
+# ---- Instancia global ----
+# Opt-in: ICE_BATCH_WINDOW_MS=0 (por defecto) reenvía cada candidato por separado
+ice_coalescer = IceCandidateCoalescer(
+    sio_manager,
+    window_ms=float(os.environ.get("ICE_BATCH_WINDOW_MS", "0")),
+    max_batch=int(os.environ.get("ICE_BATCH_MAX", "32")),
+)
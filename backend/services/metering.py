@@ -0,0 +1,211 @@
+import asyncio
+import logging
+import math
+import os
+import struct
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .dsp import SAMPLE_RATE, SILENCE_DB, biquad_filter, linear_to_db
+
+logger = logging.getLogger(__name__)
+
+METER_FRAME_VERSION = 1
+# version, layout version, source count, bus count, sequence number
+METER_HEADER = struct.Struct("<BHHHI")
+LUFS_OFFSET = -0.691  # ITU-R BS.1770
+
+
+def k_weighting_coefficients(sample_rate: int) -> List[Tuple[np.ndarray, np.ndarray]]:
+    """ITU-R BS.1770 K-weighting (high shelf + RLB high-pass) as two biquads for any sample rate"""
+    # High shelf (head effect)
+    gain_db, f0, q = 3.999843853973347, 1681.974450955533, 0.7071752369554196
+    k = math.tan(math.pi * f0 / sample_rate)
+    vh = 10 ** (gain_db / 20)
+    vb = vh ** 0.4996667741545416
+    a0 = 1 + k / q + k * k
+    shelf = (np.array([(vh + vb * k / q + k * k) / a0, 2 * (k * k - vh) / a0, (vh - vb * k / q + k * k) / a0]),
+             np.array([1.0, 2 * (k * k - 1) / a0, (1 - k / q + k * k) / a0]))
+
+    # High-pass (revised low-frequency B curve)
+    f0, q = 38.13547087602444, 0.5003270373238773
+    k = math.tan(math.pi * f0 / sample_rate)
+    a0 = 1 + k / q + k * k
+    highpass = (np.array([1.0, -2.0, 1.0]),
+                np.array([1.0, 2 * (k * k - 1) / a0, (1 - k / q + k * k) / a0]))
+    return [shelf, highpass]
+
+
+class MeterBank:
+    """
+    Peak, RMS and short-term loudness for a fixed set of channels. Blocks are
+    accumulated as they are mixed; read() returns the levels since the previous
+    read (peak/RMS) and over the last window_seconds (loudness, LUFS).
+    """
+
+    def __init__(self, num_channels: int, block_size: int, sample_rate: int = SAMPLE_RATE,
+                 window_seconds: float = 3.0):
+        self.num_channels = num_channels
+        self.filters = k_weighting_coefficients(sample_rate)
+        self.filter_state = [np.zeros((num_channels, 2)) for _ in self.filters]
+        # Ring of K-weighted mean squares, one column per block
+        self.loudness_blocks = np.zeros((num_channels, max(1, round(window_seconds * sample_rate / block_size))))
+        self.loudness_filled = 0
+        self.loudness_cursor = 0
+        self._reset_interval()
+
+    def _reset_interval(self):
+        self.peak = np.zeros(self.num_channels)
+        self.square_sum = np.zeros(self.num_channels)
+        self.sample_count = 0
+
+    def add(self, block: np.ndarray):
+        """Accumulate one [channels x samples] block"""
+        x = block.astype(np.float64)
+        np.maximum(self.peak, np.max(np.abs(x), axis=1), out=self.peak)
+        self.square_sum += np.einsum("ij,ij->i", x, x)
+        self.sample_count += x.shape[1]
+
+        for i, (b, a) in enumerate(self.filters):
+            x, self.filter_state[i] = biquad_filter(b, a, x, self.filter_state[i])
+        self.loudness_blocks[:, self.loudness_cursor] = np.mean(x * x, axis=1)
+        self.loudness_cursor = (self.loudness_cursor + 1) % self.loudness_blocks.shape[1]
+        self.loudness_filled = min(self.loudness_filled + 1, self.loudness_blocks.shape[1])
+
+    def read(self) -> np.ndarray:
+        """[channels x 3] of peak dBFS, RMS dBFS and short-term LUFS; starts a new peak/RMS interval"""
+        levels = np.full((self.num_channels, 3), SILENCE_DB)
+        if self.sample_count:
+            levels[:, 0] = linear_to_db(self.peak)
+            levels[:, 1] = linear_to_db(np.sqrt(self.square_sum / self.sample_count))
+        if self.loudness_filled:
+            mean_square = np.mean(self.loudness_blocks[:, :self.loudness_filled], axis=1)
+            levels[:, 2] = np.maximum(LUFS_OFFSET + 10 * np.log10(np.maximum(mean_square, 1e-12)), SILENCE_DB)
+        self._reset_interval()
+        return levels
+
+
+def encode_meter_frame(layout_version: int, num_sources: int, num_buses: int, sequence: int,
+                       levels: np.ndarray) -> bytes:
+    """
+    Binary meter frame: METER_HEADER followed by one little-endian int16 triple
+    (peak, RMS, LUFS in hundredths of a dB) per channel, sources first then buses,
+    in the order given by the room's meter layout.
+    """
+    header = METER_HEADER.pack(METER_FRAME_VERSION, layout_version & 0xFFFF, num_sources, num_buses,
+                               sequence & 0xFFFFFFFF)
+    centi_db = np.clip(np.round(levels * 100), -32768, 32767).astype("<i2")
+    return header + centi_db.tobytes()
+
+
+class RoomMeters:
+    def __init__(self, plan, layout_version: int, block_size: int, sample_rate: int, window_seconds: float):
+        self.plan = plan
+        self.layout_version = layout_version
+        self.bank = MeterBank(len(plan.source_ids) + len(plan.bus_ids), block_size, sample_rate, window_seconds)
+        self.sequence = 0
+        self.pending = False  # blocks added since the last frame
+
+
+class MeteringService:
+    """
+    Meters every source (after its channel strip, before the fader) and every bus
+    of the rooms the mixer runs. Levels are computed for all channels of a room
+    at once and sent every interval_ms as a single binary "meters" message per
+    room, so traffic grows with rooms rather than with sources x viewers.
+    Channel ids travel separately in a "meter-layout" message, sent when the
+    room's routing changes and to each member that joins.
+    """
+
+    def __init__(self, interval_ms: int = 50, window_seconds: float = 3.0, sample_rate: int = SAMPLE_RATE):
+        self.interval = interval_ms / 1000
+        self.window_seconds = window_seconds
+        self.sample_rate = sample_rate
+        self.rooms: Dict[str, RoomMeters] = {}
+        self.sio_manager = None
+        self._layout_versions: Dict[str, int] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def attach(self, sio_manager):
+        self.sio_manager = sio_manager
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    # ---- Mixer listener ----
+    async def on_mix(self, room_id: str, plan, sources: np.ndarray, mixes: np.ndarray):
+        meters = self.rooms.get(room_id)
+        if meters is not None and meters.plan is not plan and self._same_layout(meters.plan, plan):
+            meters.plan = plan  # gains changed, channels did not: keep the loudness history
+        if meters is None or meters.plan is not plan:
+            version = self._layout_versions[room_id] = self._layout_versions.get(room_id, 0) + 1
+            meters = self.rooms[room_id] = RoomMeters(plan, version, sources.shape[1],
+                                                      self.sample_rate, self.window_seconds)
+            await self.send_layout(room_id)
+        meters.bank.add(np.concatenate([sources, mixes]))
+        meters.pending = True
+
+    @staticmethod
+    def _same_layout(old_plan, new_plan) -> bool:
+        return old_plan.source_ids == new_plan.source_ids and old_plan.bus_ids == new_plan.bus_ids
+
+    def remove_room(self, room_id: str):
+        """The room was deleted or expired (after the mixer dropped it, so on_mix cannot bring it back)"""
+        self.rooms.pop(room_id, None)
+        self._layout_versions.pop(room_id, None)
+
+    # ---- Layout ----
+    def layout(self, room_id: str) -> Optional[dict]:
+        meters = self.rooms.get(room_id)
+        if meters is None:
+            return None
+        return {
+            "room_id": room_id,
+            "layout_version": meters.layout_version,
+            "sources": meters.plan.source_ids,
+            "buses": meters.plan.bus_ids,
+            "interval_ms": round(self.interval * 1000),
+        }
+
+    async def send_layout(self, room_id: str, sid: Optional[str] = None):
+        """Channel order of the room's meter frames, to one member or to the whole room"""
+        layout = self.layout(room_id)
+        if layout is None or self.sio_manager is None:
+            return
+        if sid is not None:
+            await self.sio_manager.outbound.send(sid, "meter-layout", layout)
+        else:
+            await self.sio_manager.forward_to_peer("meter-layout", {"room_id": room_id, "payload": layout})
+
+    # ---- Publishing ----
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        deadline = loop.time()
+        while True:
+            deadline = max(deadline + self.interval, loop.time())
+            for room_id, meters in list(self.rooms.items()):
+                if not meters.pending:
+                    continue
+                meters.pending = False
+                meters.sequence += 1
+                frame = encode_meter_frame(meters.layout_version, len(meters.plan.source_ids),
+                                           len(meters.plan.bus_ids), meters.sequence, meters.bank.read())
+                try:
+                    await self.sio_manager.broadcast_volatile("meters", {"room_id": room_id, "frame": frame}, room_id)
+                except Exception:
+                    logger.exception("Meter frame failed", extra={"fields": {"room_id": room_id}})
+            await asyncio.sleep(max(0.0, deadline - loop.time()))
+
+
+# Global metering service instance (fed by mixer_engine)
+metering_service = MeteringService(
+    interval_ms=int(os.environ.get("METER_INTERVAL_MS", "50")),
+)
@@ -0,0 +1,331 @@
+import logging
+import math
+from collections import Counter
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple, Union
+
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ReturnDocument
+
+from models import MidiDevice, MidiDeviceUpdate
+from database import get_database
+from .audio_service import audio_service
+from .control_channel import CACHES, CONTROL_FIELDS, control_channel, strict_bool
+from .routing_service import routing_service
+from .video_service import video_service
+
+logger = logging.getLogger(__name__)
+
+MIDI_CC = 0
+MIDI_NOTE = 1
+TABLE_SIZE = 2 * 16 * 128  # kind x channel x controller/note number
+
+# Where the controls offered by the UI live on the wire unless a mapping sets
+# "midi" ("cc:<channel>:<number>" or "note:<channel>:<number>"): faders CC 0-7,
+# knobs CC 16-23, buttons CC 32-39 on channel 0 (nanoKONTROL-style layout)
+DEFAULT_CONTROLS = {
+    **{f"fader_{i + 1}": (MIDI_CC, 0, i) for i in range(8)},
+    **{f"knob_{i + 1}": (MIDI_CC, 0, 16 + i) for i in range(8)},
+    **{f"button_{i + 1}": (MIDI_CC, 0, 32 + i) for i in range(8)},
+}
+
+# (target kind, mapping parameter) -> document field
+PARAMETER_FIELDS = {
+    ("audio_source", "volume"): "volume",
+    ("audio_source", "gain"): "gain",
+    ("audio_source", "mute"): "is_muted",
+    ("audio_source", "enable"): "is_enabled",
+    ("video_source", "enable"): "is_enabled",
+    ("route", "volume"): "volume",
+    ("route", "enable"): "is_active",
+}
+
+ChangeKey = Tuple[str, str, str]                         # (target kind, document id, field)
+Setter = Callable[[int, Dict[ChangeKey, dict]], None]    # (7-bit value, batch changes)
+
+
+# Data bytes after each channel voice status (high nibble) and system common status
+CHANNEL_DATA_LENGTHS = {0x80: 2, 0x90: 2, 0xA0: 2, 0xB0: 2, 0xC0: 1, 0xD0: 1, 0xE0: 2}
+SYSTEM_COMMON_DATA_LENGTHS = {0xF1: 1, 0xF2: 2, 0xF3: 1}
+
+
+def slot(kind: int, channel: int, number: int) -> int:
+    return (kind << 11) | (channel << 7) | number
+
+
+def parse_control(mapping: Dict[str, str]) -> Optional[int]:
+    """Dispatch slot of a mapping: explicit "midi" address, else the default layout"""
+    address = mapping.get("midi")
+    if address:
+        try:
+            kind, channel, number = address.split(":")
+            return slot(MIDI_NOTE if kind == "note" else MIDI_CC, int(channel) & 0x0F, int(number) & 0x7F)
+        except ValueError:
+            return None
+    control = DEFAULT_CONTROLS.get(mapping.get("control", ""))
+    return slot(*control) if control else None
+
+
+def _curve(name: str) -> Tuple[float, ...]:
+    """0..127 -> 0..1 lookup table"""
+    steps = [value / 127 for value in range(128)]
+    if name == "audio":    # squared taper: finer control near the top of a fader
+        return tuple(x * x for x in steps)
+    if name == "log":
+        return tuple(math.log1p(9 * x) / math.log(10) for x in steps)
+    return tuple(steps)
+
+
+CURVES = {name: _curve(name) for name in ("linear", "audio", "log")}
+
+
+THREE_BYTE_STATUSES = frozenset(status for status in range(0x80, 0xF0) if CHANNEL_DATA_LENGTHS[status & 0xF0] == 2)
+
+
+def channel_messages(data: bytes) -> Iterator[Tuple[int, int, int]]:
+    """
+    Channel voice messages of a raw MIDI byte stream as (status, data1, data2),
+    data2 being 0 for one-data-byte messages. A stream made only of complete
+    3-byte messages (what controllers send for faders and buttons) is split
+    with slices; anything else goes through the byte-by-byte parser.
+    """
+    statuses, first, second = data[0::3], data[1::3], data[2::3]
+    if (len(data) % 3 == 0 and data and max(first) < 0x80 and max(second) < 0x80
+            and THREE_BYTE_STATUSES.issuperset(statuses)):
+        return zip(statuses, first, second)
+    return _parse_stream(data)
+
+
+def _parse_stream(data: bytes) -> Iterator[Tuple[int, int, int]]:
+    """
+    Follows running status, skips SysEx payloads and system common messages,
+    ignores real-time bytes wherever they appear, and drops data bytes that
+    arrive without a status or are cut short by the next status byte.
+    """
+    status = 0       # running status, 0 when there is none
+    needed = 0
+    first = -1       # first data byte of the message being read
+    in_sysex = False
+    for byte in data:
+        if byte >= 0xF8:
+            continue  # real-time (clock, start/stop, active sensing) never interrupts a message
+        if byte >= 0x80:
+            first = -1
+            in_sysex = byte == 0xF0
+            if byte >= 0xF0:
+                # SysEx, EOX and system common cancel running status
+                status = byte if byte in SYSTEM_COMMON_DATA_LENGTHS else 0
+                needed = SYSTEM_COMMON_DATA_LENGTHS.get(byte, 0)
+            else:
+                status = byte
+                needed = CHANNEL_DATA_LENGTHS[byte & 0xF0]
+            continue
+        if in_sysex or not status:
+            continue
+        if needed == 2 and first < 0:
+            first = byte
+            continue
+        if status >= 0xF0:
+            status = 0  # system common message complete
+        elif needed == 2:
+            yield status, first, byte
+        else:
+            yield status, byte, 0
+        first = -1
+
+
+class DispatchTable:
+    """A room's MIDI mappings flattened into TABLE_SIZE slots of setter closures"""
+
+    def __init__(self, room_id: str):
+        self.room_id = room_id
+        self.slots: List[Optional[List[Setter]]] = [None] * TABLE_SIZE
+        self.mapped = 0
+        self.skipped = 0
+        self.toggles: Set[Tuple[str, str]] = set()  # (target kind, document id) flipped by buttons
+
+    def add(self, index: int, setter: Setter):
+        if self.slots[index] is None:
+            self.slots[index] = []
+        self.slots[index].append(setter)
+        self.mapped += 1
+
+    def dispatch(self, messages: Union[bytes, bytearray, Iterable[Iterable[int]]]) -> Dict[ChangeKey, dict]:
+        """
+        Run raw MIDI through the table. messages is either a raw MIDI byte
+        string (see channel_messages) or a list of [status, data1, data2];
+        malformed entries (wrong length, non-integers), statuses that are not
+        channel messages and data values outside 0..127 are skipped. Only the
+        last value per (document, field) survives, ready for the control channel.
+        """
+        changes: Dict[ChangeKey, dict] = {}
+        slots = self.slots
+        if isinstance(messages, (bytes, bytearray, memoryview)):
+            triples = channel_messages(bytes(messages))
+        else:
+            triples = messages
+        for entry in triples:
+            try:
+                status, number, value = entry
+                if (number | value) & ~0x7F or not 0x80 <= status <= 0xEF:
+                    continue
+            except (TypeError, ValueError):
+                continue  # from a JSON list: not three integers
+            kind = status & 0xF0
+            if kind == 0xB0:
+                index = (status & 0x0F) << 7 | number
+            elif kind == 0x90 or kind == 0x80:
+                index = 2048 | (status & 0x0F) << 7 | number
+                if kind == 0x80:
+                    value = 0
+            else:
+                continue
+            setters = slots[index]
+            if setters:
+                for setter in setters:
+                    setter(value, changes)
+        return changes
+
+
+def _continuous_setter(room_id: str, target: str, document_id: str, field: str, table: Tuple[float, ...]) -> Setter:
+    key = (target, document_id, field)
+
+    def setter(value: int, changes: Dict[ChangeKey, dict]):
+        changes[key] = {"room_id": room_id, "target": target, "id": document_id, "field": field,
+                        "value": table[value]}
+    return setter
+
+
+def _toggle_setter(room_id: str, target: str, document_id: str, field: str) -> Setter:
+    key = (target, document_id, field)
+    cache = CACHES[target]
+
+    def setter(value: int, changes: Dict[ChangeKey, dict]):
+        if value < 64:
+            return  # button release
+        previous = changes.get(key)
+        if previous is not None:
+            current = previous["value"]
+        else:
+            document = cache.get(document_id)
+            current = bool(document.get(field)) if document else False
+        changes[key] = {"room_id": room_id, "target": target, "id": document_id, "field": field,
+                        "value": not current}
+    return setter
+
+
+def compile_mappings(room_id: str, devices: Iterable[dict], targets: Dict[str, str]) -> DispatchTable:
+    """
+    devices: MidiDevice documents of the room
+    targets: {document id: "audio_source" | "video_source" | "route"} that mappings may point at
+    """
+    table = DispatchTable(room_id)
+    for device in devices:
+        for mapping in device.get("mappings", []):
+            index = parse_control(mapping)
+            target = targets.get(mapping.get("target", ""))
+            field = PARAMETER_FIELDS.get((target, mapping.get("parameter")))
+            if index is None or field is None:
+                table.skipped += 1  # unknown control, target gone, or unsupported parameter (e.g. solo)
+                continue
+            if CONTROL_FIELDS[target][field] is strict_bool:
+                table.add(index, _toggle_setter(room_id, target, mapping["target"], field))
+                table.toggles.add((target, mapping["target"]))
+            else:
+                curve = CURVES.get(mapping.get("curve", "linear"), CURVES["linear"])
+                table.add(index, _continuous_setter(room_id, target, mapping["target"], field, curve))
+    return table
+
+
+class MidiService:
+    """MIDI devices and their mappings, evaluated on the backend against the control channel"""
+
+    def __init__(self):
+        self.db: Optional[AsyncIOMotorDatabase] = None
+        self.tables: Dict[str, DispatchTable] = {}
+        self.stats: Counter = Counter()
+
+    async def get_db(self):
+        if self.db is None:
+            self.db = await get_database()
+        return self.db
+
+    # ---- Devices ----
+    async def get_devices(self, room_id: str) -> List[MidiDevice]:
+        """Get all MIDI devices for a room"""
+        db = await self.get_db()
+        device_docs = await db.midi_devices.find({"room_id": room_id}, {"_id": 0}).to_list(None)
+        return [MidiDevice(**device_doc) for device_doc in device_docs]
+
+    async def create_device(self, device: MidiDevice) -> MidiDevice:
+        """Register a MIDI device"""
+        db = await self.get_db()
+        await db.midi_devices.insert_one(device.dict())
+        self.invalidate(device.room_id)
+        return device
+
+    async def update_device(self, device_id: str, update_data: MidiDeviceUpdate) -> Optional[MidiDevice]:
+        """Update connection state or mappings"""
+        db = await self.get_db()
+        update_dict = {k: v for k, v in update_data.dict().items() if v is not None}
+        if not update_dict:
+            device_doc = await db.midi_devices.find_one({"id": device_id}, {"_id": 0})
+        else:
+            device_doc = await db.midi_devices.find_one_and_update(
+                {"id": device_id},
+                {"$set": update_dict},
+                return_document=ReturnDocument.AFTER
+            )
+        if not device_doc:
+            return None
+        self.invalidate(device_doc["room_id"])
+        return MidiDevice(**device_doc)
+
+    async def delete_device(self, device_id: str) -> bool:
+        """Delete a MIDI device"""
+        db = await self.get_db()
+        device_doc = await db.midi_devices.find_one_and_delete({"id": device_id})
+        if not device_doc:
+            return False
+        self.invalidate(device_doc["room_id"])
+        return True
+
+    # ---- Dispatch ----
+    def invalidate(self, room_id: str):
+        """Mappings or targets changed: the table is recompiled on the next message"""
+        self.tables.pop(room_id, None)
+
+    async def get_table(self, room_id: str) -> DispatchTable:
+        table = self.tables.get(room_id)
+        if table is None:
+            db = await self.get_db()
+            devices = await db.midi_devices.find({"room_id": room_id}).to_list(None)
+            targets = {source.id: "audio_source" for source in await audio_service.get_audio_sources(room_id)}
+            targets.update({source.id: "video_source" for source in await video_service.get_video_sources(room_id)})
+            targets.update({route.id: "route" for route in await routing_service.get_routes(room_id)})
+            table = self.tables[room_id] = compile_mappings(room_id, devices, targets)
+            logger.info("MIDI table compiled",
+                        extra={"fields": {"room_id": room_id, "mapped": table.mapped, "skipped": table.skipped}})
+        return table
+
+    async def handle(self, sid: Optional[str], data: dict) -> dict:
+        """Socket.IO "midi" event: {"room_id", "messages": bytes | [[status, data1, data2], ...]}"""
+        table = await self.get_table(data["room_id"])
+        # Buttons flip the current value: their documents must be cached before the (synchronous) dispatch
+        for target, document_id in table.toggles:
+            if CACHES[target].get(document_id) is None:
+                await control_channel.load_document(target, document_id)
+        messages = data.get("messages") or []
+        if isinstance(messages, (bytes, bytearray, memoryview)):
+            messages = list(channel_messages(bytes(messages)))
+        changes = table.dispatch(messages)
+        count = len(messages)
+        self.stats["messages"] += count
+        result = await control_channel.apply_many(list(changes.values()), sender_sid=sid)
+        if result["errors"]:
+            # A mapped document disappeared: recompile next time
+            self.invalidate(data["room_id"])
+        return {"messages": count, **result}
+
+
+# Global MIDI service instance
+midi_service = MidiService()
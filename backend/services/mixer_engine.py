@@ -0,0 +1,348 @@
+import asyncio
+import logging
+import os
+import struct
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from models import AudioSource, Route, SourceType
+from .audio_service import audio_service
+from .dsp import DspBank
+from .routing_service import routing_service
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_RATE = 48000
+GAIN_RANGE_DB = 24.0  # AudioSource.gain 0..1 spans -12 dB..+12 dB, 0.5 is unity
+
+MixCallback = Callable[[str, "MixPlan", np.ndarray, np.ndarray], Awaitable[None]]
+
+
+def gain_to_linear(gain: float) -> float:
+    """Map the 0..1 fader gain onto a linear input gain"""
+    return float(10 ** ((gain - 0.5) * GAIN_RANGE_DB / 20))
+
+
+def to_pcm16(block: np.ndarray) -> np.ndarray:
+    """A mixed (already clipped) float block as 16-bit PCM"""
+    return (block * 32767).astype(np.int16)
+
+
+def wav_stream_header(sample_rate: int) -> bytes:
+    """Header of an unbounded mono 16-bit WAV stream (sizes set to the maximum, as live encoders do)"""
+    return struct.pack("<4sI4s4sIHHIIHH4sI", b"RIFF", 0xFFFFFFFF, b"WAVE", b"fmt ", 16, 1, 1,
+                       sample_rate, sample_rate * 2, 2, 16, b"data", 0xFFFFFFFF)
+
+
+class MixPlan:
+    """A room's routing compiled into one [buses x sources] gain matrix"""
+
+    def __init__(self, source_ids: List[str], bus_ids: List[str], matrix: np.ndarray,
+                 participant_sources: Dict[str, str], input_gain: Optional[np.ndarray] = None,
+                 lowcut: Optional[np.ndarray] = None, gate: Optional[np.ndarray] = None,
+                 compressor: Optional[np.ndarray] = None):
+        self.source_ids = source_ids
+        self.bus_ids = bus_ids
+        self.matrix = matrix
+        # Per-source channel strip, applied before the matrix
+        no_flags = np.zeros(len(source_ids), dtype=bool)
+        self.input_gain = input_gain if input_gain is not None else np.ones(len(source_ids), dtype=np.float32)
+        self.lowcut = lowcut if lowcut is not None else no_flags
+        self.gate = gate if gate is not None else no_flags
+        self.compressor = compressor if compressor is not None else no_flags
+        self.participant_sources = participant_sources  # {participant_id: microphone source id}
+        self.source_index = {source_id: i for i, source_id in enumerate(source_ids)}
+
+
+def compile_mix(sources: List[AudioSource], routes: List[Route]) -> MixPlan:
+    """
+    Fold source volume/mute and per-route volume into a single matrix so a
+    block of every destination bus is one matrix multiply. Buses are the active
+    audio routes' destinations (participants and OBS outputs); a participant's
+    bus never contains its own sources (mix-minus). Input gain and the
+    lowcut/gate/compressor flags stay per source: they act before the faders.
+    """
+    source_ids = [source.id for source in sources]
+    index = {source_id: i for i, source_id in enumerate(source_ids)}
+    source_gain = np.array([
+        0.0 if source.is_muted or not source.is_enabled else source.volume
+        for source in sources
+    ], dtype=np.float32)
+    owners = {source.id: source.participant_id for source in sources}
+
+    bus_ids: List[str] = []
+    bus_index: Dict[str, int] = {}
+    entries: List[Tuple[int, int, float]] = []
+    for route in routes:
+        if route.type != "audio" or not route.is_active or route.source_id not in index:
+            continue
+        src = index[route.source_id]
+        for destination in route.destinations:
+            if destination == owners.get(route.source_id):
+                continue
+            if destination not in bus_index:
+                bus_index[destination] = len(bus_ids)
+                bus_ids.append(destination)
+            entries.append((bus_index[destination], src, route.volume if route.volume is not None else 1.0))
+
+    matrix = np.zeros((len(bus_ids), len(source_ids)), dtype=np.float32)
+    for bus, src, volume in entries:
+        matrix[bus, src] += volume
+    matrix *= source_gain[np.newaxis, :]
+
+    participant_sources = {
+        source.participant_id: source.id
+        for source in sources
+        if source.participant_id and source.type == SourceType.MICROPHONE
+    }
+    return MixPlan(
+        source_ids, bus_ids, matrix, participant_sources,
+        input_gain=np.array([gain_to_linear(source.gain) for source in sources], dtype=np.float32),
+        lowcut=np.array([source.lowcut for source in sources], dtype=bool),
+        gate=np.array([source.gate for source in sources], dtype=bool),
+        compressor=np.array([source.compressor for source in sources], dtype=bool),
+    )
+
+
+class FrameBus:
+    """Per-key FIFO of mono float32 PCM; producers push any length, the mixer reads whole blocks"""
+
+    def __init__(self, max_buffered_samples: int = SAMPLE_RATE):
+        self.max_buffered = max_buffered_samples
+        self._chunks: Dict[str, Deque[np.ndarray]] = {}
+        self._sizes: Dict[str, int] = {}
+
+    def push(self, key: str, pcm: np.ndarray):
+        chunks = self._chunks.setdefault(key, deque())
+        chunks.append(np.asarray(pcm, dtype=np.float32))
+        self._sizes[key] = self._sizes.get(key, 0) + len(pcm)
+        # A stalled consumer must not grow memory: keep only the most recent audio
+        while self._sizes[key] > self.max_buffered and len(chunks) > 1:
+            self._sizes[key] -= len(chunks.popleft())
+
+    def read_into(self, key: str, out: np.ndarray) -> bool:
+        """Fill `out` from the FIFO; False (and silence) when a full block is not buffered"""
+        needed = len(out)
+        if self._sizes.get(key, 0) < needed:
+            out[:] = 0.0
+            return False
+        chunks = self._chunks[key]
+        filled = 0
+        while filled < needed:
+            chunk = chunks[0]
+            take = min(needed - filled, len(chunk))
+            out[filled:filled + take] = chunk[:take]
+            if take == len(chunk):
+                chunks.popleft()
+            else:
+                chunks[0] = chunk[take:]
+            filled += take
+        self._sizes[key] -= needed
+        return True
+
+    def discard(self, key: str):
+        self._chunks.pop(key, None)
+        self._sizes.pop(key, None)
+
+
+class MixTap:
+    """
+    One consumer of a mix bus (a participant's mix-minus track, an OBS stream).
+    Blocks are queued as they are mixed; a stalled consumer loses the oldest
+    blocks instead of growing memory. None in the queue means the bus is gone.
+    """
+
+    def __init__(self, room_id: str, bus_id: str, block_size: int, max_blocks: int = 25):
+        self.room_id = room_id
+        self.bus_id = bus_id
+        self.silence = np.zeros(block_size, dtype=np.float32)
+        self.closed = False
+        self._queue: "asyncio.Queue[Optional[np.ndarray]]" = asyncio.Queue(maxsize=max_blocks)
+
+    def offer(self, block: Optional[np.ndarray]):
+        if self._queue.full():
+            self._queue.get_nowait()
+        self._queue.put_nowait(block)
+
+    async def read(self, timeout: Optional[float] = None) -> Optional[np.ndarray]:
+        """Next block of the bus; silence when none arrives within timeout, None once the bus is closed"""
+        if self.closed and self._queue.empty():
+            return None
+        try:
+            return await asyncio.wait_for(self._queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return self.silence
+
+
+class AudioMixerEngine:
+    """
+    Central real-time mixer: every block_ms it pulls one block of decoded PCM per
+    source, runs the sources' input gain and channel strip (lowcut, gate,
+    compressor), then applies volume/mute and per-route volume and produces every
+    destination bus of a room with a single matrix multiply. Each bus goes to
+    the taps opened on it: the SFU sends a participant's bus as their single
+    mix-minus audio track, OBS reads obs_* buses over HTTP.
+    """
+
+    def __init__(self, enabled: bool = False, block_ms: int = 20, sample_rate: int = SAMPLE_RATE):
+        self.enabled = enabled
+        self.sample_rate = sample_rate
+        self.block_size = sample_rate * block_ms // 1000
+        self.block_seconds = self.block_size / sample_rate
+        self.inputs = FrameBus()    # keyed by source id
+        self.taps: Dict[str, Dict[str, List[MixTap]]] = {}  # {room_id: {bus_id: taps}}
+        self.plans: Dict[str, MixPlan] = {}
+        self.listeners: List[MixCallback] = []
+        self._frames: Dict[str, np.ndarray] = {}  # preallocated [sources x block] per room
+        self._dsp: Dict[str, DspBank] = {}        # channel-strip state per room
+        self._task: Optional[asyncio.Task] = None
+
+    def add_listener(self, callback: MixCallback):
+        """callback(room_id, plan, sources[sources x block], mixes[buses x block]) after each block"""
+        self.listeners.append(callback)
+
+    def start(self):
+        if self.enabled and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    # ---- Plans ----
+    def set_plan(self, room_id: str, plan: MixPlan):
+        previous = self.plans.get(room_id)
+        if previous is None:
+            self._dsp[room_id] = DspBank(len(plan.source_ids), sample_rate=self.sample_rate)
+        else:
+            # Filter/envelope state follows the source, not its row
+            self._dsp[room_id] = self._dsp[room_id].remap(previous.source_ids, plan.source_ids)
+        self.plans[room_id] = plan
+        self._frames[room_id] = np.zeros((len(plan.source_ids), self.block_size), dtype=np.float32)
+
+    async def refresh_room(self, room_id: str, force: bool = False):
+        """Recompile a room's matrix from its AudioSource and Route documents"""
+        if not self.enabled or (room_id not in self.plans and not force):
+            return
+        sources = await audio_service.get_audio_sources(room_id)
+        routes = await routing_service.get_routes(room_id)
+        self.set_plan(room_id, compile_mix(sources, routes))
+
+    async def ensure_room(self, room_id: str):
+        """Compile a room's plan if the mixer does not run it yet"""
+        if self.enabled and room_id not in self.plans:
+            await self.refresh_room(room_id, force=True)
+
+    def has_bus(self, room_id: str, bus_id: str) -> bool:
+        plan = self.plans.get(room_id)
+        return plan is not None and bus_id in plan.bus_ids
+
+    def remove_room(self, room_id: str):
+        """The room was deleted or expired: stop mixing it and end its taps"""
+        plan = self.plans.pop(room_id, None)
+        self._frames.pop(room_id, None)
+        self._dsp.pop(room_id, None)
+        if plan is not None:
+            for source_id in plan.source_ids:
+                self.inputs.discard(source_id)
+        for taps in self.taps.pop(room_id, {}).values():
+            for tap in taps:
+                tap.closed = True
+                tap.offer(None)
+
+    # ---- Outputs ----
+    def open_tap(self, room_id: str, bus_id: str) -> MixTap:
+        """Start receiving a bus's blocks (silence while the bus has no routes)"""
+        tap = MixTap(room_id, bus_id, self.block_size)
+        self.taps.setdefault(room_id, {}).setdefault(bus_id, []).append(tap)
+        return tap
+
+    def close_tap(self, tap: MixTap):
+        tap.closed = True
+        buses = self.taps.get(tap.room_id, {})
+        taps = buses.get(tap.bus_id, [])
+        if tap in taps:
+            taps.remove(tap)
+            if not taps:
+                del buses[tap.bus_id]
+        if not buses:
+            self.taps.pop(tap.room_id, None)
+
+    # ---- Inputs ----
+    async def attach_participant_track(self, room_id: str, participant_id: str, track):
+        """Feed a participant's decoded SFU audio track into their microphone source"""
+        if room_id not in self.plans:
+            await self.refresh_room(room_id, force=True)
+        source_id = self.plans[room_id].participant_sources.get(participant_id)
+        if source_id is None:
+            return
+        try:
+            while True:
+                frame = await track.recv()
+                if frame.sample_rate != self.sample_rate:
+                    continue  # aiortc decodes Opus at 48 kHz; anything else is skipped
+                pcm = frame.to_ndarray().astype(np.float32)
+                channels = len(frame.layout.channels)
+                if frame.format.is_packed and channels > 1:
+                    pcm = pcm.reshape(-1, channels).mean(axis=1)
+                else:
+                    pcm = pcm.reshape(channels, -1).mean(axis=0)
+                if frame.format.name.startswith("s16"):
+                    pcm /= 32768.0
+                self.inputs.push(source_id, pcm)
+        except Exception:  # track ended (MediaStreamError) or peer closed
+            self.inputs.discard(source_id)
+
+    # ---- Mixing ----
+    def mix_block(self, room_id: str) -> Optional[np.ndarray]:
+        """Pull one block per source and return [buses x block] mixes"""
+        plan = self.plans.get(room_id)
+        if plan is None or not plan.bus_ids:
+            return None
+        frames = self._frames[room_id]
+        for i, source_id in enumerate(plan.source_ids):
+            self.inputs.read_into(source_id, frames[i])
+        frames *= plan.input_gain[:, np.newaxis]
+        self._dsp[room_id].process(frames, plan.lowcut, plan.gate, plan.compressor)
+        mixes = plan.matrix @ frames
+        np.clip(mixes, -1.0, 1.0, out=mixes)
+        return mixes
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        deadline = loop.time()
+        while True:
+            deadline += self.block_seconds
+            for room_id in list(self.plans):
+                mixes = self.mix_block(room_id)
+                if mixes is None:
+                    continue
+                plan = self.plans[room_id]
+                taps = self.taps.get(room_id)
+                if taps:
+                    for i, bus_id in enumerate(plan.bus_ids):
+                        for tap in taps.get(bus_id, ()):
+                            tap.offer(mixes[i])
+                for listener in self.listeners:
+                    try:
+                        await listener(room_id, plan, self._frames[room_id], mixes)
+                    except Exception:
+                        logger.exception("Mix listener failed", extra={"fields": {"room_id": room_id}})
+
+            delay = deadline - loop.time()
+            if delay < -self.block_seconds:
+                # More than a block behind: drop the backlog instead of bursting to catch up
+                deadline = loop.time()
+                delay = 0
+            await asyncio.sleep(max(0.0, delay))
+
+
+# Global mixer engine instance
+mixer_engine = AudioMixerEngine(
+    enabled=os.environ.get("MIXER_ENABLED", "").lower() in ("1", "true", "yes"),
+    block_ms=int(os.environ.get("MIXER_BLOCK_MS", "20")),
+)
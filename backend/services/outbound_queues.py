@@ -0,0 +1,136 @@
+import asyncio
+import logging
+import time
+from collections import Counter, deque
+from typing import Deque, Dict, Iterable, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Nunca se descartan: sin ellos la negociación WebRTC no puede completarse
+CRITICAL_EVENTS = {"offer", "answer"}
+# Se descartan primero: un candidato viejo ya no aporta y el navegador seguirá generando otros
+DROPPABLE_EVENTS = {"ice-candidate", "ice-candidates"}
+
+QueuedMessage = Tuple[float, str, object]  # (encolado en, evento, payload)
+
+
+class OutboundQueues:
+    """
+    Colas de salida acotadas por sid para proteger al servidor de clientes lentos.
+
+    Mientras el buffer del engine de un sid esté por debajo de engine_high_watermark
+    los mensajes se emiten directamente. Si el cliente se atrasa, los mensajes se
+    retienen en una cola propia de como mucho max_queue elementos (descartando antes
+    los candidatos ICE más viejos) y un worker la vacía a medida que el engine drena.
+    Un sid cuyo mensaje más antiguo supera lag_threshold_seconds se desconecta.
+    """
+
+    def __init__(self, max_queue: int = 256, lag_threshold_seconds: float = 10.0,
+                 engine_high_watermark: int = 64, poll_interval: float = 0.05):
+        self.sio = None
+        self.max_queue = max_queue
+        self.lag_threshold = lag_threshold_seconds
+        self.engine_high_watermark = engine_high_watermark
+        self.poll_interval = poll_interval
+        self.queues: Dict[str, Deque[QueuedMessage]] = {}
+        self.congested: Set[str] = set()  # sids con cola no vacía
+        self.stats: Counter = Counter()
+        self._workers: Dict[str, asyncio.Task] = {}
+
+    def attach(self, sio):
+        self.sio = sio
+
+    # ---- Estado del engine ----
+    def engine_backlog(self, sid: str) -> int:
+        """Paquetes pendientes de escribir en el socket del engine para este sid"""
+        try:
+            eio_sid = self.sio.manager.eio_sid_from_sid(sid, "/")
+            socket = self.sio.eio.sockets.get(eio_sid)
+        except AttributeError:
+            return 0
+        return socket.queue.qsize() if socket is not None else 0
+
+    def is_lagging(self, sid: str) -> bool:
+        return sid in self.congested or self.engine_backlog(sid) > self.engine_high_watermark
+
+    def depth(self, sid: str) -> int:
+        queue = self.queues.get(sid)
+        return len(queue) if queue else 0
+
+    def depths(self, sids: Iterable[str]) -> int:
+        return sum(self.depth(sid) for sid in sids)
+
+    # ---- Envío ----
+    async def send(self, sid: str, event: str, payload):
+        """Emite directo si el sid va al día; si no, encola con la política de descarte"""
+        if sid not in self.congested and self.engine_backlog(sid) <= self.engine_high_watermark:
+            await self.sio.emit(event, payload, to=sid)
+            return
+        self.enqueue(sid, event, payload)
+
+    def enqueue(self, sid: str, event: str, payload):
+        queue = self.queues.get(sid)
+        if queue is None:
+            queue = self.queues[sid] = deque()
+            self.congested.add(sid)
+
+        if len(queue) >= self.max_queue and not self._make_room(queue, event):
+            self.stats["dropped." + event] += 1
+            return
+
+        queue.append((time.monotonic(), event, payload))
+        self.stats["queued"] += 1
+        if sid not in self._workers:
+            self._workers[sid] = asyncio.create_task(self._drain(sid))
+
+    def _make_room(self, queue: Deque[QueuedMessage], event: str) -> bool:
+        """Libera un hueco descartando el candidato ICE más antiguo; False si hay que descartar el nuevo"""
+        for index, (_, queued_event, _) in enumerate(queue):
+            if queued_event in DROPPABLE_EVENTS:
+                del queue[index]
+                self.stats["dropped." + queued_event] += 1
+                return True
+        # Solo quedan mensajes críticos: offers/answers se aceptan por encima del límite
+        return event in CRITICAL_EVENTS
+
+    async def _drain(self, sid: str):
+        queue = self.queues.get(sid)
+        try:
+            while queue:
+                if time.monotonic() - queue[0][0] > self.lag_threshold:
+                    await self._disconnect_lagging(sid, len(queue))
+                    return
+                if self.engine_backlog(sid) > self.engine_high_watermark:
+                    await asyncio.sleep(self.poll_interval)
+                    continue
+                _, event, payload = queue.popleft()
+                await self.sio.emit(event, payload, to=sid)
+        finally:
+            self._workers.pop(sid, None)
+            if not queue:
+                self.queues.pop(sid, None)
+                self.congested.discard(sid)
+
+    async def _disconnect_lagging(self, sid: str, depth: int):
+        self.stats["lag_disconnect"] += 1
+        logger.warning("Desconectando cliente atrasado",
+                       extra={"fields": {"sid": sid, "queue_depth": depth, "lag_threshold": self.lag_threshold}})
+        self.discard(sid, cancel_worker=False)
+        await self.sio.disconnect(sid)
+
+    def discard(self, sid: str, cancel_worker: bool = True):
+        """Libera la cola de un sid desconectado"""
+        self.queues.pop(sid, None)
+        self.congested.discard(sid)
+        worker = self._workers.pop(sid, None)
+        if worker is not None and cancel_worker:
+            worker.cancel()
+
+    async def stop(self):
+        workers = list(self._workers.values())
+        for worker in workers:
+            worker.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+        self._workers.clear()
+        self.queues.clear()
+        self.congested.clear()
@@ -0,0 +1,43 @@
+from typing import Tuple
+
+from .metering import metering_service
+from .midi_service import midi_service
+from .mixer_engine import mixer_engine
+from .routing_matrix import SECTIONS, routing_matrix
+from .sfu_service import sfu_service
+
+
+async def _reapply(room_id: str):
+    # The mix plan first: the SFU sends each participant their mix-minus bus when mixing
+    await mixer_engine.refresh_room(room_id)
+    await sfu_service.refresh_room(room_id)
+
+
+async def room_changed(room_id: str, sections: Tuple[str, ...] = SECTIONS):
+    """
+    Routes or membership of a room changed: re-apply them to the server-side mix
+    and the SFU subscriptions, recompile MIDI targets and publish the matrix diff
+    """
+    await _reapply(room_id)
+    midi_service.invalidate(room_id)
+    await routing_matrix.refresh(room_id, sections)
+
+
+async def source_changed(section: str, source):
+    """An audio or video source was updated (volume, mute, enable, ...)"""
+    await _reapply(source.room_id)
+    await routing_matrix.put_document(section, source)
+
+
+async def participant_left(room_id: str, participant_id: str):
+    await sfu_service.remove_participant(room_id, participant_id)
+    await room_changed(room_id)
+
+
+async def room_removed(room_id: str):
+    """The room was deleted: drop its state everywhere"""
+    await routing_matrix.delete_room(room_id)
+    await sfu_service.remove_room(room_id)
+    mixer_engine.remove_room(room_id)
+    metering_service.remove_room(room_id)
+    midi_service.invalidate(room_id)
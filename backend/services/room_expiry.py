@@ -0,0 +1,82 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class RoomExpiryScheduler:
+    """
+    Programa la expiración de salas vacías con un heap de deadlines.
+    Programar y cancelar cuestan O(log n) / O(1); las entradas canceladas se
+    descartan de forma perezosa cuando llegan a la cima del heap.
+    """
+
+    def __init__(self, on_expire: Callable[[str], None]):
+        self.on_expire = on_expire
+        self._heap: List[Tuple[float, int, str]] = []  # (deadline monotónico, token, room_id)
+        self._scheduled: Dict[str, int] = {}           # {room_id: token vigente}
+        self._tokens = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return len(self._scheduled)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def schedule(self, room_id: str, delay_seconds: float):
+        """Programa (o reprograma) la expiración de la sala"""
+        token = next(self._tokens)
+        self._scheduled[room_id] = token
+        entry = (time.monotonic() + delay_seconds, token, room_id)
+        heapq.heappush(self._heap, entry)
+        if self._heap[0] is entry:
+            self._wakeup.set()  # nuevo deadline más cercano
+        if len(self._heap) > 2 * len(self._scheduled) + 64:
+            self._compact()
+
+    def cancel(self, room_id: str):
+        """La sala vuelve a tener miembros: la entrada del heap queda obsoleta"""
+        self._scheduled.pop(room_id, None)
+
+    def _compact(self):
+        self._heap = [entry for entry in self._heap if self._scheduled.get(entry[2]) == entry[1]]
+        heapq.heapify(self._heap)
+
+    async def _run(self):
+        while True:
+            while self._heap and self._scheduled.get(self._heap[0][2]) != self._heap[0][1]:
+                heapq.heappop(self._heap)
+
+            if not self._heap:
+                await self._wakeup.wait()
+                self._wakeup.clear()
+                continue
+
+            delay = self._heap[0][0] - time.monotonic()
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+                continue
+
+            _, _, room_id = heapq.heappop(self._heap)
+            del self._scheduled[room_id]
+            try:
+                self.on_expire(room_id)
+            except Exception:
+                logger.exception("Error expirando sala", extra={"fields": {"room_id": room_id}})
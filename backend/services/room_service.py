@@ -1,17 +1,33 @@
+import asyncio
+import os
 from typing import List, Optional
 from motor.motor_asyncio import AsyncIOMotorDatabase
-from models import Room, RoomCreate, Participant, AudioSource, VideoSource, Route, RoomResponse, SourceType
-from database import get_database
+from pymongo import ReturnDocument
+from models import Room, RoomCreate, Participant, AudioSource, VideoSource, RoomResponse, SourceType
+from database import get_database, raw_collection
+from .cache import audio_source_cache, video_source_cache, route_cache
+from .routing_graph import routing_graphs
+from .routing_service import routing_service
 import uuid
 from datetime import datetime
 
+# Joined into the room document by get_room_details: {field: collection}. The
+# fields are prefixed because Room already has a "participants" list of ids
+ROOM_DETAIL_LOOKUPS = {
+    "_participants": "participants",
+    "_audio_sources": "audio_sources",
+    "_video_sources": "video_sources",
+    "_routes": "routes",
+}
+
 
 class RoomService:
-    def __init__(self):
+    def __init__(self, join_transactions: bool = False):
         self.db: Optional[AsyncIOMotorDatabase] = None
+        self.join_transactions = join_transactions
 
     async def get_db(self):
-        if not self.db:
+        if self.db is None:
             self.db = await get_database()
         return self.db
 
@@ -42,96 +58,181 @@ class RoomService:
     async def get_room(self, room_id: str) -> Optional[Room]:
         """Get room by ID"""
         db = await self.get_db()
-        room_doc = await db.rooms.find_one({"id": room_id})
+        room_doc = await db.rooms.find_one({"id": room_id}, {"_id": 0})
         return Room(**room_doc) if room_doc else None
 
     async def get_room_by_code(self, invite_code: str) -> Optional[Room]:
         """Get room by invite code"""
         db = await self.get_db()
-        room_doc = await db.rooms.find_one({"invite_code": invite_code.upper()})
+        room_doc = await db.rooms.find_one({"invite_code": invite_code.upper()}, {"_id": 0})
         return Room(**room_doc) if room_doc else None
 
     async def get_rooms(self, director_id: str) -> List[Room]:
         """Get all rooms for a director"""
+        return [Room(**room_doc) for room_doc in await self.get_room_documents(director_id)]
+
+    async def get_room_documents(self, director_id: str) -> List[dict]:
+        """A director's rooms as stored (no _id), for read endpoints that serialize them directly"""
         db = await self.get_db()
-        rooms_cursor = db.rooms.find({"director_id": director_id})
-        rooms = []
-        async for room_doc in rooms_cursor:
-            rooms.append(Room(**room_doc))
-        return rooms
+        return await db.rooms.find({"director_id": director_id}, {"_id": 0}).to_list(None)
 
     async def get_room_details(self, room_id: str) -> Optional[RoomResponse]:
         """Get complete room details with participants, sources, and routes"""
+        details = await self.get_room_details_document(room_id)
+        return RoomResponse(**details) if details else None
+
+    @staticmethod
+    def _room_details_pipeline(room_id: str) -> List[dict]:
+        """One round trip: the room with every related collection joined in"""
+        return [
+            {"$match": {"id": room_id}},
+            {"$limit": 1},
+            *[{"$lookup": {"from": collection, "localField": "id", "foreignField": "room_id", "as": field}}
+              for field, collection in ROOM_DETAIL_LOOKUPS.items()],
+            {"$project": {"_id": 0, **{f"{field}._id": 0 for field in ROOM_DETAIL_LOOKUPS}}},
+        ]
+
+    async def get_room_details_document(self, room_id: str) -> Optional[dict]:
+        """Room details in RoomResponse's shape, as stored documents (no _id, no model validation)"""
         db = await self.get_db()
-        
-        room = await self.get_room(room_id)
-        if not room:
+        room_docs = await db.rooms.aggregate(self._room_details_pipeline(room_id)).to_list(1)
+        if not room_docs:
             return None
-
-        # Get participants
-        participants_cursor = db.participants.find({"room_id": room_id})
-        participants = []
-        async for participant_doc in participants_cursor:
-            participants.append(Participant(**participant_doc))
-
-        # Get audio sources
-        audio_cursor = db.audio_sources.find({"room_id": room_id})
-        audio_sources = []
-        async for audio_doc in audio_cursor:
-            audio_sources.append(AudioSource(**audio_doc))
-
-        # Get video sources
-        video_cursor = db.video_sources.find({"room_id": room_id})
-        video_sources = []
-        async for video_doc in video_cursor:
-            video_sources.append(VideoSource(**video_doc))
-
-        # Get routes
-        routes_cursor = db.routes.find({"room_id": room_id})
-        routes = []
-        async for route_doc in routes_cursor:
-            routes.append(Route(**route_doc))
-
-        return RoomResponse(
-            room=room,
-            participants=participants,
-            audio_sources=audio_sources,
-            video_sources=video_sources,
-            routes=routes
-        )
+        room_doc = room_docs[0]
+        related = {field: room_doc.pop(field) for field in ROOM_DETAIL_LOOKUPS}
+
+        # The listings are complete, so they warm the services' caches too
+        audio_source_cache.put_room(room_id, related["_audio_sources"])
+        video_source_cache.put_room(room_id, related["_video_sources"])
+        route_cache.put_room(room_id, related["_routes"])
+
+        return {
+            "room": room_doc,
+            "participants": related["_participants"],
+            "audio_sources": related["_audio_sources"],
+            "video_sources": related["_video_sources"],
+            "routes": related["_routes"],
+        }
+
+    async def stream_room_details(self, room_id: str) -> Optional[dict]:
+        """
+        Room details for a streamed response. On Mongo the joined document is
+        read as raw BSON: only its top level is decoded here, each related
+        document stays a RawBSONDocument until it is written to the body (and
+        the caches are not warmed). The in-memory backend uses the document path.
+        """
+        rooms = raw_collection("rooms")
+        if rooms is None:
+            return await self.get_room_details_document(room_id)
+        room_docs = await rooms.aggregate(self._room_details_pipeline(room_id)).to_list(1)
+        if not room_docs:
+            return None
+        room_doc = dict(room_docs[0].items())
+        related = {field: room_doc.pop(field) for field in ROOM_DETAIL_LOOKUPS}
+        return {
+            "room": room_doc,
+            "participants": related["_participants"],
+            "audio_sources": related["_audio_sources"],
+            "video_sources": related["_video_sources"],
+            "routes": related["_routes"],
+        }
 
     async def join_room(self, room_code: str, participant_name: str) -> Optional[Participant]:
-        """Add a participant to a room"""
+        """
+        Add a participant to a room, with their microphone/camera sources and
+        default routes. Two round trips: an atomic seat reservation on the room
+        document, then every insert at once. With JOIN_TRANSACTIONS=1 (replica
+        set required) the whole join runs in one multi-document transaction; the
+        in-memory backend has no sessions and uses the compensating path.
+        """
         db = await self.get_db()
-        
-        room = await self.get_room_by_code(room_code)
-        if not room:
-            return None
 
-        # Check if room is full
-        participant_count = await db.participants.count_documents({"room_id": room.id})
-        if participant_count >= room.max_participants:
-            raise ValueError("Room is full")
-
-        # Create participant
         participant = Participant(
             name=participant_name,
-            room_id=room.id,
+            room_id="",
             avatar=f"https://api.dicebear.com/7.x/avataaars/svg?seed={participant_name}"
         )
 
-        await db.participants.insert_one(participant.dict())
+        if self.join_transactions and db.client is not None:
+            async with await db.client.start_session() as session:
+                async with session.start_transaction():
+                    documents = await self._reserve_seat(room_code, participant, session=session)
+                    if documents is None:
+                        return None
+                    for collection, docs in documents:
+                        await db[collection].insert_many(docs, session=session)
+        else:
+            documents = await self._reserve_seat(room_code, participant)
+            if documents is None:
+                return None
+            try:
+                await asyncio.gather(*[db[collection].insert_many(docs, ordered=False)
+                                       for collection, docs in documents])
+            except Exception:
+                # Give the seat back and drop whatever made it in
+                await self._rollback_join(participant)
+                raise
+
+        caches = {"audio_sources": audio_source_cache, "video_sources": video_source_cache, "routes": route_cache}
+        for collection, docs in documents:
+            if collection in caches:
+                for doc in docs:
+                    caches[collection].put(doc)
+
+        # New sources belong to the participant: the room's graph is rebuilt on next use
+        routing_graphs.drop(participant.room_id)
 
-        # Update room participants list
-        await db.rooms.update_one(
-            {"id": room.id},
-            {"$addToSet": {"participants": participant.id}}
+        return participant
+
+    async def _reserve_seat(self, room_code: str, participant: Participant, session=None):
+        """
+        Add the participant to the room if it has a free seat (capacity is checked
+        in the same update, so concurrent joins cannot overfill it) and build the
+        documents to insert: [(collection, documents)]. None when no room has the code.
+        """
+        db = await self.get_db()
+
+        room_doc = await db.rooms.find_one_and_update(
+            {
+                "invite_code": room_code.upper(),
+                "$expr": {"$lt": [{"$size": {"$ifNull": ["$participants", []]}}, "$max_participants"]}
+            },
+            {"$addToSet": {"participants": participant.id}},
+            return_document=ReturnDocument.AFTER,
+            session=session
         )
+        if not room_doc:
+            if await db.rooms.find_one({"invite_code": room_code.upper()}, {"_id": 1}, session=session):
+                raise ValueError("Room is full")
+            return None
 
-        # Create audio and video sources for the participant
-        await self._create_participant_sources(room.id, participant.id, participant_name)
+        room_id = room_doc["id"]
+        microphone, camera = self._build_participant_sources(room_id, participant.id, participant.name)
+        participant.room_id = room_id
+        participant.audio_source_id = microphone.id
+        participant.video_source_id = camera.id
 
-        return participant
+        other_participants = [p for p in room_doc["participants"] if p != participant.id]
+        routes = routing_service.build_participant_routes(room_id, [microphone.id], [camera.id], other_participants)
+
+        return [
+            ("participants", [participant.dict()]),
+            ("audio_sources", [microphone.dict()]),
+            ("video_sources", [camera.dict()]),
+            ("routes", [route.dict() for route in routes]),
+        ]
+
+    async def _rollback_join(self, participant: Participant):
+        """Compensate a partially applied join outside a transaction"""
+        db = await self.get_db()
+        await asyncio.gather(
+            db.rooms.update_one({"id": participant.room_id}, {"$pull": {"participants": participant.id}}),
+            db.participants.delete_one({"id": participant.id}),
+            db.audio_sources.delete_many({"participant_id": participant.id}),
+            db.video_sources.delete_many({"participant_id": participant.id}),
+            db.routes.delete_many({"source_id": {"$in": [participant.audio_source_id, participant.video_source_id]}}),
+            return_exceptions=True
+        )
 
     async def leave_room(self, room_id: str, participant_id: str) -> bool:
         """Remove a participant from a room"""
@@ -152,17 +253,28 @@ class RoomService:
             {"$pull": {"participants": participant_id}}
         )
 
-        # Remove participant's sources
-        await db.audio_sources.delete_many({"participant_id": participant_id})
-        await db.video_sources.delete_many({"participant_id": participant_id})
-
-        # Remove routes involving this participant
-        await db.routes.delete_many({
-            "$or": [
-                {"source_id": {"$in": await self._get_participant_source_ids(participant_id)}},
-                {"destinations": participant_id}
-            ]
-        })
+        # The participant's source ids come from the database, not from this
+        # worker's routing graph, which may miss routes written by other workers
+        audio_docs, video_docs = await asyncio.gather(
+            db.audio_sources.find({"participant_id": participant_id}, {"_id": 0, "id": 1}).to_list(None),
+            db.video_sources.find({"participant_id": participant_id}, {"_id": 0, "id": 1}).to_list(None),
+        )
+        source_ids = [doc["id"] for doc in audio_docs + video_docs]
+
+        # Remove participant's sources and every route from them or to the participant
+        await asyncio.gather(
+            db.audio_sources.delete_many({"participant_id": participant_id}),
+            db.video_sources.delete_many({"participant_id": participant_id}),
+            db.routes.delete_many({
+                "room_id": room_id,
+                "$or": [
+                    {"source_id": {"$in": source_ids}},
+                    {"destinations": participant_id},
+                ],
+            }),
+        )
+        # Caches and the routing graph are rebuilt from the database on next use
+        self._invalidate_room_caches(room_id)
 
         return True
 
@@ -180,6 +292,7 @@ class RoomService:
         await db.audio_sources.delete_many({"room_id": room_id})
         await db.video_sources.delete_many({"room_id": room_id})
         await db.routes.delete_many({"room_id": room_id})
+        self._invalidate_room_caches(room_id)
         await db.sessions.delete_many({"room_id": room_id})
         await db.signaling.delete_many({"room_id": room_id})
 
@@ -188,6 +301,12 @@ class RoomService:
         
         return True
 
+    def _invalidate_room_caches(self, room_id: str):
+        """Bulk deletes bypass the services' write-through caches"""
+        for cache in (audio_source_cache, video_source_cache, route_cache):
+            cache.invalidate_room(room_id)
+        routing_graphs.drop(room_id)
+
     def _generate_invite_code(self) -> str:
         """Generate a random 6-character invite code"""
         import random
@@ -208,47 +327,26 @@ class RoomService:
             volume=0.3
         )
         await db.audio_sources.insert_one(background_music.dict())
+        audio_source_cache.put(background_music.dict())
 
-    async def _create_participant_sources(self, room_id: str, participant_id: str, participant_name: str):
-        """Create audio and video sources for a participant"""
-        db = await self.get_db()
-
-        # Create microphone source
+    def _build_participant_sources(self, room_id: str, participant_id: str, participant_name: str):
+        """Microphone and camera sources for a participant (not yet stored)"""
         microphone = AudioSource(
             name=f"{participant_name} - Microphone",
             type=SourceType.MICROPHONE,
             participant_id=participant_id,
             room_id=room_id
         )
-        await db.audio_sources.insert_one(microphone.dict())
-
-        # Create camera source
         camera = VideoSource(
             name=f"{participant_name} - Camera",
             type=SourceType.CAMERA,
             participant_id=participant_id,
             room_id=room_id
         )
-        await db.video_sources.insert_one(camera.dict())
-
-    async def _get_participant_source_ids(self, participant_id: str) -> List[str]:
-        """Get all source IDs for a participant"""
-        db = await self.get_db()
-        
-        source_ids = []
-        
-        # Get audio source IDs
-        audio_cursor = db.audio_sources.find({"participant_id": participant_id})
-        async for audio_doc in audio_cursor:
-            source_ids.append(audio_doc["id"])
-
-        # Get video source IDs
-        video_cursor = db.video_sources.find({"participant_id": participant_id})
-        async for video_doc in video_cursor:
-            source_ids.append(video_doc["id"])
-
-        return source_ids
+        return microphone, camera
 
 
 # Global room service instance
-room_service = RoomService()
\ No newline at end of file
+room_service = RoomService(
+    join_transactions=os.environ.get("JOIN_TRANSACTIONS", "0") == "1",
+)
@@ -0,0 +1,287 @@
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+from database import get_database
+
+MEDIA_TYPES = ("audio", "video")
+
+
+class RoutingGraph:
+    """
+    A room's routes as adjacency matrices over interned node ids.
+
+    Every source, participant and output (obs_main, ...) gets a small integer
+    index; links[type][source, destination] counts the active routes of that
+    type between the two nodes, so connect/disconnect is an O(1) increment and
+    "who is routed where" is a row/column scan. gains holds the audio route
+    volume for each pair. owner[source] is the participant a source belongs to
+    (-1 for room sources such as background music), which is what turns
+    source-level routing into participant-level questions (who hears whom,
+    mix-minus).
+    """
+
+    def __init__(self, room_id: str, capacity: int = 32):
+        self.room_id = room_id
+        self.ids: List[str] = []
+        self.index: Dict[str, int] = {}
+        self.links = {media: np.zeros((capacity, capacity), dtype=np.int16) for media in MEDIA_TYPES}
+        self.gains = np.zeros((capacity, capacity), dtype=np.float32)
+        self.owner = np.full(capacity, -1, dtype=np.int32)
+        # {route id: [type, source index, destination indexes, volume, is_active]}
+        self.routes: Dict[str, list] = {}
+
+    # ---- Nodes ----
+    def intern(self, node_id: str) -> int:
+        index = self.index.get(node_id)
+        if index is None:
+            index = self.index[node_id] = len(self.ids)
+            self.ids.append(node_id)
+            if index >= self.owner.shape[0]:
+                self._grow(2 * self.owner.shape[0])
+        return index
+
+    def _grow(self, capacity: int):
+        extra = capacity - self.owner.shape[0]
+        for media in MEDIA_TYPES:
+            self.links[media] = np.pad(self.links[media], ((0, extra), (0, extra)))
+        self.gains = np.pad(self.gains, ((0, extra), (0, extra)))
+        self.owner = np.pad(self.owner, (0, extra), constant_values=-1)
+
+    def set_owner(self, source_id: str, participant_id: Optional[str]):
+        self.owner[self.intern(source_id)] = self.intern(participant_id) if participant_id else -1
+
+    # ---- Routes ----
+    def put_route(self, route: dict):
+        """Add a route or bring an existing one in line with its document"""
+        entry = self.routes.get(route["id"])
+        source = self.intern(route["source_id"])
+        if entry is not None and (entry[0] != route["type"] or entry[1] != source):
+            self.remove_route(route["id"])
+            entry = None
+        if entry is None:
+            entry = self.routes[route["id"]] = [route["type"], source, set(), route.get("volume") or 0.0, False]
+
+        if entry[4] and not route.get("is_active", True):
+            self._link_all(entry, -1)
+        entry[3] = route.get("volume") or 0.0
+        if not entry[4] and route.get("is_active", True):
+            self._link_all(entry, 1)
+
+        destinations = {self.intern(destination) for destination in route.get("destinations", [])}
+        for destination in entry[2] - destinations:
+            self.disconnect(route["id"], self.ids[destination])
+        for destination in destinations - entry[2]:
+            self.connect(route["id"], self.ids[destination])
+        if entry[4] and entry[0] == "audio":
+            self.gains[source, list(entry[2])] = entry[3]
+
+    def remove_route(self, route_id: str):
+        entry = self.routes.pop(route_id, None)
+        if entry is not None and entry[4]:
+            self._link_all(entry, -1)
+
+    def connect(self, route_id: str, destination_id: str):
+        entry = self.routes[route_id]
+        destination = self.intern(destination_id)
+        if destination in entry[2]:
+            return
+        entry[2].add(destination)
+        if entry[4]:
+            self._link(entry, destination, 1)
+
+    def disconnect(self, route_id: str, destination_id: str):
+        entry = self.routes[route_id]
+        destination = self.index.get(destination_id)
+        if destination is None or destination not in entry[2]:
+            return
+        entry[2].discard(destination)
+        if entry[4]:
+            self._link(entry, destination, -1)
+
+    def _link(self, entry: list, destination: int, delta: int):
+        links = self.links[entry[0]]
+        links[entry[1], destination] += delta
+        if entry[0] == "audio":
+            self.gains[entry[1], destination] = entry[3] if links[entry[1], destination] else 0.0
+
+    def _link_all(self, entry: list, delta: int):
+        entry[4] = delta > 0
+        for destination in entry[2]:
+            self._link(entry, destination, delta)
+
+    # ---- Queries ----
+    def _size(self) -> int:
+        return len(self.ids)
+
+    def destinations_of(self, source_id: str, media: str = "audio") -> List[str]:
+        source = self.index.get(source_id)
+        if source is None:
+            return []
+        return [self.ids[i] for i in np.flatnonzero(self.links[media][source, :self._size()])]
+
+    def sources_for(self, destination_id: str, media: str = "audio") -> List[str]:
+        destination = self.index.get(destination_id)
+        if destination is None:
+            return []
+        return [self.ids[i] for i in np.flatnonzero(self.links[media][:self._size(), destination])]
+
+    def participants(self) -> List[int]:
+        return sorted({int(owner) for owner in self.owner[:self._size()] if owner >= 0})
+
+    def who_hears_whom(self, media: str = "audio") -> Dict[str, List[str]]:
+        """{participant: participants whose sources are routed to them}"""
+        n = self._size()
+        participants = self.participants()
+        # ownership[p, s]: participant p owns source s; routed[s, d]: s reaches d
+        ownership = np.zeros((len(participants), n), dtype=np.int32)
+        for row, participant in enumerate(participants):
+            ownership[row] = self.owner[:n] == participant
+        reaches = ownership @ (self.links[media][:n, :n] > 0).astype(np.int32)
+        return {
+            self.ids[listener]: [self.ids[participants[row]] for row in np.flatnonzero(reaches[:, listener])
+                                 if participants[row] != listener]
+            for listener in participants
+        }
+
+    def self_monitoring(self, media: str = "audio") -> List[Tuple[str, str]]:
+        """(participant, source) pairs where a participant receives their own source: echo, breaks mix-minus"""
+        n = self._size()
+        sources, destinations = np.nonzero(self.links[media][:n, :n])
+        return [(self.ids[d], self.ids[s]) for s, d in zip(sources, destinations) if self.owner[s] == d]
+
+    def mix_minus(self) -> Dict[str, Dict[str, float]]:
+        """{participant: {audio source: volume}}: everything routed to them except their own sources"""
+        n = self._size()
+        result = {}
+        for participant in self.participants():
+            column = self.links["audio"][:n, participant]
+            result[self.ids[participant]] = {
+                self.ids[source]: float(self.gains[source, participant])
+                for source in np.flatnonzero(column) if self.owner[source] != participant
+            }
+        return result
+
+    def feedback_cycles(self, media: str = "audio") -> List[List[str]]:
+        """
+        Routing loops: groups of nodes that feed each other. Besides the routes,
+        every participant feeds the sources they own (what reaches them can be
+        picked up again by their microphone or camera), so a participant routed
+        their own source, or two participants routed to each other, form a loop.
+        Strongly connected components with more than one node, or a node routed
+        to itself.
+        """
+        n = self._size()
+        edges = self.links[media][:n, :n] > 0
+        owned = np.flatnonzero(self.owner[:n] >= 0)
+        edges[self.owner[owned], owned] = True
+        adjacency = [np.flatnonzero(row).tolist() for row in edges]
+        order, low, on_stack, stack, cycles = {}, {}, set(), [], []
+        for root in range(n):
+            if root in order:
+                continue
+            work = [(root, 0)]
+            while work:
+                node, next_edge = work.pop()
+                if next_edge == 0:
+                    order[node] = low[node] = len(order)
+                    stack.append(node)
+                    on_stack.add(node)
+                if next_edge < len(adjacency[node]):
+                    work.append((node, next_edge + 1))
+                    neighbour = adjacency[node][next_edge]
+                    if neighbour not in order:
+                        work.append((neighbour, 0))
+                    elif neighbour in on_stack:
+                        low[node] = min(low[node], order[neighbour])
+                    continue
+                if low[node] == order[node]:
+                    component = []
+                    while True:
+                        member = stack.pop()
+                        on_stack.discard(member)
+                        component.append(member)
+                        if member == node:
+                            break
+                    if len(component) > 1 or edges[node, node]:
+                        cycles.append([self.ids[member] for member in reversed(component)])
+                if work:
+                    parent = work[-1][0]
+                    low[parent] = min(low[parent], low[node])
+        return cycles
+
+    # ---- Persistence ----
+    def to_document(self) -> dict:
+        """Compact form: node ids once, routes and ownership as integer indexes"""
+        return {
+            "room_id": self.room_id,
+            "nodes": list(self.ids),
+            "owners": [[int(source), int(owner)] for source, owner in enumerate(self.owner[:self._size()]) if owner >= 0],
+            "routes": [[route_id, entry[0], entry[1], sorted(entry[2]), entry[3], entry[4]]
+                       for route_id, entry in self.routes.items()],
+            "updated_at": datetime.utcnow(),
+        }
+
+
+def build_graph(room_id: str, routes: Iterable[dict], sources: Iterable[dict]) -> RoutingGraph:
+    graph = RoutingGraph(room_id)
+    for source in sources:
+        graph.set_owner(source["id"], source.get("participant_id"))
+    for route in routes:
+        graph.put_route(route)
+    return graph
+
+
+class RoutingGraphStore:
+    """Per-room graphs kept in step with route writes; saved to routing_graphs as compact documents"""
+
+    def __init__(self):
+        self.graphs: Dict[str, RoutingGraph] = {}
+        self.route_rooms: Dict[str, str] = {}  # {route id: room_id} of tracked routes
+        self.dirty: Set[str] = set()
+
+    def get(self, room_id: str) -> Optional[RoutingGraph]:
+        return self.graphs.get(room_id)
+
+    def put(self, graph: RoutingGraph) -> RoutingGraph:
+        self.graphs[graph.room_id] = graph
+        for route_id in graph.routes:
+            self.route_rooms[route_id] = graph.room_id
+        self.dirty.add(graph.room_id)
+        return graph
+
+    def put_route(self, route: dict):
+        graph = self.graphs.get(route["room_id"])
+        if graph is not None:
+            graph.put_route(route)
+            self.route_rooms[route["id"]] = route["room_id"]
+            self.dirty.add(route["room_id"])
+
+    def remove_route(self, route_id: str):
+        room_id = self.route_rooms.pop(route_id, None)
+        graph = self.graphs.get(room_id)
+        if graph is not None:
+            graph.remove_route(route_id)
+            self.dirty.add(room_id)
+
+    def drop(self, room_id: str):
+        """Membership or sources changed in bulk: rebuilt from the routes on next use"""
+        graph = self.graphs.pop(room_id, None)
+        if graph is not None:
+            for route_id in graph.routes:
+                self.route_rooms.pop(route_id, None)
+        self.dirty.discard(room_id)
+
+    async def save(self, room_id: str):
+        """Write the room's compact graph document if it changed since the last save"""
+        graph = self.graphs.get(room_id)
+        if graph is None or room_id not in self.dirty:
+            return
+        self.dirty.discard(room_id)
+        db = await get_database()
+        await db.routing_graphs.replace_one({"room_id": room_id}, graph.to_document(), upsert=True)
+
+
+# Global routing graph store (kept in step by routing_service)
+routing_graphs = RoutingGraphStore()
@@ -0,0 +1,294 @@
+import logging
+import os
+import uuid
+from collections import Counter, deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+from fastapi.encoders import jsonable_encoder
+from pymongo import ReturnDocument
+
+from database import get_database
+from .audio_service import audio_service
+from .routing_service import routing_service
+from .video_service import video_service
+
+logger = logging.getLogger(__name__)
+
+# Sections of the versioned matrix, each {document id: document}
+SECTIONS = ("audio_sources", "video_sources", "routes", "participants")
+
+
+def _escape(token: str) -> str:
+    """JSON Pointer token (RFC 6901)"""
+    return token.replace("~", "~0").replace("/", "~1")
+
+
+def _unescape(token: str) -> str:
+    return token.replace("~1", "/").replace("~0", "~")
+
+
+def apply_ops(sections: Dict[str, Dict[str, dict]], ops: List[dict]):
+    """Apply a patch produced by diff_documents (or set_fields) to the matrix sections in place"""
+    for op in ops:
+        section, document_id, *field = [_unescape(token) for token in op["path"].split("/")[1:]]
+        documents = sections[section]
+        if not field:
+            if op["op"] == "remove":
+                documents.pop(document_id, None)
+            else:
+                documents[document_id] = dict(op["value"])
+            continue
+        document = documents.get(document_id)
+        if document is None:
+            continue
+        if op["op"] == "remove":
+            document.pop(field[0], None)
+        else:
+            document[field[0]] = op["value"]
+
+
+def diff_documents(section: str, old: Dict[str, dict], new: Dict[str, dict]) -> List[dict]:
+    """JSON Patch (RFC 6902) turning one section of the matrix into another; changed documents are patched per field"""
+    ops = []
+    for document_id in old.keys() - new.keys():
+        ops.append({"op": "remove", "path": f"/{section}/{_escape(document_id)}"})
+    for document_id, document in new.items():
+        previous = old.get(document_id)
+        path = f"/{section}/{_escape(document_id)}"
+        if previous is None:
+            ops.append({"op": "add", "path": path, "value": document})
+            continue
+        for field in previous.keys() - document.keys():
+            ops.append({"op": "remove", "path": f"{path}/{_escape(field)}"})
+        for field, value in document.items():
+            if field not in previous:
+                ops.append({"op": "add", "path": f"{path}/{_escape(field)}", "value": value})
+            elif previous[field] != value:
+                ops.append({"op": "replace", "path": f"{path}/{_escape(field)}", "value": value})
+    return ops
+
+
+class RoomMatrix:
+    def __init__(self, history: int, epoch: str, version: int):
+        self.epoch = epoch      # versions only compare within one epoch (lifetime of the room's matrix_state document)
+        self.version = version
+        self.sections: Dict[str, Dict[str, dict]] = {section: {} for section in SECTIONS}
+        self.history: Deque[Tuple[int, List[dict]]] = deque(maxlen=history)  # (version, ops)
+
+    def snapshot(self) -> dict:
+        return {"epoch": self.epoch, "version": self.version, **self.sections}
+
+
+class RoutingMatrixService:
+    """
+    Per-room routing matrix held in memory with a version number. Every
+    mutation of a route, source or participant becomes a JSON Patch against
+    the previous version, broadcast to the room as "matrix-patch"
+    ({"room_id", "epoch", "version", "ops"}); the last history_size patches
+    are kept so a client that missed some can ask for the changes since its
+    version instead of refetching the whole matrix. Documents are keyed by
+    id, so patch paths look like /routes/<route id>/volume.
+
+    The epoch, the version counter and the patch history live in one
+    matrix_state document per room, shared by every worker: a version and
+    its patch are allocated in a single atomic update, and before reading or
+    diffing, a worker applies the patches other workers published since its
+    own version. A client can therefore reconnect to any worker (or across
+    restarts) and still receive patches instead of a full snapshot.
+
+    Only rooms someone asked for are tracked; hooks for other rooms are no-ops.
+    """
+
+    def __init__(self, history_size: int = 256):
+        self.history_size = history_size
+        self.rooms: Dict[str, RoomMatrix] = {}
+        self.sio_manager = None
+        self.stats: Counter = Counter()
+
+    def attach(self, sio_manager):
+        self.sio_manager = sio_manager
+
+    # ---- Reads ----
+    async def get_snapshot(self, room_id: str) -> dict:
+        matrix = await self._track(room_id)
+        await self._sync(room_id, matrix)
+        return matrix.snapshot()
+
+    async def get_changes(self, room_id: str, since: int, epoch: Optional[str] = None) -> dict:
+        """
+        Patches after version `since` of `epoch`, oldest first. When they are no
+        longer in the history, or the client's version belongs to another epoch
+        (the room's matrix state was recreated), the full snapshot is returned
+        instead, under "snapshot".
+        """
+        matrix = await self._track(room_id)
+        await self._sync(room_id, matrix)
+        response = {"room_id": room_id, "epoch": matrix.epoch, "version": matrix.version}
+        oldest = matrix.history[0][0] if matrix.history else matrix.version + 1
+        if epoch == matrix.epoch and oldest - 1 <= since <= matrix.version:
+            self.stats["changes_served"] += 1
+            response["patches"] = [{"version": version, "ops": ops} for version, ops in matrix.history if version > since]
+            return response
+        self.stats["snapshots_served"] += 1
+        response["snapshot"] = matrix.snapshot()
+        return response
+
+    # ---- Mutation hooks ----
+    async def refresh(self, room_id: str, sections: Tuple[str, ...] = SECTIONS):
+        """Reload sections of a tracked room (reads go through the services' caches) and publish the diff"""
+        matrix = self.rooms.get(room_id)
+        if matrix is None:
+            return
+        await self._sync(room_id, matrix)
+        loaded = await self._load(room_id, sections)
+        ops = []
+        for section, documents in loaded.items():
+            ops.extend(diff_documents(section, matrix.sections[section], documents))
+            matrix.sections[section] = documents
+        await self._publish(room_id, matrix, ops)
+
+    async def put_document(self, section: str, document) -> None:
+        """A single document was created or updated (model or dict with room_id)"""
+        document = jsonable_encoder(document)
+        matrix = self.rooms.get(document.get("room_id"))
+        if matrix is None:
+            return
+        await self._sync(document["room_id"], matrix)
+        documents = matrix.sections[section]
+        ops = diff_documents(section, {document["id"]: documents[document["id"]]} if document["id"] in documents else {},
+                             {document["id"]: document})
+        documents[document["id"]] = document
+        await self._publish(document["room_id"], matrix, ops)
+
+    async def remove_document(self, room_id: str, section: str, document_id: str):
+        matrix = self.rooms.get(room_id)
+        if matrix is None:
+            return
+        await self._sync(room_id, matrix)
+        if matrix.sections[section].pop(document_id, None) is None:
+            return
+        await self._publish(room_id, matrix, [{"op": "remove", "path": f"/{section}/{_escape(document_id)}"}])
+
+    async def set_fields(self, room_id: str, changes: List[Tuple[str, str, Dict[str, object]]]):
+        """Field-level changes [(section, document id, {field: value})] published as one version (control surfaces)"""
+        matrix = self.rooms.get(room_id)
+        if matrix is None:
+            return
+        await self._sync(room_id, matrix)
+        ops = []
+        for section, document_id, fields in changes:
+            document = matrix.sections[section].get(document_id)
+            if document is None:
+                continue
+            for field, value in fields.items():
+                if document.get(field) != value:
+                    document[field] = value
+                    ops.append({"op": "replace", "path": f"/{section}/{_escape(document_id)}/{_escape(field)}",
+                                "value": value})
+        await self._publish(room_id, matrix, ops)
+
+    def remove_room(self, room_id: str):
+        """Stop tracking a room in this worker (the shared state stays for the other workers)"""
+        self.rooms.pop(room_id, None)
+
+    async def delete_room(self, room_id: str):
+        """The room is gone: drop it here and delete its shared state"""
+        self.remove_room(room_id)
+        db = await get_database()
+        await db.matrix_state.delete_one({"room_id": room_id})
+
+    # ---- Internals ----
+    async def _track(self, room_id: str) -> RoomMatrix:
+        matrix = self.rooms.get(room_id)
+        if matrix is None:
+            matrix = RoomMatrix(self.history_size, "", 0)
+            await self._reload(room_id, matrix)
+            self.rooms[room_id] = matrix
+        return matrix
+
+    async def _reload(self, room_id: str, matrix: RoomMatrix):
+        """Take the room's shared epoch and version (created on first use) and load the documents"""
+        db = await get_database()
+        state = await db.matrix_state.find_one_and_update(
+            {"room_id": room_id},
+            {"$setOnInsert": {"epoch": uuid.uuid4().hex[:12], "version": 0, "patches": []}},
+            projection={"_id": 0},
+            upsert=True, return_document=ReturnDocument.AFTER,
+        )
+        # Documents are loaded after reading the version: patches after it may already be
+        # reflected in them, which is harmless since applying a patch again gives the same state
+        matrix.epoch, matrix.version = state["epoch"], state["version"]
+        matrix.sections.update(await self._load(room_id, SECTIONS))
+        matrix.history.clear()
+        first = state["version"] - len(state["patches"]) + 1
+        matrix.history.extend(enumerate(state["patches"], start=first))
+
+    async def _sync(self, room_id: str, matrix: RoomMatrix):
+        """Apply the patches other workers published since this worker's version"""
+        db = await get_database()
+        state = await db.matrix_state.find_one({"room_id": room_id}, {"_id": 0, "epoch": 1, "version": 1})
+        if state is None or state["epoch"] != matrix.epoch:
+            await self._reload(room_id, matrix)  # the shared state was deleted or recreated
+            return
+        if state["version"] <= matrix.version:
+            return
+        state = await db.matrix_state.find_one({"room_id": room_id}, {"_id": 0, "version": 1, "patches": 1})
+        first = state["version"] - len(state["patches"]) + 1
+        if first > matrix.version + 1:
+            await self._reload(room_id, matrix)  # missed more patches than the history keeps
+        for version, ops in enumerate(state["patches"], start=first):
+            if version > matrix.version:
+                apply_ops(matrix.sections, ops)
+                matrix.history.append((version, ops))
+                matrix.version = version
+                self.stats["patches_synced"] += 1
+
+    async def _load(self, room_id: str, sections: Tuple[str, ...]) -> Dict[str, Dict[str, dict]]:
+        loaded = {}
+        if "audio_sources" in sections:
+            loaded["audio_sources"] = await audio_service.get_audio_sources(room_id)
+        if "video_sources" in sections:
+            loaded["video_sources"] = await video_service.get_video_sources(room_id)
+        if "routes" in sections:
+            loaded["routes"] = await routing_service.get_routes(room_id)
+        if "participants" in sections:
+            db = await get_database()
+            loaded["participants"] = await db.participants.find(
+                {"room_id": room_id}, {"_id": 0, "id": 1, "name": 1}
+            ).to_list(None)
+        return {section: {document["id"]: document for document in jsonable_encoder(documents)}
+                for section, documents in loaded.items()}
+
+    async def _publish(self, room_id: str, matrix: RoomMatrix, ops: List[dict]):
+        if not ops:
+            return
+        db = await get_database()
+        state = await db.matrix_state.find_one_and_update(
+            {"room_id": room_id},
+            {"$inc": {"version": 1}, "$push": {"patches": {"$each": [ops], "$slice": -self.history_size}},
+             "$setOnInsert": {"epoch": uuid.uuid4().hex[:12]}},
+            projection={"_id": 0, "epoch": 1, "version": 1},
+            upsert=True, return_document=ReturnDocument.AFTER,
+        )
+        if state["epoch"] == matrix.epoch and state["version"] == matrix.version + 1:
+            matrix.version = state["version"]
+            matrix.history.append((matrix.version, ops))
+        # Otherwise another worker published in between: the next _sync applies its
+        # patches and this one again, in version order
+        self.stats["patches"] += 1
+        self.stats["ops"] += len(ops)
+        if self.sio_manager is None or not self.sio_manager.rooms.get(room_id):
+            return
+        try:
+            await self.sio_manager.forward_to_peer("matrix-patch", {
+                "room_id": room_id,
+                "payload": {"room_id": room_id, "epoch": state["epoch"], "version": state["version"], "ops": ops},
+            })
+        except Exception:
+            logger.exception("Matrix patch broadcast failed", extra={"fields": {"room_id": room_id}})
+
+
+# Global routing matrix instance
+routing_matrix = RoutingMatrixService(
+    history_size=int(os.environ.get("MATRIX_HISTORY_SIZE", "256")),
+)
@@ -1,7 +1,21 @@
+import asyncio
 from typing import List, Optional, Dict, Any
 from motor.motor_asyncio import AsyncIOMotorDatabase
-from models import Route, RouteCreate, RouteUpdate, AudioSource, VideoSource
-from database import get_database
+from pymongo import ReturnDocument
+from models import Route, RouteCreate, RouteUpdate
+from database import get_database, raw_find
+from .cache import route_cache
+from .routing_graph import RoutingGraph, build_graph, routing_graphs
+from .audio_service import audio_service
+from .video_service import video_service
+
+OBS_OUTPUTS = [
+    {"id": "obs_main", "name": "OBS Main Mix", "type": "obs"},
+    {"id": "obs_camera1", "name": "OBS Camera 1", "type": "obs"},
+    {"id": "obs_camera2", "name": "OBS Camera 2", "type": "obs"},
+    {"id": "obs_audio1", "name": "OBS Audio 1", "type": "obs"},
+    {"id": "obs_audio2", "name": "OBS Audio 2", "type": "obs"},
+]
 
 
 class RoutingService:
@@ -9,7 +23,7 @@ class RoutingService:
         self.db: Optional[AsyncIOMotorDatabase] = None
 
     async def get_db(self):
-        if not self.db:
+        if self.db is None:
             self.db = await get_database()
         return self.db
 
@@ -19,66 +33,88 @@ class RoutingService:
         
         # Validate source exists
         if route_data.type == "audio":
-            source = await db.audio_sources.find_one({"id": route_data.source_id})
+            source = await audio_service.get_audio_source(route_data.source_id)
         else:
-            source = await db.video_sources.find_one({"id": route_data.source_id})
+            source = await video_service.get_video_source(route_data.source_id)
         
         if not source:
             raise ValueError(f"Source {route_data.source_id} not found")
 
         route = Route(**route_data.dict())
         await db.routes.insert_one(route.dict())
+        routing_graphs.put_route(route_cache.put(route.dict()))
         
         return route
 
     async def get_routes(self, room_id: str) -> List[Route]:
         """Get all routes for a room"""
-        db = await self.get_db()
-        routes_cursor = db.routes.find({"room_id": room_id})
-        routes = []
-        async for route_doc in routes_cursor:
-            routes.append(Route(**route_doc))
-        return routes
+        return [Route(**route_doc) for route_doc in await self.get_route_documents(room_id)]
+
+    async def get_route_documents(self, room_id: str) -> List[dict]:
+        """A room's routes as stored (no _id), for read endpoints that serialize them directly"""
+        route_docs = route_cache.get_room(room_id)
+        if route_docs is None:
+            db = await self.get_db()
+            route_docs = await db.routes.find({"room_id": room_id}, {"_id": 0}).to_list(None)
+            route_docs = route_cache.put_room(room_id, route_docs)
+        return route_docs
+
+    async def stream_route_documents(self, room_id: str):
+        """A room's routes for a streamed response: the cached listing when warm, else a raw BSON cursor"""
+        route_docs = route_cache.get_room(room_id)
+        if route_docs is not None:
+            return route_docs
+        cursor = raw_find("routes", {"room_id": room_id}, {"_id": 0})
+        return cursor if cursor is not None else await self.get_route_documents(room_id)
 
     async def get_route(self, route_id: str) -> Optional[Route]:
         """Get a specific route"""
-        db = await self.get_db()
-        route_doc = await db.routes.find_one({"id": route_id})
+        route_doc = route_cache.get(route_id)
+        if route_doc is None:
+            db = await self.get_db()
+            route_doc = await db.routes.find_one({"id": route_id}, {"_id": 0})
+            if route_doc:
+                route_doc = route_cache.put(route_doc)
         return Route(**route_doc) if route_doc else None
 
     async def update_route(self, route_id: str, update_data: RouteUpdate) -> Optional[Route]:
         """Update route settings"""
-        db = await self.get_db()
-        
         # Build update dict, excluding None values
         update_dict = {k: v for k, v in update_data.dict().items() if v is not None}
         
         if not update_dict:
             return await self.get_route(route_id)
 
-        await db.routes.update_one(
+        return await self._find_one_and_update(route_id, {"$set": update_dict})
+
+    async def _find_one_and_update(self, route_id: str, update) -> Optional[Route]:
+        """Apply an update and return the resulting route in one round trip"""
+        db = await self.get_db()
+        route_doc = await db.routes.find_one_and_update(
             {"id": route_id},
-            {"$set": update_dict}
+            update,
+            return_document=ReturnDocument.AFTER
         )
-        
-        return await self.get_route(route_id)
+        if not route_doc:
+            route_cache.remove(route_id)
+            routing_graphs.remove_route(route_id)
+            return None
+        route_doc = route_cache.put(route_doc)
+        routing_graphs.put_route(route_doc)
+        return Route(**route_doc)
 
     async def delete_route(self, route_id: str) -> bool:
         """Delete a route"""
         db = await self.get_db()
         result = await db.routes.delete_one({"id": route_id})
+        route_cache.remove(route_id)
+        routing_graphs.remove_route(route_id)
         return result.deleted_count > 0
 
     async def toggle_route(self, route_id: str) -> Optional[Route]:
         """Toggle route active status"""
-        route = await self.get_route(route_id)
-        if not route:
-            return None
-        
-        return await self.update_route(
-            route_id,
-            RouteUpdate(is_active=not route.is_active)
-        )
+        # Flipped server-side so concurrent toggles cannot lose a write
+        return await self._find_one_and_update(route_id, [{"$set": {"is_active": {"$not": ["$is_active"]}}}])
 
     async def update_route_volume(self, route_id: str, volume: float) -> Optional[Route]:
         """Update audio route volume"""
@@ -92,124 +128,127 @@ class RoutingService:
 
     async def add_destination(self, route_id: str, destination_id: str) -> Optional[Route]:
         """Add destination to a route"""
-        route = await self.get_route(route_id)
-        if not route:
-            return None
-        
-        if destination_id not in route.destinations:
-            new_destinations = route.destinations + [destination_id]
-            return await self.update_route(
-                route_id,
-                RouteUpdate(destinations=new_destinations)
-            )
-        
-        return route
+        return await self._find_one_and_update(route_id, {"$addToSet": {"destinations": destination_id}})
 
     async def remove_destination(self, route_id: str, destination_id: str) -> Optional[Route]:
         """Remove destination from a route"""
-        route = await self.get_route(route_id)
-        if not route:
-            return None
-        
-        if destination_id in route.destinations:
-            new_destinations = [d for d in route.destinations if d != destination_id]
-            return await self.update_route(
-                route_id,
-                RouteUpdate(destinations=new_destinations)
+        return await self._find_one_and_update(route_id, {"$pull": {"destinations": destination_id}})
+
+    async def get_routing_graph(self, room_id: str) -> RoutingGraph:
+        """Adjacency view of a room's routes, built from the cached routes and sources on first use"""
+        graph = routing_graphs.get(room_id)
+        if graph is None:
+            routes, audio_sources, video_sources = await asyncio.gather(
+                self.get_routes(room_id),
+                audio_service.get_audio_sources(room_id),
+                video_service.get_video_sources(room_id),
             )
-        
-        return route
+            graph = routing_graphs.put(build_graph(
+                room_id,
+                [route.dict() for route in routes],
+                [source.dict() for source in audio_sources + video_sources]
+            ))
+        return graph
 
     async def get_routing_matrix(self, room_id: str) -> Dict[str, Any]:
         """Get complete routing matrix for a room"""
         db = await self.get_db()
-        
-        # Get all sources
-        audio_sources = []
-        audio_cursor = db.audio_sources.find({"room_id": room_id})
-        async for source_doc in audio_cursor:
-            audio_sources.append(AudioSource(**source_doc))
-
-        video_sources = []
-        video_cursor = db.video_sources.find({"room_id": room_id})
-        async for source_doc in video_cursor:
-            video_sources.append(VideoSource(**source_doc))
-
-        # Get all routes
-        routes = await self.get_routes(room_id)
-
-        # Get participants for destination info
-        participants = []
-        participants_cursor = db.participants.find({"room_id": room_id})
-        async for participant_doc in participants_cursor:
-            participants.append({
-                "id": participant_doc["id"],
-                "name": participant_doc["name"]
-            })
+
+        # Sources and routes come from the caches when warm (as stored documents); everything runs concurrently
+        audio_sources, video_sources, routes, participants = await asyncio.gather(
+            audio_service.get_audio_source_documents(room_id),
+            video_service.get_video_source_documents(room_id),
+            self.get_route_documents(room_id),
+            db.participants.find({"room_id": room_id}, {"_id": 0, "id": 1, "name": 1}).to_list(None),
+        )
 
         # Build routing matrix
         matrix = {
-            "audio_sources": [source.dict() for source in audio_sources],
-            "video_sources": [source.dict() for source in video_sources],
-            "routes": [route.dict() for route in routes],
+            "audio_sources": audio_sources,
+            "video_sources": video_sources,
+            "routes": routes,
             "participants": participants,
-            "obs_outputs": [
-                {"id": "obs_main", "name": "OBS Main Mix", "type": "obs"},
-                {"id": "obs_camera1", "name": "OBS Camera 1", "type": "obs"},
-                {"id": "obs_camera2", "name": "OBS Camera 2", "type": "obs"},
-                {"id": "obs_audio1", "name": "OBS Audio 1", "type": "obs"},
-                {"id": "obs_audio2", "name": "OBS Audio 2", "type": "obs"}
-            ]
+            "obs_outputs": OBS_OUTPUTS
         }
         
         return matrix
 
+    async def stream_routing_matrix(self, room_id: str) -> Dict[str, Any]:
+        """The routing matrix for a streamed response: cached listings as they are, the rest as raw BSON cursors"""
+        audio_sources, video_sources, routes = await asyncio.gather(
+            audio_service.stream_audio_source_documents(room_id),
+            video_service.stream_video_source_documents(room_id),
+            self.stream_route_documents(room_id),
+        )
+        participants = raw_find("participants", {"room_id": room_id}, {"_id": 0, "id": 1, "name": 1})
+        if participants is None:
+            db = await self.get_db()
+            participants = await db.participants.find({"room_id": room_id}, {"_id": 0, "id": 1, "name": 1}).to_list(None)
+        return {
+            "audio_sources": audio_sources,
+            "video_sources": video_sources,
+            "routes": routes,
+            "participants": participants,
+            "obs_outputs": OBS_OUTPUTS,
+        }
+
     async def auto_route_participant(self, room_id: str, participant_id: str) -> List[Route]:
         """Automatically create routes for a new participant"""
         db = await self.get_db()
         
-        # Get participant's sources
-        audio_sources = await db.audio_sources.find({"participant_id": participant_id}).to_list(None)
-        video_sources = await db.video_sources.find({"participant_id": participant_id}).to_list(None)
-        
-        # Get other participants for destinations
-        other_participants = []
-        participants_cursor = db.participants.find({
-            "room_id": room_id,
-            "id": {"$ne": participant_id}
-        })
-        async for participant_doc in participants_cursor:
-            other_participants.append(participant_doc["id"])
-
-        created_routes = []
-
-        # Create audio routes
-        for audio_source in audio_sources:
-            destinations = other_participants + ["obs_main"]
-            route_data = RouteCreate(
+        # Participant's sources and the other participants, fetched concurrently
+        audio_sources, video_sources, other_participants = await asyncio.gather(
+            db.audio_sources.find({"participant_id": participant_id}, {"id": 1}).to_list(None),
+            db.video_sources.find({"participant_id": participant_id}, {"id": 1}).to_list(None),
+            db.participants.find({"room_id": room_id, "id": {"$ne": participant_id}}, {"id": 1}).to_list(None),
+        )
+
+        created_routes = self.build_participant_routes(
+            room_id,
+            [source["id"] for source in audio_sources],
+            [source["id"] for source in video_sources],
+            [participant["id"] for participant in other_participants]
+        )
+        await self.insert_routes(created_routes)
+
+        return created_routes
+
+    def build_participant_routes(self, room_id: str, audio_source_ids: List[str], video_source_ids: List[str],
+                                 other_participants: List[str]) -> List[Route]:
+        """Default routes for a participant's sources: every other participant plus the OBS outputs"""
+        routes = []
+
+        # Audio routes
+        for source_id in audio_source_ids:
+            routes.append(Route(**RouteCreate(
                 room_id=room_id,
                 type="audio",
-                source_id=audio_source["id"],
-                destinations=destinations,
+                source_id=source_id,
+                destinations=other_participants + ["obs_main"],
                 volume=0.8
-            )
-            route = await self.create_route(route_data)
-            created_routes.append(route)
+            ).dict()))
 
-        # Create video routes
-        for video_source in video_sources:
-            destinations = other_participants + ["obs_camera1"]
-            route_data = RouteCreate(
+        # Video routes
+        for source_id in video_source_ids:
+            routes.append(Route(**RouteCreate(
                 room_id=room_id,
                 type="video",
-                source_id=video_source["id"],
-                destinations=destinations,
+                source_id=source_id,
+                destinations=other_participants + ["obs_camera1"],
                 quality="1080p"
-            )
-            route = await self.create_route(route_data)
-            created_routes.append(route)
+            ).dict()))
 
-        return created_routes
+        return routes
+
+    async def insert_routes(self, routes: List[Route], session=None):
+        """Persist already-validated routes in one insert_many"""
+        if not routes:
+            return
+        db = await self.get_db()
+        route_docs = [route.dict() for route in routes]
+        await db.routes.insert_many(route_docs, ordered=False, session=session)
+        for route_doc in route_docs:
+            routing_graphs.put_route(route_cache.put(route_doc))
 
 
 # Global routing service instance
@@ -1,6 +1,7 @@
 from typing import Optional
 from motor.motor_asyncio import AsyncIOMotorDatabase
-from models import Session, SessionUpdate, SessionResponse, Room, Participant
+from pymongo import ReturnDocument
+from models import Session, SessionUpdate, SessionResponse
 from database import get_database
 from datetime import datetime
 
@@ -10,62 +11,63 @@ class SessionService:
         self.db: Optional[AsyncIOMotorDatabase] = None
 
     async def get_db(self):
-        if not self.db:
+        if self.db is None:
             self.db = await get_database()
         return self.db
 
     async def get_session(self, room_id: str) -> Optional[Session]:
         """Get session for a room"""
         db = await self.get_db()
-        session_doc = await db.sessions.find_one({"room_id": room_id})
+        session_doc = await db.sessions.find_one({"room_id": room_id}, {"_id": 0})
         return Session(**session_doc) if session_doc else None
 
     async def create_session(self, room_id: str) -> Session:
         """Create a new session for a room"""
-        db = await self.get_db()
-        
-        # Check if session already exists
-        existing_session = await self.get_session(room_id)
-        if existing_session:
-            return existing_session
-
-        session = Session(room_id=room_id)
-        await db.sessions.insert_one(session.dict())
-        
-        return session
+        # Upsert: returns the existing session untouched or inserts a new one
+        return await self._upsert(room_id, {})
 
     async def update_session(self, room_id: str, update_data: SessionUpdate) -> Optional[Session]:
         """Update session settings"""
-        db = await self.get_db()
-        
-        session = await self.get_session(room_id)
-        if not session:
-            # Create session if it doesn't exist
-            session = await self.create_session(room_id)
-
         # Build update dict, excluding None values
         update_dict = {k: v for k, v in update_data.dict().items() if v is not None}
         
-        # Add timestamps for recording/streaming state changes
-        if "is_recording" in update_dict:
-            if update_dict["is_recording"]:
-                update_dict["recording_start_time"] = datetime.utcnow()
-            else:
-                update_dict["recording_start_time"] = None
-
-        if "is_streaming" in update_dict:
-            if update_dict["is_streaming"]:
-                update_dict["streaming_start_time"] = datetime.utcnow()
-            else:
-                update_dict["streaming_start_time"] = None
-
-        if update_dict:
-            await db.sessions.update_one(
-                {"room_id": room_id},
-                {"$set": update_dict}
-            )
-
-        return await self.get_session(room_id)
+        # Add timestamps for recording/streaming state changes ($$NOW: server clock)
+        expressions = {}
+        for state, timestamp in (("is_recording", "recording_start_time"), ("is_streaming", "streaming_start_time")):
+            if state in update_dict:
+                if update_dict[state]:
+                    expressions[timestamp] = "$$NOW"
+                else:
+                    update_dict[timestamp] = None
+
+        # Creates the session if it doesn't exist, in the same round trip
+        return await self._upsert(room_id, update_dict, expressions)
+
+    async def _upsert(self, room_id: str, changes: dict, expressions: Optional[dict] = None) -> Session:
+        """
+        Single find_one_and_update with an aggregation-pipeline $set: fields a
+        new session lacks get their defaults through $ifNull, then `changes`
+        are applied on top. Values in `changes` are wrapped in $literal so a
+        string like "$field" is stored as given; `expressions` are aggregation
+        expressions (evaluated against the document as it was).
+        """
+        db = await self.get_db()
+        defaults = Session(room_id=room_id).dict()
+        stage = {
+            field: {"$ifNull": [f"${field}", {"$literal": value}]}
+            for field, value in defaults.items() if field != "room_id"
+        }
+        stage.update({field: {"$literal": value} for field, value in changes.items()})
+        stage.update(expressions or {})
+
+        session_doc = await db.sessions.find_one_and_update(
+            {"room_id": room_id},
+            [{"$set": stage}],
+            {"_id": 0},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        return Session(**session_doc)
 
     async def start_recording(self, room_id: str) -> Optional[Session]:
         """Start recording for a session"""
@@ -97,51 +99,49 @@ class SessionService:
 
     async def toggle_recording(self, room_id: str) -> Optional[Session]:
         """Toggle recording status"""
-        session = await self.get_session(room_id)
-        if not session:
-            session = await self.create_session(room_id)
-        
-        return await self.update_session(
-            room_id,
-            SessionUpdate(is_recording=not session.is_recording)
-        )
+        # Flipped server-side so concurrent toggles cannot lose a write
+        return await self._upsert(room_id, {}, {
+            "is_recording": {"$not": ["$is_recording"]},
+            "recording_start_time": {"$cond": ["$is_recording", None, "$$NOW"]},
+        })
 
     async def toggle_streaming(self, room_id: str) -> Optional[Session]:
         """Toggle streaming status"""
-        session = await self.get_session(room_id)
-        if not session:
-            session = await self.create_session(room_id)
-        
-        return await self.update_session(
-            room_id,
-            SessionUpdate(is_streaming=not session.is_streaming)
-        )
+        return await self._upsert(room_id, {}, {
+            "is_streaming": {"$not": ["$is_streaming"]},
+            "streaming_start_time": {"$cond": ["$is_streaming", None, "$$NOW"]},
+        })
 
     async def get_session_details(self, room_id: str) -> Optional[SessionResponse]:
         """Get complete session details with room and participants"""
+        details = await self.get_session_details_document(room_id)
+        return SessionResponse(**details) if details else None
+
+    async def get_session_details_document(self, room_id: str) -> Optional[dict]:
+        """Session details in SessionResponse's shape, as stored documents (no _id, no model validation)"""
         db = await self.get_db()
-        
-        session = await self.get_session(room_id)
-        if not session:
-            session = await self.create_session(room_id)
 
-        # Get room details
-        room_doc = await db.rooms.find_one({"id": room_id})
-        if not room_doc:
+        # Room, session and participants in one aggregation
+        room_docs = await db.rooms.aggregate([
+            {"$match": {"id": room_id}},
+            {"$limit": 1},
+            {"$lookup": {"from": "sessions", "localField": "id", "foreignField": "room_id", "as": "_sessions"}},
+            {"$lookup": {"from": "participants", "localField": "id", "foreignField": "room_id", "as": "_participants"}},
+            {"$project": {"_id": 0, "_sessions._id": 0, "_participants._id": 0}},
+        ]).to_list(1)
+        if not room_docs:
             return None
-        room = Room(**room_doc)
-
-        # Get participants
-        participants_cursor = db.participants.find({"room_id": room_id})
-        participants = []
-        async for participant_doc in participants_cursor:
-            participants.append(Participant(**participant_doc))
-
-        return SessionResponse(
-            session=session,
-            room=room,
-            participants=participants
-        )
+        room_doc = room_docs[0]
+        session_docs = room_doc.pop("_sessions")
+        participant_docs = room_doc.pop("_participants")
+
+        session_doc = session_docs[0] if session_docs else (await self.create_session(room_id)).dict()
+
+        return {
+            "session": session_doc,
+            "room": room_doc,
+            "participants": participant_docs,
+        }
 
     async def get_recording_duration(self, room_id: str) -> Optional[int]:
         """Get recording duration in seconds"""
@@ -0,0 +1,320 @@
+import asyncio
+import fractions
+import logging
+import os
+from typing import Dict, List, Optional, Set, Tuple
+
+from .audio_service import audio_service
+from .routing_service import routing_service
+from .video_service import video_service
+from .mixer_engine import MixTap, mixer_engine, to_pcm16
+
+try:
+    from aiortc import MediaStreamTrack, RTCPeerConnection, RTCSessionDescription
+    from aiortc.contrib.media import MediaRelay
+    from aiortc.mediastreams import MediaStreamError
+    from av import AudioFrame
+    AIORTC_AVAILABLE = True
+except ImportError:  # optional dependency: pip install aiortc
+    AIORTC_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# (publisher participant id, "audio" | "video")
+TrackKey = Tuple[str, str]
+# Publisher id of the mixer's track in a downlink: the subscriber's own mix-minus bus
+MIX_BUS = "__mix__"
+
+
+if AIORTC_AVAILABLE:
+    class MixBusTrack(MediaStreamTrack):
+        """A mixer bus as an outgoing audio track: one block per recv(), silence while the bus is idle"""
+
+        kind = "audio"
+
+        def __init__(self, tap: MixTap):
+            super().__init__()
+            self.tap = tap
+            self._pts = 0
+
+        async def recv(self):
+            if self.readyState != "live":
+                raise MediaStreamError
+            block = await self.tap.read(timeout=2 * mixer_engine.block_seconds)
+            if block is None:
+                self.stop()
+                raise MediaStreamError
+            samples = to_pcm16(block).reshape(1, -1)
+            frame = AudioFrame.from_ndarray(samples, format="s16", layout="mono")
+            frame.sample_rate = mixer_engine.sample_rate
+            frame.time_base = fractions.Fraction(1, mixer_engine.sample_rate)
+            frame.pts = self._pts
+            self._pts += samples.shape[1]
+            return frame
+
+        def stop(self):
+            super().stop()
+            mixer_engine.close_tap(self.tap)
+
+
+class SfuParticipant:
+    """One participant's uplink (publisher) and downlink (subscriber) peer connections"""
+
+    def __init__(self, participant_id: str, sid: str):
+        self.participant_id = participant_id
+        self.sid = sid
+        self.publisher: Optional["RTCPeerConnection"] = None
+        self.subscriber: Optional["RTCPeerConnection"] = None
+        self.tracks: Dict[str, object] = {}        # {kind: MediaStreamTrack} published by this participant
+        self.forwarded: Set[TrackKey] = set()      # tracks currently sent to this participant
+        self.mix_track = None                      # MixBusTrack of this participant's bus, when mixing
+
+    def stop_mix_track(self):
+        if self.mix_track is not None:
+            self.mix_track.stop()
+            self.mix_track = None
+
+    async def close(self):
+        self.stop_mix_track()
+        for pc in (self.publisher, self.subscriber):
+            if pc is not None:
+                await pc.close()
+        self.publisher = self.subscriber = None
+
+
+class SfuRoom:
+    def __init__(self, room_id: str):
+        self.room_id = room_id
+        self.participants: Dict[str, SfuParticipant] = {}  # {participant_id: SfuParticipant}
+        self.relay = MediaRelay()
+        self.lock = asyncio.Lock()
+
+
+class SfuService:
+    """
+    Selective forwarding for rooms above mesh size: each participant publishes its
+    camera/microphone once to the backend, and the backend forwards to every
+    subscriber the tracks that the room's active Route documents send to it.
+    """
+
+    def __init__(self, enabled: bool = False, mesh_limit: int = 4):
+        """
+        enabled: SFU path requested (also needs aiortc installed)
+        mesh_limit: rooms with more connected members than this are told to use the SFU
+        """
+        self.enabled = enabled and AIORTC_AVAILABLE
+        self.mesh_limit = mesh_limit
+        self.rooms: Dict[str, SfuRoom] = {}
+        self.sid_index: Dict[str, Tuple[str, str]] = {}  # {sid: (room_id, participant_id)}
+        self.sio_manager = None
+
+        if enabled and not AIORTC_AVAILABLE:
+            logger.warning("SFU requested but aiortc is not installed; rooms stay in mesh mode")
+
+    def attach(self, sio_manager):
+        """SocketManager used to push renegotiation offers to subscribers"""
+        self.sio_manager = sio_manager
+
+    def media_mode(self, member_count: int) -> str:
+        return "sfu" if self.enabled and member_count > self.mesh_limit else "mesh"
+
+    def _participant(self, room_id: str, participant_id: str, sid: str) -> SfuParticipant:
+        room = self.rooms.get(room_id)
+        if room is None:
+            room = self.rooms[room_id] = SfuRoom(room_id)
+        participant = room.participants.get(participant_id)
+        if participant is None:
+            participant = room.participants[participant_id] = SfuParticipant(participant_id, sid)
+        participant.sid = sid
+        self.sid_index[sid] = (room_id, participant_id)
+        return participant
+
+    # ---- Publishing ----
+    async def publish(self, room_id: str, participant_id: str, sid: str, offer: dict) -> dict:
+        """Accept the participant's uplink offer and return the SDP answer"""
+        if not self.enabled:
+            raise RuntimeError("SFU is not enabled")
+
+        participant = self._participant(room_id, participant_id, sid)
+        if participant.publisher is not None:
+            await participant.publisher.close()
+        pc = participant.publisher = RTCPeerConnection()
+
+        @pc.on("track")
+        def on_track(track):
+            participant.tracks[track.kind] = track
+            asyncio.ensure_future(self.refresh_room(room_id))
+            if track.kind == "audio" and mixer_engine.enabled:
+                # The mixer reads its own relayed copy so subscribers keep theirs
+                asyncio.ensure_future(mixer_engine.attach_participant_track(
+                    room_id, participant_id, self.rooms[room_id].relay.subscribe(track)
+                ))
+
+            @track.on("ended")
+            async def on_ended():
+                if participant.tracks.get(track.kind) is track:
+                    del participant.tracks[track.kind]
+                    await self.refresh_room(room_id)
+
+        await pc.setRemoteDescription(RTCSessionDescription(sdp=offer["sdp"], type=offer["type"]))
+        await pc.setLocalDescription(await pc.createAnswer())
+        return {"sdp": pc.localDescription.sdp, "type": pc.localDescription.type}
+
+    # ---- Subscribing ----
+    async def subscribe(self, room_id: str, participant_id: str, sid: str) -> dict:
+        """Build the downlink for a participant and return the server's SDP offer"""
+        if not self.enabled:
+            raise RuntimeError("SFU is not enabled")
+
+        participant = self._participant(room_id, participant_id, sid)
+        await mixer_engine.ensure_room(room_id)
+        plan = await self.subscription_plan(room_id)
+        return await self._renegotiate(self.rooms[room_id], participant,
+                                       self._downlink(room_id, participant_id, plan.get(participant_id, set())))
+
+    async def accept_answer(self, sid: str, answer: dict):
+        """Subscriber's answer to the last downlink offer"""
+        entry = self.sid_index.get(sid)
+        if entry is None:
+            return
+        room_id, participant_id = entry
+        participant = self.rooms[room_id].participants[participant_id]
+        if participant.subscriber is not None:
+            await participant.subscriber.setRemoteDescription(
+                RTCSessionDescription(sdp=answer["sdp"], type=answer["type"])
+            )
+
+    @staticmethod
+    def _downlink(room_id: str, participant_id: str, wanted: Set[TrackKey]) -> Set[TrackKey]:
+        """
+        With the mixer running, a participant's audio is their mix-minus bus
+        (mixed once on the server) instead of one relayed track per publisher
+        """
+        if not mixer_engine.enabled:
+            return wanted
+        wanted = {key for key in wanted if key[1] != "audio"}
+        if mixer_engine.has_bus(room_id, participant_id):
+            wanted.add((MIX_BUS, "audio"))
+        return wanted
+
+    async def _renegotiate(self, room: SfuRoom, participant: SfuParticipant, wanted: Set[TrackKey]) -> dict:
+        # A fresh downlink per plan change keeps track/transceiver bookkeeping trivial
+        participant.stop_mix_track()
+        if participant.subscriber is not None:
+            await participant.subscriber.close()
+        pc = participant.subscriber = RTCPeerConnection()
+
+        forwarded = set()
+        for publisher_id, kind in sorted(wanted):
+            if publisher_id == MIX_BUS:
+                participant.mix_track = MixBusTrack(mixer_engine.open_tap(room.room_id, participant.participant_id))
+                pc.addTrack(participant.mix_track)
+                forwarded.add((publisher_id, kind))
+                continue
+            publisher = room.participants.get(publisher_id)
+            track = publisher.tracks.get(kind) if publisher else None
+            if track is None:
+                continue
+            pc.addTrack(room.relay.subscribe(track))
+            forwarded.add((publisher_id, kind))
+        participant.forwarded = forwarded
+
+        await pc.setLocalDescription(await pc.createOffer())
+        return {"sdp": pc.localDescription.sdp, "type": pc.localDescription.type}
+
+    async def refresh_room(self, room_id: str):
+        """Re-apply routing after a route or publication change; only changed subscribers renegotiate"""
+        room = self.rooms.get(room_id)
+        if room is None or not self.enabled:
+            return
+
+        await mixer_engine.ensure_room(room_id)
+        async with room.lock:
+            plan = await self.subscription_plan(room_id)
+            for participant in list(room.participants.values()):
+                if participant.subscriber is None:
+                    continue  # has not asked for a downlink yet
+                wanted = self._downlink(room_id, participant.participant_id, {
+                    key for key in plan.get(participant.participant_id, set())
+                    if key[0] in room.participants and key[1] in room.participants[key[0]].tracks
+                })
+                if wanted == participant.forwarded:
+                    continue
+                offer = await self._renegotiate(room, participant, wanted)
+                if self.sio_manager is not None:
+                    await self.sio_manager.outbound.send(participant.sid, "sfu-offer",
+                                                         {"room_id": room_id, **offer})
+
+    async def subscription_plan(self, room_id: str) -> Dict[str, Set[TrackKey]]:
+        """{subscriber participant id: {(publisher participant id, kind)}} from the active routes"""
+        routes = await routing_service.get_routes(room_id)
+        audio_owners = {
+            source.id: source.participant_id
+            for source in await audio_service.get_audio_sources(room_id) if source.is_enabled
+        }
+        video_owners = {
+            source.id: source.participant_id
+            for source in await video_service.get_video_sources(room_id) if source.is_enabled
+        }
+
+        plan: Dict[str, Set[TrackKey]] = {}
+        for route in routes:
+            if not route.is_active:
+                continue
+            owners, kind = (audio_owners, "audio") if route.type == "audio" else (video_owners, "video")
+            publisher_id = owners.get(route.source_id)
+            if not publisher_id:
+                continue
+            for destination in route.destinations:
+                if destination != publisher_id:
+                    plan.setdefault(destination, set()).add((publisher_id, kind))
+        return plan
+
+    # ---- Teardown ----
+    async def leave(self, sid: str):
+        """Close a disconnected participant's peer connections"""
+        entry = self.sid_index.pop(sid, None)
+        if entry is None:
+            return
+        room_id, participant_id = entry
+        room = self.rooms.get(room_id)
+        if room is None:
+            return
+        participant = room.participants.pop(participant_id, None)
+        if participant is not None:
+            await participant.close()
+        if room.participants:
+            await self.refresh_room(room_id)
+        else:
+            del self.rooms[room_id]
+
+    async def remove_participant(self, room_id: str, participant_id: str):
+        """The participant left the room (REST): close their connections as a disconnect would"""
+        room = self.rooms.get(room_id)
+        participant = room.participants.get(participant_id) if room is not None else None
+        if participant is not None:
+            await self.leave(participant.sid)
+
+    async def remove_room(self, room_id: str):
+        """The room was deleted: close every connection and drop its state"""
+        room = self.rooms.pop(room_id, None)
+        if room is None:
+            return
+        for participant in room.participants.values():
+            self.sid_index.pop(participant.sid, None)
+            await participant.close()
+
+    async def stop(self):
+        for sid in list(self.sid_index):
+            await self.leave(sid)
+
+
+def _env_flag(name: str) -> bool:
+    return os.environ.get(name, "").lower() in ("1", "true", "yes")
+
+
+# Global SFU service instance
+sfu_service = SfuService(
+    enabled=_env_flag("SFU_ENABLED"),
+    mesh_limit=int(os.environ.get("SFU_MESH_LIMIT", "4")),
+)
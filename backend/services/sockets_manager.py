@@ -1,91 +1,348 @@
-from typing import Dict, Set, Optional
+from typing import Callable, Dict, Iterable, List, Set, Optional
+from collections import Counter
+import os
 import asyncio
-from datetime import datetime, timedelta
+import logging
+from datetime import datetime
+
+from log_config import LogSampler
+from .backplane import Backplane, create_backplane
+from .outbound_queues import OutboundQueues
+from .room_expiry import RoomExpiryScheduler
+
+logger = logging.getLogger(__name__)
 
 class SocketManager:
     """Maneja conexiones de Socket.IO, salas, TTL, forwarding y reconexiones."""
 
-    def __init__(self, room_ttl_seconds: int = 300):
+    def __init__(self, room_ttl_seconds: int = 300, max_concurrent_emits: int = 32,
+                 backplane: Optional[Backplane] = None, outbound: Optional[OutboundQueues] = None,
+                 stats_interval_seconds: int = 60, debug_sample_every: int = 100):
         """
         room_ttl_seconds: tiempo que una sala permanece activa sin usuarios antes de eliminarla
+        max_concurrent_emits: emits individuales simultáneos cuando hay que filtrar destinatarios
+        backplane: bus compartido entre workers; None si solo hay un proceso
+        outbound: colas de salida acotadas por sid (backpressure frente a clientes lentos)
+        stats_interval_seconds: cada cuánto se registra el resumen de contadores
+        debug_sample_every: con DEBUG activo, se registra 1 de cada N mensajes reenviados
+        """
+        self.sio = None  # socketio.AsyncServer, se registra con attach()
+        self.backplane = backplane
+        self.outbound = outbound or OutboundQueues()
+        self.rooms: Dict[str, Set[str]] = {}        # {room_id: set(sid)} incluye sids de otros workers
+        self.sid_rooms: Dict[str, Set[str]] = {}    # {sid: set(room_id)} índice inverso de self.rooms
+        self.users: Dict[str, dict] = {}           # {sid: metadata} solo sids conectados a este worker
+        self.remote_sids: Dict[str, str] = {}      # {sid: node_id} sids de otros workers
+        self.room_ttl = room_ttl_seconds
+        # Solo las salas vacías están programadas; al volver a entrar alguien se cancela
+        self.expiry = RoomExpiryScheduler(self._expire_room)
+        self.expiry_listeners: List[Callable[[str], None]] = []  # estado por sala de otros servicios
+        self._emit_slots = asyncio.Semaphore(max_concurrent_emits)
+        # Contadores en lugar de una línea de log por mensaje
+        self.stats: Counter = Counter()
+        self.stats_interval = stats_interval_seconds
+        self._sample_forward = LogSampler(debug_sample_every)
+        self._stats_task: Optional[asyncio.Task] = None
+
+    def attach(self, sio):
+        """Registra el AsyncServer con el que se emiten los eventos"""
+        self.sio = sio
+        self.outbound.attach(sio)
+
+    async def start(self):
         """
-        self.rooms: Dict[str, Set[str]] = {}        # {room_id: set(sid)}
-        self.users: Dict[str, dict] = {}           # {sid: metadata}
-        self.room_last_active: Dict[str, datetime] = {}  # {room_id: última actividad}
-        self.room_ttl = timedelta(seconds=room_ttl_seconds)
-        self._cleanup_task = asyncio.create_task(self._cleanup_rooms_loop())
+        Arranca las tareas de fondo (expiración de salas, resumen de métricas), conecta el
+        backplane y pide a los demás workers su estado de salas. Se llama desde el lifespan.
+        """
+        self.expiry.start()
+        self._stats_task = asyncio.create_task(self._stats_loop())
+        if self.backplane is None:
+            return
+        await self.backplane.start(self._on_backplane_message)
+        await self._publish({"type": "hello"})
+
+    async def stop(self):
+        """Avisa a los demás workers y desconecta el backplane"""
+        await self.expiry.stop()
+        await self.outbound.stop()
+        if self._stats_task is not None:
+            self._stats_task.cancel()
+            self._stats_task = None
+        if self.backplane is None:
+            return
+        await self._publish({"type": "bye"})
+        await self.backplane.stop()
 
     # ---- Conexión y desconexión ----
     async def on_connect(self, sid: str, environ: dict):
         """Cliente conectado"""
-        print(f"[SocketManager] Cliente conectado: {sid}")
+        self.stats["connect"] += 1
+        logger.info("Cliente conectado", extra={"fields": {"sid": sid}})
         self.users[sid] = {"connected_at": datetime.utcnow()}
 
     async def on_disconnect(self, sid: str):
         """Cliente desconectado"""
-        print(f"[SocketManager] Cliente desconectado: {sid}")
+        self.stats["disconnect"] += 1
+        logger.info("Cliente desconectado", extra={"fields": {"sid": sid}})
         self.users.pop(sid, None)
+        self.outbound.discard(sid)
+        self._drop_sid(sid)
+        await self._publish({"type": "disconnect", "sid": sid})
 
-        for room_id, sids in self.rooms.items():
-            if sid in sids:
-                sids.remove(sid)
-                self.room_last_active[room_id] = datetime.utcnow()
-                print(f"[SocketManager] Cliente {sid} removido de la sala {room_id}")
-
-    # ---- Unirse a sala ----
+    # ---- Unirse / salir de sala ----
     async def join_room(self, sid: str, room_id: str):
         """Agrega un cliente a una sala"""
+        self._add_member(room_id, sid)
+        # Se replica en las salas nativas de python-socketio para poder hacer broadcast con un solo emit
+        await self.sio.enter_room(sid, room_id)
+        await self._publish({"type": "join", "room_id": room_id, "sid": sid})
+        self.stats["join"] += 1
+        logger.info("Cliente se unió a la sala", extra={"fields": {"sid": sid, "room_id": room_id}})
+
+    async def leave_room(self, sid: str, room_id: str):
+        """Saca a un cliente de una sala"""
+        if not self._drop_member(room_id, sid):
+            return
+        await self.sio.leave_room(sid, room_id)
+        await self._publish({"type": "leave", "room_id": room_id, "sid": sid})
+        self.stats["leave"] += 1
+        logger.info("Cliente salió de la sala", extra={"fields": {"sid": sid, "room_id": room_id}})
+
+    def _add_member(self, room_id: str, sid: str):
         if room_id not in self.rooms:
             self.rooms[room_id] = set()
         self.rooms[room_id].add(sid)
-        self.room_last_active[room_id] = datetime.utcnow()
-        print(f"[SocketManager] Cliente {sid} se unió a la sala {room_id}")
+        self.sid_rooms.setdefault(sid, set()).add(room_id)
+        self.expiry.cancel(room_id)
+
+    def _drop_member(self, room_id: str, sid: str) -> bool:
+        rooms = self.sid_rooms.get(sid)
+        if not rooms or room_id not in rooms:
+            return False
+        rooms.discard(room_id)
+        if not rooms:
+            del self.sid_rooms[sid]
+        self._remove_member(room_id, sid)
+        return True
+
+    def _drop_sid(self, sid: str):
+        # Solo se recorren las salas del propio sid, no todas las salas del nodo
+        self.remote_sids.pop(sid, None)
+        for room_id in self.sid_rooms.pop(sid, ()):
+            self._remove_member(room_id, sid)
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Cliente removido de la sala", extra={"fields": {"sid": sid, "room_id": room_id}})
+
+    def _remove_member(self, room_id: str, sid: str):
+        """Quita el sid de room→sids; si la sala queda vacía se programa su expiración"""
+        sids = self.rooms.get(room_id)
+        if sids is None:
+            return
+        sids.discard(sid)
+        if not sids:
+            self.expiry.schedule(room_id, self.room_ttl)
+
+    # ---- Métricas ----
+    def room_member_count(self, room_id: str) -> int:
+        """Número de miembros conectados a una sala"""
+        return len(self.rooms.get(room_id, ()))
+
+    def room_member_counts(self) -> Dict[str, int]:
+        """{room_id: miembros} para todas las salas vivas del nodo"""
+        return {room_id: len(sids) for room_id, sids in self.rooms.items()}
+
+    def room_queue_depths(self) -> Dict[str, int]:
+        """{room_id: mensajes retenidos} para las salas con algún miembro atrasado"""
+        depths: Dict[str, int] = {}
+        for sid in self.outbound.congested:
+            depth = self.outbound.depth(sid)
+            for room_id in self.sid_rooms.get(sid, ()):
+                depths[room_id] = depths.get(room_id, 0) + depth
+        return depths
 
     # ---- Forward de mensajes ----
-    async def forward_to_peer(self, event: str, data: dict):
+    async def forward_to_peer(self, event: str, data: dict, sender_sid: Optional[str] = None):
         """
         Envía un evento a los peers de una sala.
         data debe tener:
         - room_id
         - payload
-        - target_sid (opcional)
+        - target_sid (opcional): un único destinatario, se envía directo
+        - target_sids (opcional): subconjunto de la sala, se envía uno a uno
+        - exclude_sids (opcional): miembros que no deben recibir el broadcast
+        Sin destinatarios explícitos se hace un solo emit a la sala, saltando al emisor.
+        Los destinatarios conectados a otros workers se alcanzan a través del backplane.
         """
         room_id: Optional[str] = data.get("room_id")
         target_sid: Optional[str] = data.get("target_sid")
+        target_sids = data.get("target_sids")
         payload = data.get("payload")
 
         if not room_id or payload is None:
-            print("[SocketManager] Error: room_id o payload faltante")
+            self.stats["forward_error"] += 1
+            logger.warning("Mensaje sin room_id o payload", extra={"fields": {"event": event, "sid": sender_sid}})
             return
 
-        if room_id not in self.rooms:
-            print(f"[SocketManager] Error: la sala {room_id} no existe")
+        members = self.rooms.get(room_id)
+        if members is None:
+            self.stats["forward_error"] += 1
+            logger.warning("La sala no existe", extra={"fields": {"event": event, "room_id": room_id}})
+            return
+
+        if target_sid:
+            if target_sid not in members:
+                self.stats["forward_error"] += 1
+                logger.warning("Destinatario fuera de la sala",
+                               extra={"fields": {"event": event, "room_id": room_id, "target_sid": target_sid}})
+                return
+            if target_sid in self.remote_sids:
+                await self._publish({"type": "emit", "event": event, "payload": payload, "to": [target_sid]})
+            else:
+                await self.outbound.send(target_sid, event, payload)
+            self._count_forward(event, room_id, target_sid)
+            return
+
+        if target_sids:
+            targets = [sid for sid in target_sids if sid in members and sid != sender_sid]
+            remote = [sid for sid in targets if sid in self.remote_sids]
+            await self._emit_many(event, payload, [sid for sid in targets if sid not in self.remote_sids])
+            if remote:
+                await self._publish({"type": "emit", "event": event, "payload": payload, "to": remote})
+            self._count_forward(event, room_id, len(targets))
+            return
+
+        skip = set(data.get("exclude_sids") or ())
+        if sender_sid:
+            skip.add(sender_sid)
+        await self._emit_room(event, payload, room_id, skip)
+        if self.remote_sids and any(sid in self.remote_sids for sid in members):
+            await self._publish({"type": "emit", "event": event, "payload": payload,
+                                 "room_id": room_id, "skip": list(skip)})
+        self._count_forward(event, room_id, "room")
+
+    def _count_forward(self, event: str, room_id: str, to):
+        """Camino caliente: un contador y, solo con DEBUG activo, una línea muestreada"""
+        self.stats["forward." + event] += 1
+        if logger.isEnabledFor(logging.DEBUG) and self._sample_forward():
+            logger.debug("Evento reenviado (muestreado)",
+                         extra={"fields": {"event": event, "room_id": room_id, "to": to}})
+
+    async def _emit_many(self, event: str, payload, sids: Iterable[str]):
+        """Emits individuales en paralelo, limitados por max_concurrent_emits"""
+        async def _send(sid: str):
+            async with self._emit_slots:
+                await self.outbound.send(sid, event, payload)
+
+        await asyncio.gather(*(_send(sid) for sid in sids))
+
+    async def broadcast_volatile(self, event: str, payload, room_id: str):
+        """
+        Emit a la sala para datos que caducan enseguida (medidores): los miembros
+        atrasados se saltan en lugar de encolar, y no pasa por el backplane, así que
+        solo llega a los miembros conectados a este worker.
+        """
+        members = self.rooms.get(room_id)
+        if not members:
+            return
+        lagging = [sid for sid in members if sid in self.users and self.outbound.is_lagging(sid)]
+        await self.sio.emit(event, payload, room=room_id, skip_sid=lagging or None)
+        self.stats["volatile"] += 1
+
+    async def _emit_room(self, event: str, payload, room_id: str, skip: Set[str]):
+        """Un solo emit a la sala; los miembros locales atrasados lo reciben por su cola"""
+        lagging = [sid for sid in self.rooms.get(room_id, ())
+                   if sid in self.users and sid not in skip and self.outbound.is_lagging(sid)]
+        skip_sids = list(skip) + lagging
+        await self.sio.emit(event, payload, room=room_id, skip_sid=skip_sids or None)
+        for sid in lagging:
+            self.outbound.enqueue(sid, event, payload)
+
+    # ---- Backplane ----
+    async def _publish(self, message: dict):
+        """Publica en el backplane; si el bus no está disponible se registra y el evento local sigue su curso"""
+        if self.backplane is None:
             return
+        try:
+            await self.backplane.publish(message)
+        except (OSError, asyncio.IncompleteReadError) as e:
+            self.stats["backplane_error"] += 1
+            logger.warning("No se pudo publicar en el backplane",
+                           extra={"fields": {"type": message.get("type"), "error": e}})
+
+    async def _on_backplane_message(self, message: dict):
+        """Aplica en este worker lo que otro worker publicó"""
+        kind = message.get("type")
+        node = message.get("node")
 
-        from backend.main import sio  # evitar circular import
-        for sid in self.rooms[room_id]:
-            if target_sid and sid != target_sid:
-                continue
-            await sio.emit(event, payload, to=sid)
-            print(f"[SocketManager] Evento '{event}' enviado a {sid} en {room_id}")
+        if kind == "join":
+            self.remote_sids[message["sid"]] = node
+            self._add_member(message["room_id"], message["sid"])
+        elif kind == "leave":
+            self._drop_member(message["room_id"], message["sid"])
+        elif kind == "disconnect":
+            self._drop_sid(message["sid"])
+        elif kind == "emit":
+            if "to" in message:
+                local = [sid for sid in message["to"] if sid in self.users]
+                await self._emit_many(message["event"], message["payload"], local)
+            else:
+                await self._emit_room(message["event"], message["payload"],
+                                      message["room_id"], set(message.get("skip") or ()))
+        elif kind == "hello":
+            # Un worker nuevo: se le envía la pertenencia de los sids locales
+            memberships = {sid: list(self.sid_rooms.get(sid, ())) for sid in self.users}
+            await self._publish({"type": "sync", "memberships": memberships})
+        elif kind == "sync":
+            for sid, rooms in message["memberships"].items():
+                self.remote_sids[sid] = node
+                for room_id in rooms:
+                    self._add_member(room_id, sid)
+        elif kind == "bye":
+            for sid in [sid for sid, owner in self.remote_sids.items() if owner == node]:
+                self._drop_sid(sid)
 
-    # ---- Limpieza automática de salas ----
-    async def _cleanup_rooms_loop(self):
-        """Elimina salas vacías después de que expire el TTL"""
+    # ---- Métricas periódicas ----
+    async def _stats_loop(self):
+        """Resume los contadores del intervalo en una sola línea de log"""
+        previous: Counter = Counter()
         while True:
-            await asyncio.sleep(30)  # ciclo de limpieza cada 30s
-            now = datetime.utcnow()
-            rooms_to_delete = []
-            for room_id, sids in self.rooms.items():
-                if not sids:
-                    last_active = self.room_last_active.get(room_id, now)
-                    if now - last_active > self.room_ttl:
-                        rooms_to_delete.append(room_id)
-
-            for room_id in rooms_to_delete:
-                print(f"[SocketManager] Eliminando sala {room_id} por inactividad")
-                self.rooms.pop(room_id, None)
-                self.room_last_active.pop(room_id, None)
+            await asyncio.sleep(self.stats_interval)
+            current = self.stats + self.outbound.stats
+            delta = current - previous
+            previous = current
+            if delta or self.outbound.congested:
+                queue_depths = self.room_queue_depths()
+                logger.info("Resumen de señalización", extra={"fields": {
+                    "rooms": len(self.rooms), "local_sids": len(self.users),
+                    "lagging_sids": len(self.outbound.congested),
+                    "max_room_queue_depth": max(queue_depths.values(), default=0), **delta}})
+
+    # ---- Expiración de salas ----
+    def _expire_room(self, room_id: str):
+        """Elimina una sala que siguió vacía durante todo el TTL"""
+        if self.rooms.get(room_id):
+            return
+        # Solo se borran salas vacías, así que sid_rooms no guarda referencias a ellas
+        logger.info("Eliminando sala por inactividad", extra={"fields": {"room_id": room_id}})
+        self.rooms.pop(room_id, None)
+        for listener in self.expiry_listeners:
+            try:
+                listener(room_id)
+            except Exception:
+                logger.exception("Fallo al liberar una sala expirada", extra={"fields": {"room_id": room_id}})
+
+    def add_expiry_listener(self, callback: Callable[[str], None]):
+        """callback(room_id) cuando una sala expira (mezclador, medidores, matriz de ruteo)"""
+        self.expiry_listeners.append(callback)
 
 # ---- Instancia global ----
-sio_manager = SocketManager(room_ttl_seconds=300)  # salas expiran a los 5 min
+# SIGNALING_BACKPLANE_URL: memory://, redis://host:6379 o unix:///tmp/emvid-signaling.sock
+sio_manager = SocketManager(
+    room_ttl_seconds=300,  # salas expiran a los 5 min
+    backplane=create_backplane(os.environ.get("SIGNALING_BACKPLANE_URL")),
+    outbound=OutboundQueues(
+        max_queue=int(os.environ.get("SIGNALING_QUEUE_MAX", "256")),
+        lag_threshold_seconds=float(os.environ.get("SIGNALING_LAG_THRESHOLD_SECONDS", "10")),
+        engine_high_watermark=int(os.environ.get("SIGNALING_ENGINE_HIGH_WATERMARK", "64")),
+    ),
+)
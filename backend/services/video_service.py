@@ -1,7 +1,9 @@
 from typing import List, Optional
 from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ReturnDocument
 from models import VideoSource, VideoSourceUpdate
-from database import get_database
+from database import get_database, raw_find
+from .cache import video_source_cache
 
 
 class VideoService:
@@ -9,52 +11,75 @@ class VideoService:
         self.db: Optional[AsyncIOMotorDatabase] = None
 
     async def get_db(self):
-        if not self.db:
+        if self.db is None:
             self.db = await get_database()
         return self.db
 
     async def get_video_sources(self, room_id: str) -> List[VideoSource]:
         """Get all video sources for a room"""
-        db = await self.get_db()
-        sources_cursor = db.video_sources.find({"room_id": room_id})
-        sources = []
-        async for source_doc in sources_cursor:
-            sources.append(VideoSource(**source_doc))
-        return sources
+        return [VideoSource(**source_doc) for source_doc in await self.get_video_source_documents(room_id)]
+
+    async def get_video_source_documents(self, room_id: str) -> List[dict]:
+        """A room's video sources as stored (no _id), for read endpoints that serialize them directly"""
+        source_docs = video_source_cache.get_room(room_id)
+        if source_docs is None:
+            db = await self.get_db()
+            source_docs = await db.video_sources.find({"room_id": room_id}, {"_id": 0}).to_list(None)
+            source_docs = video_source_cache.put_room(room_id, source_docs)
+        return source_docs
+
+    async def stream_video_source_documents(self, room_id: str):
+        """
+        A room's video sources for a streamed response: the cached listing when warm,
+        else a raw BSON cursor (documents decoded only as they are written;
+        the cache is left cold)
+        """
+        source_docs = video_source_cache.get_room(room_id)
+        if source_docs is not None:
+            return source_docs
+        cursor = raw_find("video_sources", {"room_id": room_id}, {"_id": 0})
+        return cursor if cursor is not None else await self.get_video_source_documents(room_id)
 
     async def get_video_source(self, source_id: str) -> Optional[VideoSource]:
         """Get a specific video source"""
-        db = await self.get_db()
-        source_doc = await db.video_sources.find_one({"id": source_id})
+        source_doc = video_source_cache.get(source_id)
+        if source_doc is None:
+            db = await self.get_db()
+            source_doc = await db.video_sources.find_one({"id": source_id}, {"_id": 0})
+            if source_doc:
+                source_doc = video_source_cache.put(source_doc)
         return VideoSource(**source_doc) if source_doc else None
 
     async def update_video_source(self, source_id: str, update_data: VideoSourceUpdate) -> Optional[VideoSource]:
         """Update video source settings"""
-        db = await self.get_db()
-        
         # Build update dict, excluding None values
         update_dict = {k: v for k, v in update_data.dict().items() if v is not None}
         
         if not update_dict:
             return await self.get_video_source(source_id)
 
-        await db.video_sources.update_one(
+        return await self._find_one_and_update(source_id, {"$set": update_dict})
+
+    async def _find_one_and_update(self, source_id: str, update) -> Optional[VideoSource]:
+        """Apply an update and return the resulting document in one round trip"""
+        db = await self.get_db()
+        source_doc = await db.video_sources.find_one_and_update(
             {"id": source_id},
-            {"$set": update_dict}
+            update,
+            return_document=ReturnDocument.AFTER
         )
-        
-        return await self.get_video_source(source_id)
+        if not source_doc:
+            video_source_cache.remove(source_id)
+            return None
+        return VideoSource(**video_source_cache.put(source_doc))
+
+    async def _toggle(self, source_id: str, field: str) -> Optional[VideoSource]:
+        """Flip a boolean server-side so concurrent toggles cannot lose a write"""
+        return await self._find_one_and_update(source_id, [{"$set": {field: {"$not": [f"${field}"]}}}])
 
     async def toggle_enable(self, source_id: str) -> Optional[VideoSource]:
         """Toggle enable status of a video source"""
-        source = await self.get_video_source(source_id)
-        if not source:
-            return None
-        
-        return await self.update_video_source(
-            source_id,
-            VideoSourceUpdate(is_enabled=not source.is_enabled)
-        )
+        return await self._toggle(source_id, "is_enabled")
 
     async def set_resolution(self, source_id: str, resolution: str) -> Optional[VideoSource]:
         """Set resolution of a video source"""
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Channel-strip DSP benchmark
+
+Runs backend/services/dsp.py's DspBank (lowcut + gate + compressor on every
+channel) over blocks of mono 48 kHz audio for growing channel counts and reports
+the time per block against the block's real-time budget. The largest count that
+still fits the budget (with the requested headroom) is how many concurrent
+channels one core can process in real time.
+
+BLAS/OpenMP threads are pinned to one so the figure is per core:
+    python dsp_benchmark.py --block-ms 20 --max-channels 4096
+"""
+
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+for _var in ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS"):
+    os.environ.setdefault(_var, "1")
+
+import numpy as np  # noqa: E402 - after pinning the thread count
+
+sys.path.insert(0, str(Path(__file__).parent / "backend"))
+from services import dsp  # noqa: E402
+
+
+def time_per_block(channels: int, block_size: int, blocks: int) -> float:
+    """Median seconds to process one [channels x block_size] block"""
+    rng = np.random.default_rng(channels)
+    # Speech-like levels so the gate and compressor both switch state
+    signal = (rng.standard_normal((channels, block_size * 8)) *
+              rng.uniform(0.001, 0.5, (channels, 1))).astype(np.float32)
+    enabled = np.ones(channels, dtype=bool)
+    bank = dsp.DspBank(channels, sample_rate=dsp.SAMPLE_RATE)
+
+    timings = []
+    for i in range(blocks):
+        offset = (i % 8) * block_size
+        frames = signal[:, offset:offset + block_size].copy()
+        started = time.perf_counter()
+        bank.process(frames, enabled, enabled, enabled)
+        timings.append(time.perf_counter() - started)
+    return float(np.median(timings))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Vectorized DSP chain benchmark")
+    parser.add_argument("--block-ms", type=int, default=20, help="mixer block length")
+    parser.add_argument("--blocks", type=int, default=50, help="blocks timed per channel count")
+    parser.add_argument("--max-channels", type=int, default=4096)
+    parser.add_argument("--headroom", type=float, default=0.5,
+                        help="fraction of the block budget the DSP may use")
+    parser.add_argument("--numpy-filter", action="store_true", help="force the NumPy lowcut fallback")
+    args = parser.parse_args()
+
+    if args.numpy_filter:
+        dsp.SCIPY_AVAILABLE = False
+    block_size = dsp.SAMPLE_RATE * args.block_ms // 1000
+    budget = args.block_ms / 1000
+
+    print("=== DSP chain benchmark (lowcut + gate + compressor) ===")
+    print(f"block={args.block_ms} ms ({block_size} samples) filter={'scipy' if dsp.SCIPY_AVAILABLE else 'numpy'} "
+          f"headroom={args.headroom:.0%}")
+    print(f"{'channels':>10} {'ms/block':>10} {'us/channel':>11} {'realtime x':>11}")
+
+    best = 0
+    channels = 1
+    while channels <= args.max_channels:
+        seconds = time_per_block(channels, block_size, args.blocks)
+        print(f"{channels:>10} {seconds * 1000:>10.3f} {seconds * 1e6 / channels:>11.2f} {budget / seconds:>11.1f}")
+        if seconds <= budget * args.headroom:
+            best = channels
+        elif best:
+            break
+        channels *= 2
+
+    print(f"real-time channels per core (<= {args.headroom:.0%} of budget): {best}")
+
+
+if __name__ == "__main__":
+    main()
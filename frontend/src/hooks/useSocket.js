@@ -60,6 +60,16 @@ function initSocket() {
     memoryState.rooms[room_id].iceCandidates.push(data);
     dispatch({ rooms: memoryState.rooms });
   });
+
+  // Candidatos agrupados por el servidor (ICE_BATCH_WINDOW_MS)
+  socket.on("ice-candidates", (batch) => {
+    batch.forEach((data) => {
+      const { room_id } = data;
+      memoryState.rooms[room_id] = memoryState.rooms[room_id] || { offers: [], answers: [], iceCandidates: [] };
+      memoryState.rooms[room_id].iceCandidates.push(data);
+    });
+    dispatch({ rooms: memoryState.rooms });
+  });
 }
 
 // Funciones para emitir eventos
@@ -14,9 +14,61 @@ export const sendOffer = (data) => socket.emit('offer', data);
 export const sendAnswer = (data) => socket.emit('answer', data);
 export const sendIceCandidate = (data) => socket.emit('ice-candidate', data);
 
+// Faders/knobs: { room_id, target: 'audio_source' | 'route', id, field, value } o una lista;
+// el ack trae los cambios aplicados y el resto de la sala los recibe por onControl
+export const sendControl = (changes, ack) => socket.emit('control', changes, ack);
+
+// MIDI crudo del controlador (Web MIDI): Uint8Array de mensajes de 3 bytes o [[status, data1, data2], ...]
+export const sendMidi = (roomId, messages, ack) => socket.emit('midi', { room_id: roomId, messages }, ack);
+
 export const onOffer = (callback) => socket.on('offer', callback);
 export const onAnswer = (callback) => socket.on('answer', callback);
 export const onIceCandidate = (callback) => socket.on('ice-candidate', callback);
+export const onIceCandidates = (callback) => socket.on('ice-candidates', callback);
+// Medidores del mezclador: "meter-layout" da el orden de canales, "meters" trae
+// un frame binario por sala (cabecera <BHHHI + int16 pico/RMS/LUFS en centésimas de dB)
+export const decodeMeterFrame = (frame) => {
+  const view = new DataView(frame instanceof ArrayBuffer ? frame : frame.buffer, frame.byteOffset || 0);
+  const layoutVersion = view.getUint16(1, true);
+  const sourceCount = view.getUint16(3, true);
+  const busCount = view.getUint16(5, true);
+  const sequence = view.getUint32(7, true);
+  const levels = [];
+  for (let i = 0, offset = 11; i < sourceCount + busCount; i += 1, offset += 6) {
+    levels.push({
+      peak: view.getInt16(offset, true) / 100,
+      rms: view.getInt16(offset + 2, true) / 100,
+      lufs: view.getInt16(offset + 4, true) / 100,
+    });
+  }
+  return { layoutVersion, sequence, sources: levels.slice(0, sourceCount), buses: levels.slice(sourceCount) };
+};
+export const onMeterLayout = (callback) => socket.on('meter-layout', callback);
+export const onMeters = (callback) =>
+  socket.on('meters', ({ room_id, frame }) => callback(room_id, decodeMeterFrame(frame)));
+export const onControl = (callback) => socket.on('control', callback);
+// Matriz de ruteo versionada: el snapshot y los cambios vienen de
+// GET /api/routing/room/{room_id}/matrix/changes?since=N&epoch=E; cada
+// "matrix-patch" trae { room_id, epoch, version, ops } (JSON Patch con rutas /routes/<id>/volume)
+export const onMatrixPatch = (callback) => socket.on('matrix-patch', callback);
+// Aplica un parche sobre el snapshot; devuelve null si falta una versión (pedir los cambios de nuevo)
+export const applyMatrixPatch = (matrix, patch) => {
+  if (patch.epoch !== matrix.epoch || patch.version !== matrix.version + 1) return null;
+  const next = { ...matrix, version: patch.version };
+  patch.ops.forEach(({ op, path, value }) => {
+    const keys = path.slice(1).split('/').map((k) => k.replace(/~1/g, '/').replace(/~0/g, '~'));
+    const section = (next[keys[0]] = { ...next[keys[0]] });
+    if (keys.length === 2) {
+      if (op === 'remove') delete section[keys[1]];
+      else section[keys[1]] = value;
+      return;
+    }
+    const document = (section[keys[1]] = { ...section[keys[1]] });
+    if (op === 'remove') delete document[keys[2]];
+    else document[keys[2]] = value;
+  });
+  return next;
+};
 export const onConnect = (callback) => socket.on('connect', callback);
 export const onDisconnect = (callback) => socket.on('disconnect', callback);
 
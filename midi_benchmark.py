@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+MIDI mapping benchmark
+
+Compiles a room's MIDI mappings (faders -> source volume, knobs -> source gain,
+buttons -> mute, extra faders -> route volume) into backend/services/midi_service.py's
+dispatch table and pushes batches of raw CC messages through it, first the table
+alone and then the full path into the control channel (in-memory apply, no
+persistence: the document caches are pre-filled and the flush loop is not started).
+Reports messages per second per room.
+
+    python midi_benchmark.py --batch 256 --batches 2000
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+from pathlib import Path
+
+# Documents must stay cached for the whole run and nothing may go to Mongo
+os.environ.setdefault("DOCUMENT_CACHE_TTL_SECONDS", "0")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+sys.path.insert(0, str(Path(__file__).parent / "backend"))
+
+from models import AudioSource, Route, SourceType  # noqa: E402
+from services.cache import audio_source_cache, route_cache  # noqa: E402
+from services.control_channel import control_channel  # noqa: E402
+from services.midi_service import compile_mappings  # noqa: E402
+
+ROOM_ID = "bench-room"
+
+
+def build_room(channels: int):
+    """Sources, routes and a device whose mappings cover every default control"""
+    sources = [AudioSource(name=f"Mic {i + 1}", type=SourceType.MICROPHONE, room_id=ROOM_ID,
+                           participant_id=f"participant-{i}") for i in range(channels)]
+    routes = [Route(room_id=ROOM_ID, type="audio", source_id=source.id, destinations=["obs_main"])
+              for source in sources]
+    audio_source_cache.put_room(ROOM_ID, [source.dict() for source in sources])
+    route_cache.put_room(ROOM_ID, [route.dict() for route in routes])
+
+    mappings = []
+    for i, source in enumerate(sources[:8]):
+        mappings.append({"control": f"fader_{i + 1}", "parameter": "volume", "target": source.id, "curve": "audio"})
+        mappings.append({"control": f"knob_{i + 1}", "parameter": "gain", "target": source.id})
+        mappings.append({"control": f"button_{i + 1}", "parameter": "mute", "target": source.id})
+    for i, route in enumerate(routes[:8]):
+        mappings.append({"midi": f"cc:1:{i}", "parameter": "volume", "target": route.id})
+
+    targets = {source.id: "audio_source" for source in sources}
+    targets.update({route.id: "route" for route in routes})
+    return compile_mappings(ROOM_ID, [{"mappings": mappings}], targets)
+
+
+def make_batches(count: int, size: int, seed: int = 7):
+    """Fader/knob sweeps with occasional button presses, as raw 3-byte messages"""
+    rng = random.Random(seed)
+    controls = ([(0xB0, n) for n in range(8)] + [(0xB0, 16 + n) for n in range(8)] +
+                [(0xB1, n) for n in range(8)])
+    batches = []
+    for _ in range(count):
+        data = bytearray()
+        for _ in range(size):
+            if rng.random() < 0.02:
+                data += bytes((0xB0, 32 + rng.randrange(8), 127))
+            else:
+                status, number = rng.choice(controls)
+                data += bytes((status, number, rng.randrange(128)))
+        batches.append(bytes(data))
+    return batches
+
+
+async def run(args):
+    table = build_room(args.channels)
+    batches = make_batches(args.batches, args.batch)
+    total = args.batches * args.batch
+
+    started = time.perf_counter()
+    coalesced = 0
+    for batch in batches:
+        coalesced += len(table.dispatch(batch))
+    dispatch_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for batch in batches:
+        result = await control_channel.apply_many(list(table.dispatch(batch).values()))
+        if result["errors"]:
+            raise RuntimeError(result["errors"][0])
+    applied_seconds = time.perf_counter() - started
+
+    print("=== MIDI mapping benchmark ===")
+    print(f"mappings={table.mapped} batch={args.batch} batches={args.batches} messages={total}")
+    print(f"{'dispatch only':>24}: {total / dispatch_seconds:>12,.0f} msg/s")
+    print(f"{'dispatch + control apply':>24}: {total / applied_seconds:>12,.0f} msg/s")
+    print(f"{'changes after coalescing':>24}: {coalesced / args.batches:>12.1f} per batch")
+    print(f"{'pending DB documents':>24}: {len(control_channel.pending):>12}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backend MIDI dispatch benchmark")
+    parser.add_argument("--channels", type=int, default=16, help="audio sources in the room")
+    parser.add_argument("--batch", type=int, default=256, help="MIDI messages per client batch")
+    parser.add_argument("--batches", type=int, default=2000)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+"""
+Query plan guard
+
+Drives the backend services through a full room lifecycle (users, create,
+joins, mixer/video/routing/session/MIDI changes, control-channel flush,
+routing matrix state, the streamed raw BSON reads, leave, delete) against a scratch database with the production indexes, records
+every query command they send through a pymongo CommandListener, then runs
+explain() on each distinct query shape and fails if any winning plan is a
+collection scan (COLLSCAN, or a $lookup that cannot use an index on the
+foreign collection).
+
+The document caches are disabled for the run so every read reaches Mongo.
+Needs a MongoDB 5.0+ server; the scratch database is dropped afterwards:
+
+    MONGO_URL=mongodb://localhost:27017 python query_plan_guard.py
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+from pathlib import Path
+
+# Every read must go to Mongo, and nothing should be logged per request
+os.environ["DOCUMENT_CACHE_SIZE"] = "0"
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+sys.path.insert(0, str(Path(__file__).parent / "backend"))
+
+from bson import json_util  # noqa: E402
+from motor.motor_asyncio import AsyncIOMotorClient  # noqa: E402
+from pymongo import monitoring  # noqa: E402
+
+import database  # noqa: E402
+from models import (MidiDevice, MidiDeviceUpdate, RoomCreate, RouteCreate, AudioSourceUpdate, SessionUpdate,  # noqa: E402
+                    UserCreate, UserLogin)
+from routes.auth_routes import get_user, login_user, register_user  # noqa: E402
+from services.audio_service import audio_service  # noqa: E402
+from services.control_channel import control_channel  # noqa: E402
+from services.midi_service import midi_service  # noqa: E402
+from services.room_service import room_service  # noqa: E402
+from services.routing_matrix import routing_matrix  # noqa: E402
+from services.routing_service import routing_service  # noqa: E402
+from services.session_service import session_service  # noqa: E402
+from services.video_service import video_service  # noqa: E402
+
+QUERY_COMMANDS = {"find", "findAndModify", "update", "delete", "aggregate", "count", "distinct"}
+# Driver/session fields that explain() does not accept
+SESSION_FIELDS = {"lsid", "$clusterTime", "$db", "txnNumber", "autocommit", "startTransaction",
+                  "writeConcern", "readConcern", "$readPreference", "cursor", "batchSize"}
+# $lookup strategies that scan the foreign collection (slot-based engine)
+SCAN_JOINS = {"NestedLoopJoin", "HashJoin"}
+
+
+class QueryRecorder(monitoring.CommandListener):
+    """Keeps each query command sent to the scratch database"""
+
+    def __init__(self, database_name: str):
+        self.database_name = database_name
+        self.commands = []
+
+    def started(self, event):
+        if event.database_name == self.database_name and event.command_name in QUERY_COMMANDS:
+            self.commands.append({key: value for key, value in event.command.items() if key not in SESSION_FIELDS})
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+def explainable(command: dict):
+    """update/delete batches (bulk writes) are explained one statement at a time"""
+    for batch_key in ("updates", "deletes"):
+        if batch_key in command:
+            name = next(iter(command))
+            for statement in command[batch_key]:
+                yield {name: command[name], batch_key: [statement]}
+            return
+    if "aggregate" in command:
+        command = {**command, "cursor": {}}
+    yield command
+
+
+def shape(value):
+    """Query shape: literal values replaced by their type, so one explain covers every call of a query"""
+    if isinstance(value, dict):
+        return {key: shape(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [shape(item) for item in value]
+    return type(value).__name__
+
+
+def collection_scans(plan, path="") -> list:
+    """Every COLLSCAN stage or scanning $lookup in an explain document"""
+    found = []
+    if isinstance(plan, dict):
+        if plan.get("stage") == "COLLSCAN":
+            found.append(f"{path}: COLLSCAN on {plan.get('namespace', plan.get('collectionName', '?'))}")
+        if plan.get("strategy") in SCAN_JOINS:
+            found.append(f"{path}: $lookup {plan['strategy']} on {plan.get('foreignCollection', '?')}")
+        for key, value in plan.items():
+            if key != "rejectedPlans":
+                found.extend(collection_scans(value, f"{path}/{key}"))
+    elif isinstance(plan, list):
+        for i, value in enumerate(plan):
+            found.extend(collection_scans(value, f"{path}[{i}]"))
+    return found
+
+
+async def read_all(content):
+    """Iterate a streamed read's cursors (alone or as sections), which is when their queries are sent"""
+    for section in content.values() if isinstance(content, dict) else [content]:
+        if hasattr(section, "__aiter__"):
+            async for _ in section:
+                pass
+
+
+async def exercise_users():
+    """Registration, both login lookups, a legacy plaintext password rehash and the profile read"""
+    user = await register_user(UserCreate(name="Plan guard", email="guard@example.com", password="secret"))
+    await login_user(UserLogin(name="Plan guard", email="guard@example.com", password="secret"))
+    await login_user(UserLogin(name="Plan guard"))
+    db = await database.get_database()
+    await db.users.update_one({"id": user.id}, {"$set": {"password": "secret"}})
+    await login_user(UserLogin(name="Plan guard", email="guard@example.com", password="secret"))
+    await get_user(user.id)
+    # list_users is left out: listing every user is a collection scan by design
+
+
+async def exercise():
+    """The query paths of every service, in the order a studio session uses them"""
+    await exercise_users()
+
+    room = await room_service.create_room(RoomCreate(name="Plan guard", max_participants=8), "plan_guard")
+    await room_service.get_room(room.id)
+    await room_service.get_room_by_code(room.invite_code)
+    await room_service.get_rooms("plan_guard")
+    participants = [await room_service.join_room(room.invite_code, name) for name in ("ana", "bea", "carl")]
+    await room_service.get_room_details(room.id)
+    await read_all(await room_service.stream_room_details(room.id))
+
+    snapshot = await routing_matrix.get_snapshot(room.id)
+
+    sources = await audio_service.get_audio_sources(room.id)
+    microphone = next(source for source in sources if source.participant_id)
+    await audio_service.get_audio_source(microphone.id)
+    await audio_service.update_audio_source(microphone.id, AudioSourceUpdate(volume=0.5))
+    await audio_service.toggle_mute(microphone.id)
+    await audio_service.set_gain(microphone.id, 0.7)
+    await audio_service.toggle_processing(microphone.id, "compressor")
+
+    cameras = await video_service.get_video_sources(room.id)
+    await video_service.toggle_enable(cameras[0].id)
+    await video_service.set_resolution(cameras[0].id, "1280x720")
+    await video_service.get_all_obs_urls(room.id)
+
+    route = await routing_service.create_route(RouteCreate(room_id=room.id, type="audio", source_id=microphone.id,
+                                                           destinations=["obs_audio1"]))
+    await routing_service.get_routes(room.id)
+    await routing_service.add_destination(route.id, participants[1].id)
+    await routing_service.remove_destination(route.id, participants[1].id)
+    await routing_service.toggle_route(route.id)
+    await routing_service.update_route_volume(route.id, 0.4)
+    await routing_service.get_routing_matrix(room.id)
+    await read_all(await routing_service.stream_routing_matrix(room.id))
+    await read_all(await routing_service.stream_route_documents(room.id))
+    await read_all(await audio_service.stream_audio_source_documents(room.id))
+    await read_all(await video_service.stream_video_source_documents(room.id))
+    await routing_matrix.refresh(room.id)
+    await routing_matrix.get_changes(room.id, 0, snapshot["epoch"])
+    await routing_service.auto_route_participant(room.id, participants[0].id)
+    await routing_service.delete_route(route.id)
+
+    await session_service.get_session_details(room.id)
+    await session_service.update_session(room.id, SessionUpdate(is_streaming=True))
+    await session_service.toggle_recording(room.id)
+    await session_service.get_recording_duration(room.id)
+
+    device = await midi_service.create_device(MidiDevice(name="nanoKONTROL", room_id=room.id, mappings=[
+        {"control": "fader_1", "parameter": "volume", "target": microphone.id},
+    ]))
+    await midi_service.update_device(device.id, MidiDeviceUpdate(is_connected=True))
+    await midi_service.handle(None, {"room_id": room.id, "messages": [[0xB0, 0, 100]]})
+    await midi_service.get_devices(room.id)
+    await midi_service.delete_device(device.id)
+
+    await control_channel.apply({"room_id": room.id, "target": "audio_source", "id": microphone.id,
+                                 "field": "volume", "value": 0.9})
+    await control_channel.flush()
+
+    await room_service.leave_room(room.id, participants[2].id)
+    await room_service.delete_room(room.id, "plan_guard")
+    await routing_matrix.delete_room(room.id)
+
+
+async def run(args) -> int:
+    recorder = QueryRecorder(args.db_name)
+    client = AsyncIOMotorClient(args.mongo_url, event_listeners=[recorder], serverSelectionTimeoutMS=5000)
+    await client.drop_database(args.db_name)
+    database.db.client = client
+    database.db.database = client[args.db_name]
+    await database.create_indexes()
+
+    try:
+        await exercise()
+
+        # The collections and their indexes outlive the deleted room, so the
+        # planner still picks between the same candidate plans
+        failures = []
+        seen = set()
+        for command in recorder.commands:
+            for statement in explainable(command):
+                key = json.dumps(shape(statement), sort_keys=True, default=str)
+                if key in seen:
+                    continue
+                seen.add(key)
+                explain = await client[args.db_name].command({"explain": statement, "verbosity": "queryPlanner"})
+                scans = collection_scans(explain)
+                label = f"{next(iter(statement))} {statement[next(iter(statement))]}"
+                if scans:
+                    failures.append((label, statement, scans))
+                elif args.verbose:
+                    print(f"ok   {label}")
+
+        for label, statement, scans in failures:
+            print(f"SCAN {label}")
+            print(f"     {json_util.dumps(statement)[:400]}")
+            for scan in scans:
+                print(f"     {scan}")
+        print(f"{len(seen)} query shapes explained, {len(failures)} with collection scans")
+        return 1 if failures else 0
+    finally:
+        if not args.keep:
+            await client.drop_database(args.db_name)
+        client.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fail when a service query is planned as a collection scan")
+    parser.add_argument("--mongo-url", default=os.environ.get("MONGO_URL", "mongodb://localhost:27017"))
+    parser.add_argument("--db-name", default="emvid_query_plan_guard")
+    parser.add_argument("--keep", action="store_true", help="keep the scratch database")
+    parser.add_argument("--verbose", action="store_true", help="also list the shapes that use an index")
+    sys.exit(asyncio.run(run(parser.parse_args())))
+
+
+if __name__ == "__main__":
+    main()
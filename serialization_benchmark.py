@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+Response serialization benchmark
+
+Seeds a room with N participants (sources and default routes) in the
+in-memory storage backend, then drives the read endpoints in-process over
+ASGI, two ways:
+
+  models     the previous path: Model(**doc) for every document, the handler
+             returns models, FastAPI validates them again against response_model
+             and renders with the stdlib JSON encoder
+  documents  the app as shipped: projected documents returned through
+             FastJSONResponse (orjson), no model validation; list and room
+             snapshot endpoints stream through BSONStreamResponse (on this
+             backend from the cached/stored documents, on Mongo from raw BSON)
+
+Reports requests per second per endpoint and checks both paths return the
+same JSON.
+
+    python serialization_benchmark.py --participants 24 --requests 2000
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from pathlib import Path
+from typing import List
+
+# In-memory store, no Mongo; caches hold the room for the whole run
+os.environ["STORAGE_BACKEND"] = "memory"
+os.environ.setdefault("DOCUMENT_CACHE_TTL_SECONDS", "0")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+sys.path.insert(0, str(Path(__file__).parent / "backend"))
+
+from fastapi import APIRouter, FastAPI  # noqa: E402
+
+from main import app as documents_app  # noqa: E402
+from models import (AudioSource, Participant, Room, RoomCreate, RoomResponse, Route, SessionResponse,  # noqa: E402
+                    Session, VideoSource)
+from services.audio_service import audio_service  # noqa: E402
+from services.room_service import room_service  # noqa: E402
+from services.routing_service import routing_service  # noqa: E402
+from services.session_service import session_service  # noqa: E402
+
+
+def models_app() -> FastAPI:
+    """The read endpoints as they were: validated models and response_model"""
+    router = APIRouter()
+
+    @router.get("/room/{room_id}", response_model=RoomResponse)
+    async def get_room_details(room_id: str):
+        details = await room_service.get_room_details_document(room_id)
+        return RoomResponse(
+            room=Room(**details["room"]),
+            participants=[Participant(**doc) for doc in details["participants"]],
+            audio_sources=[AudioSource(**doc) for doc in details["audio_sources"]],
+            video_sources=[VideoSource(**doc) for doc in details["video_sources"]],
+            routes=[Route(**doc) for doc in details["routes"]],
+        )
+
+    @router.get("/audio/room/{room_id}", response_model=List[AudioSource])
+    async def get_audio_sources(room_id: str):
+        return [AudioSource(**doc) for doc in await audio_service.get_audio_source_documents(room_id)]
+
+    @router.get("/routing/room/{room_id}", response_model=List[Route])
+    async def get_routes(room_id: str):
+        return [Route(**doc) for doc in await routing_service.get_route_documents(room_id)]
+
+    @router.get("/session/{room_id}", response_model=SessionResponse)
+    async def get_session(room_id: str):
+        details = await session_service.get_session_details_document(room_id)
+        return SessionResponse(
+            session=Session(**details["session"]),
+            room=Room(**details["room"]),
+            participants=[Participant(**doc) for doc in details["participants"]],
+        )
+
+    app = FastAPI()
+    app.include_router(router, prefix="/api")
+    return app
+
+
+async def get(app, path: str) -> bytes:
+    """One GET through the ASGI app, no server or socket"""
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET", "scheme": "http",
+        "path": path, "raw_path": path.encode(), "root_path": "", "query_string": b"", "headers": [],
+        "client": ("127.0.0.1", 50000), "server": ("127.0.0.1", 8000),
+    }
+    body = []
+    status = []
+    requested = False
+    done = asyncio.Event()
+
+    async def receive():
+        # The request body once, then (like a server) nothing until the client goes away
+        nonlocal requested
+        if not requested:
+            requested = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await done.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            status.append(message["status"])
+        elif message["type"] == "http.response.body":
+            body.append(message.get("body", b""))
+            if not message.get("more_body"):
+                done.set()
+
+    await app(scope, receive, send)
+    if status[0] != 200:
+        raise RuntimeError(f"GET {path}: {status[0]} {b''.join(body)[:200]!r}")
+    return b"".join(body)
+
+
+async def seed(participants: int) -> str:
+    room = await room_service.create_room(RoomCreate(name="Benchmark", max_participants=participants), "bench")
+    for i in range(participants):
+        await room_service.join_room(room.invite_code, f"participant-{i}")
+    await session_service.create_session(room.id)
+    return room.id
+
+
+async def measure(app, path: str, requests: int) -> float:
+    for _ in range(min(50, requests)):
+        await get(app, path)
+    started = time.perf_counter()
+    for _ in range(requests):
+        await get(app, path)
+    return requests / (time.perf_counter() - started)
+
+
+async def run(args):
+    room_id = await seed(args.participants)
+    before = models_app()
+    details = await room_service.get_room_details_document(room_id)
+    print(f"room: {len(details['participants'])} participants, {len(details['audio_sources'])} audio sources, "
+          f"{len(details['video_sources'])} video sources, {len(details['routes'])} routes")
+
+    endpoints = [
+        ("room details", f"/api/room/{room_id}"),
+        ("audio sources", f"/api/audio/room/{room_id}"),
+        ("routes", f"/api/routing/room/{room_id}"),
+        ("session details", f"/api/session/{room_id}"),
+    ]
+    print(f"{'endpoint':<16} {'models req/s':>13} {'documents req/s':>16} {'speedup':>8} {'bytes':>8}")
+    for label, path in endpoints:
+        old, new = await get(before, path), await get(documents_app, path)
+        if json.loads(old) != json.loads(new):
+            raise SystemExit(f"{label}: the two paths return different JSON")
+        old_rate = await measure(before, path, args.requests)
+        new_rate = await measure(documents_app, path, args.requests)
+        print(f"{label:<16} {old_rate:>13.0f} {new_rate:>16.0f} {new_rate / old_rate:>7.1f}x {len(new):>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Read endpoint throughput: validated models vs orjson documents")
+    parser.add_argument("--participants", type=int, default=24)
+    parser.add_argument("--requests", type=int, default=2000)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
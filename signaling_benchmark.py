@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+"""
+Signaling relay benchmark
+
+Boots backend/main.py's asgi_app on a local port (in its own thread and event loop),
+connects N simulated socket.io clients spread over M rooms and drives the usual
+WebRTC signaling pattern: join, offer to every existing member, answer, then a
+trickle-ICE burst in both directions. Reports relay latency (p50/p99), relayed
+messages per second and the server event-loop lag seen while relaying.
+
+Requires the backend requirements plus aiohttp (socket.io asyncio client):
+    python signaling_benchmark.py --clients 48 --rooms 4 --ice 20
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import socketio
+import uvicorn
+
+BACKEND_DIR = Path(__file__).parent / "backend"
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+class ServerThread(threading.Thread):
+    """Runs uvicorn + asgi_app in a dedicated loop and samples that loop's lag"""
+
+    def __init__(self, port: int, lag_interval: float = 0.01):
+        super().__init__(daemon=True)
+        self.port = port
+        self.lag_interval = lag_interval
+        self.lag_samples: List[float] = []
+        self.measuring = False
+        self.ready = threading.Event()
+        self.server = None
+
+    def run(self):
+        asyncio.run(self._serve())
+
+    async def _serve(self):
+        sys.path.insert(0, str(BACKEND_DIR))
+        os.chdir(BACKEND_DIR)
+        import main  # noqa: E402 - must be imported inside the server loop
+
+        config = uvicorn.Config(main.asgi_app, host="127.0.0.1", port=self.port,
+                                log_level="warning", lifespan="on")
+        self.server = uvicorn.Server(config)
+        lag_task = asyncio.create_task(self._probe_lag())
+        serve_task = asyncio.create_task(self.server.serve())
+        while not self.server.started:
+            await asyncio.sleep(0.01)
+        self.ready.set()
+        await serve_task
+        lag_task.cancel()
+
+    async def _probe_lag(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.lag_interval
+            await asyncio.sleep(self.lag_interval)
+            if self.measuring:
+                self.lag_samples.append(max(0.0, loop.time() - expected))
+
+    def shutdown(self):
+        if self.server is not None:
+            self.server.should_exit = True
+
+
+class SimulatedPeer:
+    """One browser: relays signaling and records arrival latency"""
+
+    def __init__(self, index: int, room_id: str, stats: "RelayStats"):
+        self.index = index
+        self.room_id = room_id
+        self.stats = stats
+        self.client = socketio.AsyncClient(reconnection=False)
+        self.sid = None
+        self.answered = asyncio.Event()
+        self.pending_answers = 0
+
+        self.client.on("offer", self._on_offer)
+        self.client.on("answer", self._on_answer)
+        self.client.on("ice-candidate", self._on_ice)
+        self.client.on("ice-candidates", self._on_ice_batch)
+
+    async def connect(self, url: str):
+        await self.client.connect(url, transports=["websocket"])
+        self.sid = self.client.get_sid()
+        await self.client.emit("join_room", {"room_id": self.room_id})
+
+    def _payload(self, kind: str, seq: int = 0) -> dict:
+        return {"type": kind, "from": self.sid, "seq": seq, "sent_at": time.perf_counter(),
+                "sdp": "v=0" + "x" * 200 if kind in ("offer", "answer") else None,
+                "candidate": "candidate:1 1 udp 2122260223 10.0.0.1 54321 typ host" if kind == "ice" else None}
+
+    def _record(self, payload: dict):
+        self.stats.record(time.perf_counter() - payload["sent_at"])
+
+    async def _on_offer(self, payload):
+        self._record(payload)
+        await self.client.emit("answer", {"room_id": self.room_id, "target_sid": payload["from"],
+                                          "payload": self._payload("answer")})
+
+    async def _on_answer(self, payload):
+        self._record(payload)
+        self.pending_answers -= 1
+        if self.pending_answers <= 0:
+            self.answered.set()
+
+    async def _on_ice(self, payload):
+        self._record(payload)
+
+    async def _on_ice_batch(self, payloads):
+        for payload in payloads:
+            self._record(payload)
+
+    async def negotiate(self, peers: List["SimulatedPeer"], ice_per_peer: int):
+        """Offer to each existing member, wait for answers, then trickle ICE"""
+        if not peers:
+            return
+        self.pending_answers = len(peers)
+        self.answered.clear()
+        for peer in peers:
+            await self.client.emit("offer", {"room_id": self.room_id, "target_sid": peer.sid,
+                                             "payload": self._payload("offer")})
+        await asyncio.wait_for(self.answered.wait(), timeout=30)
+        for seq in range(ice_per_peer):
+            for peer in peers:
+                await self.client.emit("ice_candidate", {"room_id": self.room_id, "target_sid": peer.sid,
+                                                         "payload": self._payload("ice", seq)})
+                await peer.client.emit("ice_candidate", {"room_id": self.room_id, "target_sid": self.sid,
+                                                         "payload": peer._payload("ice", seq)})
+
+
+class RelayStats:
+    def __init__(self):
+        self.latencies: List[float] = []
+
+    def record(self, latency: float):
+        self.latencies.append(latency)
+
+
+async def run_benchmark(args) -> Dict[str, float]:
+    server = ServerThread(args.port)
+    server.start()
+    if not server.ready.wait(timeout=30):
+        raise RuntimeError("Backend did not start")
+    url = f"http://127.0.0.1:{args.port}"
+
+    stats = RelayStats()
+    peers = [SimulatedPeer(i, f"bench-room-{i % args.rooms}", stats) for i in range(args.clients)]
+    await asyncio.gather(*(peer.connect(url) for peer in peers))
+    await asyncio.sleep(0.2)  # let join_room land before the first offer
+
+    by_room: Dict[str, List[SimulatedPeer]] = {}
+    for peer in peers:
+        by_room.setdefault(peer.room_id, []).append(peer)
+
+    server.measuring = True
+    started = time.perf_counter()
+    # Rooms negotiate concurrently; inside a room peers arrive one after another (join storm)
+    await asyncio.gather(*(
+        _negotiate_room(members, args.ice) for members in by_room.values()
+    ))
+    expected = sum(_expected_messages(len(members), args.ice) for members in by_room.values())
+    deadline = time.perf_counter() + 30
+    while len(stats.latencies) < expected and time.perf_counter() < deadline:
+        await asyncio.sleep(0.01)
+    elapsed = time.perf_counter() - started
+    server.measuring = False
+
+    await asyncio.gather(*(peer.client.disconnect() for peer in peers))
+    server.shutdown()
+    server.join(timeout=10)
+
+    latencies_ms = [v * 1000 for v in stats.latencies]
+    lag_ms = [v * 1000 for v in server.lag_samples]
+    return {
+        "messages_expected": expected,
+        "messages_relayed": len(latencies_ms),
+        "elapsed_s": elapsed,
+        "messages_per_s": len(latencies_ms) / elapsed if elapsed else 0.0,
+        "latency_p50_ms": percentile(latencies_ms, 50),
+        "latency_p99_ms": percentile(latencies_ms, 99),
+        "latency_mean_ms": statistics.fmean(latencies_ms) if latencies_ms else 0.0,
+        "loop_lag_p50_ms": percentile(lag_ms, 50),
+        "loop_lag_p99_ms": percentile(lag_ms, 99),
+        "loop_lag_max_ms": max(lag_ms) if lag_ms else 0.0,
+    }
+
+
+async def _negotiate_room(members: List[SimulatedPeer], ice_per_peer: int):
+    for position, peer in enumerate(members):
+        await peer.negotiate(members[:position], ice_per_peer)
+
+
+def _expected_messages(room_size: int, ice_per_peer: int) -> int:
+    pairs = room_size * (room_size - 1) // 2
+    return pairs * (2 + 2 * ice_per_peer)  # offer + answer + ICE both ways
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Socket.IO signaling relay benchmark")
+    parser.add_argument("--clients", type=int, default=24, help="simulated participants")
+    parser.add_argument("--rooms", type=int, default=2, help="rooms the clients are spread over")
+    parser.add_argument("--ice", type=int, default=15, help="ICE candidates per peer connection and direction")
+    parser.add_argument("--ice-batch-ms", type=float, default=0,
+                        help="server-side ICE coalescing window (ICE_BATCH_WINDOW_MS), 0 disables it")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    # Server settings are read from the environment when backend/main.py is imported
+    os.environ["ICE_BATCH_WINDOW_MS"] = str(args.ice_batch_ms)
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+    results = asyncio.run(run_benchmark(args))
+
+    print("=== Signaling relay benchmark ===")
+    print(f"clients={args.clients} rooms={args.rooms} ice_per_peer={args.ice} ice_batch_ms={args.ice_batch_ms}")
+    for key, value in results.items():
+        print(f"{key:>20}: {value:.2f}" if isinstance(value, float) else f"{key:>20}: {value}")
+    if results["messages_relayed"] < results["messages_expected"]:
+        print("WARNING: not every message was relayed before the deadline")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
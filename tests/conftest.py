@@ -0,0 +1,45 @@
+import asyncio
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+# The backend runs from backend/ (imports look like `from models import ...`)
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+# Services read their configuration at import time: no Mongo, quiet logs
+os.environ.setdefault("STORAGE_BACKEND", "memory")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+
+@pytest.fixture
+def memory_db():
+    """A fresh indexed in-memory database behind every service, with empty caches and graphs"""
+    import database
+    from memory_store import MemoryDatabase
+    from services.audio_service import audio_service
+    from services.cache import audio_source_cache, route_cache, video_source_cache
+    from services.midi_service import midi_service
+    from services.room_service import room_service
+    from services.routing_graph import routing_graphs
+    from services.routing_service import routing_service
+    from services.session_service import session_service
+    from services.video_service import video_service
+
+    db = MemoryDatabase("emvid_tests")
+    database.db.client = None
+    database.db.database = db
+    asyncio.run(database.create_indexes())
+    services = (audio_service, video_service, room_service, routing_service, session_service, midi_service)
+    for service in services:
+        service.db = db
+    for cache in (audio_source_cache, video_source_cache, route_cache):
+        cache.clear()
+    routing_graphs.graphs.clear()
+    routing_graphs.route_rooms.clear()
+    routing_graphs.dirty.clear()
+    yield db
+    database.db.database = None
+    for service in services:
+        service.db = None
@@ -0,0 +1,52 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from models import RoomCreate, RoomJoin
+from routes import audio_routes, room_routes
+from services.mixer_engine import mixer_engine
+from services.room_service import room_service
+
+
+@pytest.fixture
+def mixer(monkeypatch):
+    monkeypatch.setattr(mixer_engine, "enabled", True)
+    yield mixer_engine
+    for room_id in list(mixer_engine.plans):
+        mixer_engine.remove_room(room_id)
+
+
+def test_mix_stream_needs_a_known_room_and_bus(memory_db, mixer):
+    async def scenario():
+        room = await room_service.create_room(RoomCreate(name="Studio"), "director")
+        ana = await room_routes.join_room(RoomJoin(room_code=room.invite_code, participant_name="ana"))
+        for room_id, bus_id in (("no-such-room", "obs_main"), (room.id, "anything")):
+            with pytest.raises(HTTPException) as error:
+                await audio_routes.stream_mix(room_id, bus_id)
+            assert error.value.status_code == 404
+        assert "no-such-room" not in mixer.plans and "no-such-room" not in mixer.taps
+
+        for bus_id in ("obs_main", ana.id):
+            response = await audio_routes.stream_mix(room.id, bus_id)
+            body = response.body_iterator
+            assert (await body.__anext__())[:4] == b"RIFF"
+            await body.aclose()
+        assert room.id not in mixer.taps
+
+    asyncio.run(scenario())
+
+
+def test_leaving_removes_the_participant_from_the_mix(memory_db, mixer):
+    async def scenario():
+        room = await room_service.create_room(RoomCreate(name="Studio"), "director")
+        ana = await room_routes.join_room(RoomJoin(room_code=room.invite_code, participant_name="ana"))
+        bea = await room_routes.join_room(RoomJoin(room_code=room.invite_code, participant_name="bea"))
+        await mixer.ensure_room(room.id)
+        assert mixer.has_bus(room.id, ana.id) and ana.audio_source_id in mixer.plans[room.id].source_ids
+        await room_routes.leave_room(room.id, ana.id)
+        plan = mixer.plans[room.id]
+        assert not mixer.has_bus(room.id, ana.id) and ana.audio_source_id not in plan.source_ids
+        assert bea.audio_source_id in plan.source_ids
+
+    asyncio.run(scenario())
@@ -0,0 +1,37 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from models import UserCreate, UserLogin
+from routes.auth_routes import get_user, list_users, login_user, register_user
+
+
+def test_passwords_are_hashed_and_never_listed(memory_db):
+    async def scenario():
+        user = await register_user(UserCreate(name="ana", email="ana@example.com", password="s3cret"))
+        stored = await memory_db.users.find_one({"id": user.id})
+        assert stored["password"] and "s3cret" not in stored["password"]
+
+        listed = await list_users()
+        assert [u["id"] for u in listed] == [user.id] and "password" not in listed[0]
+        assert (await get_user(user.id)).id == user.id
+
+        assert (await login_user(UserLogin(name="ana", email="ana@example.com", password="s3cret"))).id == user.id
+        with pytest.raises(HTTPException) as error:
+            await login_user(UserLogin(name="ana", email="ana@example.com", password="wrong"))
+        assert error.value.status_code == 401
+
+    asyncio.run(scenario())
+
+
+def test_plaintext_records_are_rehashed_on_login(memory_db):
+    async def scenario():
+        await memory_db.users.insert_one({"id": "u1", "name": "bea", "email": None, "role": "director",
+                                          "avatar": None, "password": "legacy"})
+        assert (await login_user(UserLogin(name="bea", password="legacy"))).id == "u1"
+        stored = await memory_db.users.find_one({"id": "u1"})
+        assert stored["password"] != "legacy"
+        assert (await login_user(UserLogin(name="bea", password="legacy"))).id == "u1"
+
+    asyncio.run(scenario())
@@ -0,0 +1,94 @@
+import asyncio
+
+from services.backplane import PubSubHub, RedisBackplane, _encode_command
+
+
+def _collector():
+    received = []
+
+    async def handler(message):
+        received.append(message)
+
+    return received, handler
+
+
+async def _wait_for(received, count):
+    for _ in range(100):
+        if len(received) >= count:
+            break
+        await asyncio.sleep(0.01)
+
+
+def test_reconnecting_the_publisher_keeps_a_single_drain_task(tmp_path):
+    url = f"unix://{tmp_path / 'hub.sock'}"
+
+    async def scenario():
+        hub = PubSubHub()
+        await hub.start(url)
+        received, handler = _collector()
+        sender, receiver = RedisBackplane(url), RedisBackplane(url)
+        await receiver.start(handler)
+        await sender.start(_collector()[1])
+
+        previous = []
+        for _ in range(3):
+            previous.append(sender._drain_task)
+            await sender._connect_publisher()
+        await asyncio.sleep(0)
+        assert all(task.done() for task in previous)
+        assert not sender._drain_task.done() and len(sender._tasks) == 1
+
+        await sender.publish({"event": "ping"})
+        await _wait_for(received, 1)
+        assert [message["event"] for message in received] == ["ping"]
+
+        await sender.stop()
+        await receiver.stop()
+        await hub.stop()
+        assert sender._drain_task is None and sender._pub_writer is None
+
+    asyncio.run(scenario())
+
+
+def test_a_malformed_message_does_not_end_the_subscription(tmp_path):
+    url = f"unix://{tmp_path / 'hub.sock'}"
+
+    async def scenario():
+        hub = PubSubHub()
+        await hub.start(url)
+        received, handler = _collector()
+        sender, receiver = RedisBackplane(url), RedisBackplane(url)
+        await receiver.start(handler)
+        await sender.start(_collector()[1])
+        subscription = receiver._tasks[0]
+
+        sender._pub_writer.write(_encode_command("PUBLISH", sender.channel, "{not json"))
+        await sender.publish({"event": "ping"})
+        await _wait_for(received, 1)
+        assert [message["event"] for message in received] == ["ping"]
+        assert not subscription.done()
+
+        await sender.stop()
+        await receiver.stop()
+        await hub.stop()
+
+    asyncio.run(scenario())
+
+
+def test_socket_events_survive_an_unreachable_backplane(tmp_path):
+    from services.sockets_manager import SocketManager
+
+    async def scenario():
+        hub = PubSubHub()
+        await hub.start(f"unix://{tmp_path / 'hub.sock'}")
+        manager = SocketManager()
+        manager.backplane = RedisBackplane(f"unix://{tmp_path / 'hub.sock'}")
+        await manager.backplane.start(manager._on_backplane_message)
+        await manager.backplane.stop()
+        await hub.stop()
+
+        # La reconexión falla: el evento local se registra igualmente
+        await manager._publish({"type": "join", "room_id": "room", "sid": "sid"})
+        assert manager.stats["backplane_error"] == 1
+
+    asyncio.run(scenario())
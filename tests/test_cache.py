@@ -0,0 +1,32 @@
+from services.cache import DocumentCache
+
+
+def route(route_id, room_id, destinations):
+    return {"_id": route_id, "id": route_id, "room_id": room_id, "destinations": destinations}
+
+
+def test_returned_documents_are_copies():
+    cache = DocumentCache("routes")
+    stored = cache.put(route("r1", "room", ["ana"]))
+    stored["destinations"].append("bea")
+    cache.get("r1")["destinations"].append("carl")
+    cache.put_room("room", [route("r2", "room", ["ana"])])[0]["destinations"].clear()
+    cache.get_room("room")[0]["volume"] = 0.1
+
+    assert cache.get("r1")["destinations"] == ["ana"]
+    assert [document["destinations"] for document in cache.get_room("room")] == [["ana"]]
+    assert "volume" not in cache.get("r2")
+
+
+def test_invalidate_room_drops_only_that_rooms_documents():
+    cache = DocumentCache("routes", max_documents=3)
+    cache.put_room("a", [route("a1", "a", []), route("a2", "a", [])])
+    cache.put(route("b1", "b", []))
+    cache.put({**route("a2", "b", []), "_id": None})  # moved to another room
+    cache.put(route("b2", "b", []))                   # evicts a1
+
+    cache.invalidate_room("b")
+    assert len(cache) == 0 and cache._room_index == {}
+    cache.put(route("a3", "a", []))
+    cache.invalidate_room("a")
+    assert cache.get("a3") is None and cache.get_room("a") is None
@@ -0,0 +1,64 @@
+import asyncio
+
+import pytest
+
+from models import RoomCreate
+from services.audio_service import audio_service
+from services.control_channel import control_channel
+from services.room_service import room_service
+
+
+def test_values_are_coerced_strictly(memory_db):
+    async def scenario():
+        room = await room_service.create_room(RoomCreate(name="Studio"), "director")
+        participant = await room_service.join_room(room.invite_code, "ana")
+        source = next(s for s in await audio_service.get_audio_sources(room.id) if s.participant_id == participant.id)
+
+        def change(field, value):
+            return {"room_id": room.id, "target": "audio_source", "id": source.id, "field": field, "value": value}
+
+        result = await control_channel.apply_many([
+            change("is_muted", "false"), change("is_muted", "0"), change("gate", None), change("lowcut", 2),
+            change("volume", float("nan")), change("gain", float("inf")), change("volume", "loud"),
+            change("solo", True),
+            change("is_muted", True), change("gate", 1), change("compressor", False), change("volume", 3),
+        ])
+        assert [error["change"]["field"] for error in result["errors"]] == [
+            "is_muted", "is_muted", "gate", "lowcut", "volume", "gain", "volume", "solo"]
+        assert [(c["field"], c["value"]) for c in result["applied"]] == [
+            ("is_muted", True), ("gate", True), ("compressor", False), ("volume", 1.0)]
+        control_channel.pending.clear()
+
+    asyncio.run(scenario())
+
+
+def test_unflushed_changes_survive_a_stale_listing_and_reach_the_mixer(memory_db, monkeypatch):
+    from services.cache import audio_source_cache
+    from services.mixer_engine import mixer_engine
+
+    monkeypatch.setattr(mixer_engine, "enabled", True)
+
+    async def scenario():
+        room = await room_service.create_room(RoomCreate(name="Studio"), "director")
+        ana = await room_service.join_room(room.invite_code, "ana")
+        await room_service.join_room(room.invite_code, "bea")
+        source = next(s for s in await audio_service.get_audio_sources(room.id) if s.participant_id == ana.id)
+        await mixer_engine.ensure_room(room.id)
+        column = mixer_engine.plans[room.id].source_index[source.id]
+        before = mixer_engine.plans[room.id].matrix[:, column].max()
+
+        result = await control_channel.apply_many([{"room_id": room.id, "target": "audio_source", "id": source.id,
+                                                    "field": "volume", "value": 0.1}])
+        assert not result["errors"]
+        # The room listing expires before the flush: the mixer re-reads it from the database
+        audio_source_cache._rooms.pop(room.id)
+        await mixer_engine.refresh_room(room.id)
+        assert mixer_engine.plans[room.id].matrix[:, column].max() == pytest.approx(before * 0.1 / source.volume)
+        assert (await audio_service.get_audio_source(source.id)).volume == 0.1
+
+        await control_channel.flush()
+        assert (await memory_db.audio_sources.find_one({"id": source.id}))["volume"] == 0.1
+        assert not audio_source_cache._held
+        mixer_engine.remove_room(room.id)
+
+    asyncio.run(scenario())
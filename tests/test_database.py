@@ -0,0 +1,57 @@
+import asyncio
+from types import SimpleNamespace
+
+from pymongo.errors import OperationFailure, ServerSelectionTimeoutError
+
+import database
+from memory_store import MemoryDatabase
+
+
+class FakeClient:
+    """Enough of a Motor client for warm_up: pool options and admin pings"""
+
+    def __init__(self, failures):
+        self.failures = list(failures)
+        self.pings = 0
+        self.options = SimpleNamespace(pool_options=SimpleNamespace(min_pool_size=2))
+        self.admin = SimpleNamespace(command=self.command)
+
+    async def command(self, name):
+        self.pings += 1
+        if self.failures:
+            raise self.failures.pop(0)
+        return {"ok": 1}
+
+
+def run_warm_up(monkeypatch, client, create_indexes):
+    monkeypatch.setattr(database.db, "client", client)
+    monkeypatch.setattr(database.db, "database", MemoryDatabase("warm_up"))
+    monkeypatch.setattr(database.db, "ready", False)
+    monkeypatch.setattr(database.db, "error", None)
+    monkeypatch.setattr(database, "create_indexes", create_indexes)
+    asyncio.run(asyncio.wait_for(database.warm_up(retry_seconds=0), timeout=5))
+
+
+def test_warm_up_retries_until_the_server_answers(monkeypatch):
+    client = FakeClient([ServerSelectionTimeoutError("no primary"), ServerSelectionTimeoutError("no primary")])
+    created = []
+
+    async def create_indexes():
+        created.append(True)
+
+    run_warm_up(monkeypatch, client, create_indexes)
+    assert database.db.ready and database.db.error is None
+    assert created == [True] and client.pings >= 4
+
+
+def test_warm_up_does_not_retry_a_failing_index_build(monkeypatch):
+    attempts = []
+
+    async def create_indexes():
+        attempts.append(True)
+        raise OperationFailure("Index build failed: duplicate key")
+
+    run_warm_up(monkeypatch, FakeClient([]), create_indexes)
+    assert attempts == [True]
+    assert not database.db.ready
+    assert "duplicate key" in database.db.error
@@ -0,0 +1,70 @@
+import numpy as np
+
+from services import dsp
+from services.dsp import DspBank, DspSettings, biquad_filter, highpass_coefficients, linear_to_db
+
+RATE = 48000
+
+
+def sine(hz, seconds=0.5, amplitude=0.5):
+    t = np.arange(int(RATE * seconds)) / RATE
+    return amplitude * np.sin(2 * np.pi * hz * t)
+
+
+def rms_db(x):
+    return float(linear_to_db(np.sqrt(np.mean(x ** 2))))
+
+
+def flags(*values):
+    return np.array(values, dtype=bool)
+
+
+def test_numpy_biquad_matches_scipy(monkeypatch):
+    b, a = highpass_coefficients(80.0, RATE)
+    x = np.random.default_rng(1).standard_normal((3, 480))
+    state = np.random.default_rng(2).standard_normal((3, 2)) * 0.01
+    expected, expected_state = biquad_filter(b, a, x, state.copy())
+    monkeypatch.setattr(dsp, "SCIPY_AVAILABLE", False)
+    y, new_state = biquad_filter(b, a, x, state.copy())
+    assert np.allclose(y, expected) and np.allclose(new_state, expected_state)
+
+
+def test_lowcut_removes_rumble_and_keeps_voice():
+    bank = DspBank(2)
+    frames = np.stack([sine(20), sine(1000)])
+    for start in range(0, frames.shape[1], 480):  # 10 ms blocks, state carried across them
+        bank.process(frames[:, start:start + 480], flags(True, True), flags(False, False), flags(False, False))
+    settled = frames[:, RATE // 4:]
+    assert rms_db(settled[0]) < rms_db(sine(20)) - 20
+    assert abs(rms_db(settled[1]) - rms_db(sine(1000))) < 0.1
+
+
+def test_gate_closes_on_noise_and_opens_on_signal():
+    bank = DspBank(2)
+    noise = np.random.default_rng(3).standard_normal(RATE // 2) * 10 ** (-70 / 20)
+    frames = np.stack([noise.copy(), sine(440)])
+    bank.process(frames, flags(False, False), flags(True, True), flags(False, False))
+    floor = 10 ** (DspSettings().gate_floor_db / 20)
+    assert np.sqrt(np.mean(frames[0] ** 2)) < 1.5 * floor * np.sqrt(np.mean(noise ** 2))
+    assert abs(rms_db(frames[1, RATE // 10:]) - rms_db(sine(440))) < 0.1
+
+
+def test_compressor_reduces_by_ratio_above_threshold():
+    bank = DspBank(2)
+    frames = np.stack([sine(440, amplitude=1.0), sine(440, amplitude=0.05)])  # 0 dBFS and -26 dBFS peaks
+    bank.process(frames, flags(False, False), flags(False, False), flags(True, True))
+    # 18 dB over the -18 dB threshold at 4:1 leaves 4.5 dB over: 13.5 dB of reduction
+    assert abs(rms_db(frames[0, RATE // 4:]) - (rms_db(sine(440, amplitude=1.0)) - 13.5)) < 0.3
+    assert abs(rms_db(frames[1]) - rms_db(sine(440, amplitude=0.05))) < 0.01
+
+
+def test_disabled_stages_pass_through_and_remap_keeps_state():
+    bank = DspBank(2)
+    frames = np.stack([sine(440, amplitude=1.0), sine(440, amplitude=1.0)])
+    untouched = frames[1].copy()
+    bank.process(frames, flags(False, False), flags(False, False), flags(True, False))
+    assert np.array_equal(frames[1], untouched)
+
+    remapped = bank.remap(["a", "b"], ["c", "a"])
+    assert remapped.reduction_db[1] == bank.reduction_db[0] < 0
+    assert remapped.reduction_db[0] == 0 and remapped.compressor_gain[0] == 1
@@ -0,0 +1,60 @@
+import asyncio
+
+from services.ice_coalescer import IceCandidateCoalescer
+
+
+class FakeManager:
+    def __init__(self):
+        self.sent = []
+
+    async def forward_to_peer(self, event, data, sender_sid=None):
+        self.sent.append((event, data, sender_sid))
+
+
+def candidate(n, room_id="room-1", target_sid=None):
+    data = {"room_id": room_id, "payload": {"candidate": f"c{n}"}}
+    if target_sid:
+        data["target_sid"] = target_sid
+    return data
+
+
+def test_disabled_forwards_each_candidate():
+    async def scenario():
+        manager = FakeManager()
+        coalescer = IceCandidateCoalescer(manager, window_ms=0)
+        await coalescer.add(candidate(1), sender_sid="a")
+        await coalescer.add(candidate(2), sender_sid="a")
+        return manager.sent
+    assert [event for event, _, _ in asyncio.run(scenario())] == ["ice-candidate", "ice-candidate"]
+
+
+def test_window_batches_per_sender_and_target():
+    async def scenario():
+        manager = FakeManager()
+        coalescer = IceCandidateCoalescer(manager, window_ms=20)
+        for n in range(3):
+            await coalescer.add(candidate(n, target_sid="b"), sender_sid="a")
+        await coalescer.add(candidate(9), sender_sid="c")
+        assert manager.sent == []
+        await asyncio.sleep(0.05)
+        return manager.sent
+    sent = asyncio.run(scenario())
+    assert sorted((event, len(data["payload"]), data.get("target_sid"), sender) for event, data, sender in sent) == [
+        ("ice-candidates", 1, None, "c"), ("ice-candidates", 3, "b", "a")]
+
+
+def test_max_batch_and_flush_room_send_without_waiting():
+    async def scenario():
+        manager = FakeManager()
+        coalescer = IceCandidateCoalescer(manager, window_ms=10_000, max_batch=2)
+        await coalescer.add(candidate(1), sender_sid="a")
+        await coalescer.add(candidate(2), sender_sid="a")
+        await coalescer.add(candidate(3), sender_sid="a")
+        await coalescer.add(candidate(4, room_id="room-2"), sender_sid="a")
+        sent_before_offer = len(manager.sent)
+        await coalescer.flush_room("room-1")
+        return sent_before_offer, manager.sent, coalescer
+    sent_before_offer, sent, coalescer = asyncio.run(scenario())
+    assert sent_before_offer == 1
+    assert [[p["candidate"] for p in data["payload"]] for _, data, _ in sent] == [["c1", "c2"], ["c3"]]
+    assert list(coalescer._room_keys) == ["room-2"]
@@ -0,0 +1,72 @@
+import asyncio
+
+import pytest
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from memory_store import MemoryDatabase
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+@pytest.fixture
+def routes():
+    db = MemoryDatabase("memory_store_tests")
+
+    async def seed():
+        await db.routes.create_index("id", unique=True)
+        await db.routes.create_index("room_id")
+        await db.routes.create_index("destinations")
+        await db.routes.insert_many([
+            {"id": "r1", "room_id": "a", "source_id": "s1", "destinations": ["p1", "p2"], "volume": 0.5},
+            {"id": "r2", "room_id": "a", "source_id": "s2", "destinations": ["p3"], "volume": 1.0},
+            {"id": "r3", "room_id": "b", "source_id": "s1", "destinations": ["p1"], "volume": 0.2},
+        ])
+    run(seed())
+    return db.routes
+
+
+def ids(documents):
+    return sorted(document["id"] for document in documents)
+
+
+def test_queries_match_like_mongo(routes):
+    async def scenario():
+        assert ids(await routes.find({"destinations": "p1"}).to_list(None)) == ["r1", "r3"]
+        assert ids(await routes.find({"room_id": "a", "$or": [{"source_id": {"$in": ["s2"]}},
+                                                             {"destinations": "p1"}]}).to_list(None)) == ["r1", "r2"]
+        assert ids(await routes.find({"volume": {"$gte": 0.5}, "source_id": {"$ne": "s2"}}).to_list(None)) == ["r1"]
+        assert await routes.count_documents({"room_id": {"$in": ["a", "b"]}}) == 3
+        document = await routes.find_one({"id": "r1"}, {"_id": 0, "id": 1, "volume": 1})
+        assert document == {"id": "r1", "volume": 0.5}
+        cursor = routes.find({}, {"_id": 0}).sort("volume", -1).limit(2)
+        assert [d["id"] for d in await cursor.to_list(None)] == ["r2", "r1"]
+
+    run(scenario())
+
+
+def test_unique_indexes_and_updates_keep_indexes_current(routes):
+    async def scenario():
+        with pytest.raises(DuplicateKeyError):
+            await routes.insert_one({"id": "r1", "room_id": "c"})
+        updated = await routes.find_one_and_update({"id": "r2"}, {"$push": {"destinations": "p1"}, "$inc": {"volume": -0.5}},
+                                                   return_document=ReturnDocument.AFTER)
+        assert updated["destinations"] == ["p3", "p1"] and updated["volume"] == 0.5
+        assert ids(await routes.find({"destinations": "p1"}).to_list(None)) == ["r1", "r2", "r3"]
+        await routes.update_many({"room_id": "a"}, {"$pull": {"destinations": "p1"}})
+        assert ids(await routes.find({"destinations": "p1"}).to_list(None)) == ["r3"]
+        assert (await routes.delete_many({"source_id": "s1"})).deleted_count == 2
+        assert ids(await routes.find({}).to_list(None)) == ["r2"]
+
+    run(scenario())
+
+
+def test_returned_documents_are_copies(routes):
+    async def scenario():
+        document = await routes.find_one({"id": "r1"})
+        document["destinations"].append("p9")
+        assert (await routes.find_one({"id": "r1"}))["destinations"] == ["p1", "p2"]
+
+    run(scenario())
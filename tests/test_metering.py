@@ -0,0 +1,86 @@
+import asyncio
+
+import numpy as np
+
+from services.dsp import SILENCE_DB
+from services.metering import METER_HEADER, MeterBank, MeteringService, encode_meter_frame
+from services.mixer_engine import MixPlan
+
+SAMPLE_RATE = 48000
+BLOCK = 960
+
+
+class FakeSocketManager:
+    def __init__(self):
+        self.layouts = []
+        self.frames = []
+
+    async def forward_to_peer(self, event, data):
+        self.layouts.append((event, data))
+
+    async def broadcast_volatile(self, event, payload, room_id):
+        self.frames.append((event, payload, room_id))
+
+
+def sine(amplitude: float, frequency: float = 997.0, blocks: int = 50) -> np.ndarray:
+    t = np.arange(BLOCK * blocks) / SAMPLE_RATE
+    return (amplitude * np.sin(2 * np.pi * frequency * t)).astype(np.float32)
+
+
+def make_plan(sources=("mic-1",), buses=("obs_main",)) -> MixPlan:
+    return MixPlan(list(sources), list(buses), np.ones((len(buses), len(sources)), dtype=np.float32), {})
+
+
+def test_meter_bank_peak_rms_and_silence():
+    bank = MeterBank(2, BLOCK, SAMPLE_RATE)
+    signal = sine(0.5)
+    for start in range(0, len(signal), BLOCK):
+        block = signal[start:start + BLOCK]
+        bank.add(np.stack([block, np.zeros_like(block)]))
+    levels = bank.read()
+    assert abs(levels[0, 0] - 20 * np.log10(0.5)) < 0.1            # peak dBFS
+    assert abs(levels[0, 1] - 20 * np.log10(0.5 / np.sqrt(2))) < 0.1  # RMS dBFS
+    # BS.1770 calibration: a ~1 kHz sine reads its RMS level in LUFS
+    assert abs(levels[0, 2] - 20 * np.log10(0.5 / np.sqrt(2))) < 0.2
+    assert levels[1, 0] == SILENCE_DB and levels[1, 2] == SILENCE_DB
+    # read() starts a new peak/RMS interval
+    assert np.all(bank.read()[:, :2] == SILENCE_DB)
+
+
+def test_encode_meter_frame_layout():
+    levels = np.array([[-3.0, -6.02, -14.0], [-120.0, -120.0, -120.0]])
+    frame = encode_meter_frame(7, 1, 1, 42, levels)
+    version, layout_version, sources, buses, sequence = METER_HEADER.unpack_from(frame)
+    assert (layout_version, sources, buses, sequence) == (7, 1, 1, 42)
+    values = np.frombuffer(frame[METER_HEADER.size:], dtype="<i2").reshape(2, 3)
+    assert values.tolist() == [[-300, -602, -1400], [-12000, -12000, -12000]]
+
+
+def test_layout_follows_channels_and_remove_room_forgets_the_room():
+    async def scenario():
+        sio = FakeSocketManager()
+        meters = MeteringService(interval_ms=10)
+        meters.attach(sio)
+        plan = make_plan()
+        block = np.zeros((1, BLOCK), dtype=np.float32)
+
+        await meters.on_mix("room-1", plan, block, block)
+        assert meters.layout("room-1")["layout_version"] == 1
+        # Same channels with new gains: same layout, loudness history kept
+        await meters.on_mix("room-1", make_plan(), block, block)
+        assert meters.layout("room-1")["layout_version"] == 1 and len(sio.layouts) == 1
+        # A new bus changes the layout
+        await meters.on_mix("room-1", make_plan(buses=("obs_main", "ana")), block, np.zeros((2, BLOCK)))
+        assert meters.layout("room-1")["layout_version"] == 2 and len(sio.layouts) == 2
+
+        meters.start()
+        await asyncio.sleep(0.05)
+        assert sio.frames and sio.frames[-1][2] == "room-1"
+
+        meters.remove_room("room-1")
+        sent = len(sio.frames)
+        await asyncio.sleep(0.05)
+        await meters.stop()
+        assert meters.layout("room-1") is None and len(sio.frames) == sent
+
+    asyncio.run(scenario())
@@ -0,0 +1,82 @@
+import asyncio
+
+from models import MidiDevice, RoomCreate
+from services.audio_service import audio_service
+from services.cache import audio_source_cache
+from services.control_channel import control_channel
+from services.midi_service import channel_messages, compile_mappings, midi_service
+from services.room_service import room_service
+
+ROOM = "room-1"
+
+
+def table():
+    devices = [{"mappings": [
+        {"control": "fader_1", "target": "mic-1", "parameter": "volume"},
+        {"control": "fader_2", "target": "mic-2", "parameter": "volume"},
+        {"midi": "note:0:36", "target": "route-1", "parameter": "enable"},
+    ]}]
+    targets = {"mic-1": "audio_source", "mic-2": "audio_source", "route-1": "route"}
+    return compile_mappings(ROOM, devices, targets)
+
+
+def values(changes):
+    return {document_id: change["value"] for (_, document_id, _), change in changes.items()}
+
+
+def test_aligned_stream_keeps_the_last_value_per_field():
+    changes = table().dispatch(bytes([0xB0, 0, 10, 0xB0, 1, 127, 0xB0, 0, 127]))
+    assert values(changes) == {"mic-1": 1.0, "mic-2": 1.0}
+
+
+def test_running_status_and_one_data_byte_messages():
+    data = bytes([0xC0, 5, 0xB0, 0, 0, 1, 127, 0xD0, 40])
+    assert list(channel_messages(data)) == [(0xC0, 5, 0), (0xB0, 0, 0), (0xB0, 1, 127), (0xD0, 40, 0)]
+    assert values(table().dispatch(data)) == {"mic-1": 0.0, "mic-2": 1.0}
+
+
+def test_real_time_sysex_and_system_common_bytes_are_skipped():
+    data = bytes([0xF8, 0xB0, 0xFE, 0, 127,               # clock and active sensing inside a message
+                  0xF0, 0x7E, 0x00, 0x01, 0x02, 0xF7,     # SysEx payload looks like data bytes
+                  0x01, 0x02,                             # no running status after SysEx
+                  0xF2, 0x10, 0x20, 0x30,                 # song position, then orphan data
+                  0x90, 36, 100])
+    assert list(channel_messages(data)) == [(0xB0, 0, 127), (0x90, 36, 100)]
+
+
+def test_truncated_messages_are_dropped():
+    data = bytes([0xB0, 1, 0x90, 36, 127, 0xB0])
+    assert list(channel_messages(data)) == [(0x90, 36, 127)]
+    assert values(table().dispatch(data)) == {"route-1": True}
+
+
+def test_out_of_range_triples_are_ignored():
+    changes = table().dispatch([[0xB0, 0, 128], [0xB0, 200, 10], [0xB0, 1, -1], [0x30, 0, 10], [0xF0, 0, 1],
+                                [0xB0, 1, 64]])
+    assert values(changes) == {"mic-2": 64 / 127}
+
+
+def test_malformed_json_entries_are_skipped():
+    changes = table().dispatch([[0xB0, 0], [0xB0, 0, 1, 2], ["0xB0", 0, 1], [0xB0, 0.5, 1], None, 7,
+                                [0xB0, None, 3], [0xB0, 1, 127]])
+    assert values(changes) == {"mic-2": 1.0}
+
+
+def test_buttons_toggle_documents_that_are_not_cached(memory_db):
+    async def scenario():
+        room = await room_service.create_room(RoomCreate(name="Studio"), "director")
+        music = next(s for s in await audio_service.get_audio_sources(room.id) if s.participant_id is None)
+        assert music.is_muted
+        await midi_service.create_device(MidiDevice(name="nanoKONTROL", room_id=room.id, mappings=[
+            {"control": "button_1", "target": music.id, "parameter": "mute"}]))
+
+        results = []
+        for _ in range(2):
+            audio_source_cache.clear()  # another worker's view, or an expired entry
+            result = await midi_service.handle(None, {"room_id": room.id, "messages": bytes([0xB0, 32, 127])})
+            results.append([change["value"] for change in result["applied"]])
+            await control_channel.flush()
+        assert results == [[False], [True]]
+        midi_service.invalidate(room.id)
+
+    asyncio.run(scenario())
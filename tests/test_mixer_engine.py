@@ -0,0 +1,97 @@
+import asyncio
+
+import numpy as np
+
+from models import AudioSource, Route, SourceType
+from services.mixer_engine import AudioMixerEngine, compile_mix, wav_stream_header
+
+ROOM = "room-1"
+
+
+def make_sources():
+    ana = AudioSource(id="mic-ana", name="Ana", type=SourceType.MICROPHONE, room_id=ROOM, participant_id="ana",
+                      volume=1.0, gain=0.5, compressor=False)
+    bea = AudioSource(id="mic-bea", name="Bea", type=SourceType.MICROPHONE, room_id=ROOM, participant_id="bea",
+                      volume=0.5, gain=0.5, compressor=False)
+    music = AudioSource(id="music", name="Music", type=SourceType.MUSIC, room_id=ROOM, volume=0.3,
+                        is_muted=True, gain=0.5, compressor=False)
+    return [ana, bea, music]
+
+
+def make_routes():
+    return [
+        Route(room_id=ROOM, type="audio", source_id="mic-ana", destinations=["ana", "bea", "obs_main"], volume=0.8),
+        Route(room_id=ROOM, type="audio", source_id="mic-bea", destinations=["ana", "obs_main"], volume=1.0),
+        Route(room_id=ROOM, type="audio", source_id="music", destinations=["obs_main"], volume=1.0),
+        Route(room_id=ROOM, type="audio", source_id="mic-bea", destinations=["obs_audio1"], is_active=False),
+        Route(room_id=ROOM, type="video", source_id="mic-ana", destinations=["obs_camera1"]),
+    ]
+
+
+def test_compile_mix_folds_faders_and_excludes_own_sources():
+    plan = compile_mix(make_sources(), make_routes())
+    assert plan.source_ids == ["mic-ana", "mic-bea", "music"]
+    # ana's own microphone is not in her bus (mix-minus); inactive and video routes make no bus
+    assert plan.bus_ids == ["bea", "obs_main", "ana"]
+    rows = {bus: plan.matrix[i] for i, bus in enumerate(plan.bus_ids)}
+    np.testing.assert_allclose(rows["ana"], [0.0, 0.5, 0.0])
+    np.testing.assert_allclose(rows["bea"], [0.8, 0.0, 0.0])
+    # muted music contributes nothing
+    np.testing.assert_allclose(rows["obs_main"], [0.8, 0.5, 0.0])
+    assert plan.participant_sources == {"ana": "mic-ana", "bea": "mic-bea"}
+    np.testing.assert_allclose(plan.input_gain, [1.0, 1.0, 1.0])
+
+
+def test_mix_block_applies_matrix():
+    engine = AudioMixerEngine(block_ms=10)
+    engine.set_plan(ROOM, compile_mix(make_sources(), make_routes()))
+    engine.inputs.push("mic-ana", np.full(engine.block_size, 0.5, dtype=np.float32))
+    engine.inputs.push("mic-bea", np.full(engine.block_size, 0.2, dtype=np.float32))
+    mixes = engine.mix_block(ROOM)
+    plan = engine.plans[ROOM]
+    np.testing.assert_allclose(mixes[plan.bus_ids.index("obs_main")], 0.8 * 0.5 + 0.5 * 0.2, rtol=1e-5)
+    np.testing.assert_allclose(mixes[plan.bus_ids.index("ana")], 0.1, rtol=1e-5)
+
+
+def test_taps_receive_their_bus_and_end_with_the_room():
+    async def scenario():
+        engine = AudioMixerEngine(enabled=True, block_ms=10)
+        engine.set_plan(ROOM, compile_mix(make_sources(), make_routes()))
+        tap = engine.open_tap(ROOM, "obs_main")
+        idle = engine.open_tap(ROOM, "nobody")
+        engine.inputs.push("mic-ana", np.full(engine.block_size * 4, 0.5, dtype=np.float32))
+        engine.start()
+        try:
+            block = await tap.read(timeout=1.0)
+            assert block.shape == (engine.block_size,)
+            np.testing.assert_allclose(block, 0.4, rtol=1e-5)
+            # A bus nothing is routed to reads as silence
+            assert not np.any(await idle.read(timeout=0.05))
+
+            engine.close_tap(idle)
+            assert "nobody" not in engine.taps[ROOM]
+
+            engine.remove_room(ROOM)
+            while (block := await tap.read(timeout=0.05)) is not None:
+                pass
+            assert tap.closed and ROOM not in engine.taps and ROOM not in engine.plans
+        finally:
+            await engine.stop()
+
+    asyncio.run(scenario())
+
+
+def test_stalled_tap_keeps_only_recent_blocks():
+    engine = AudioMixerEngine(block_ms=10)
+    tap = engine.open_tap(ROOM, "obs_main")
+    for i in range(100):
+        tap.offer(np.full(engine.block_size, i, dtype=np.float32))
+    first = asyncio.run(tap.read())
+    assert first[0] == 75
+
+
+def test_wav_stream_header():
+    header = wav_stream_header(48000)
+    assert len(header) == 44
+    assert header[:4] == b"RIFF" and header[8:16] == b"WAVEfmt " and header[36:40] == b"data"
+    assert int.from_bytes(header[24:28], "little") == 48000
@@ -0,0 +1,76 @@
+import asyncio
+import json
+import logging
+from datetime import datetime
+
+import bson
+import pytest
+from bson.raw_bson import RawBSONDocument
+
+from responses import BSONStreamResponse, FastJSONResponse, read_response
+
+
+def raw(document):
+    return RawBSONDocument(bson.encode(document))
+
+
+class Cursor:
+    """Async cursor yielding documents, failing with `error` after `fail_after` of them"""
+
+    def __init__(self, documents, fail_after=None, error=RuntimeError("cursor died")):
+        self.documents, self.fail_after, self.error = documents, fail_after, error
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for i, document in enumerate(self.documents):
+            if i == self.fail_after:
+                raise self.error
+            yield document
+        if self.fail_after == len(self.documents):
+            raise self.error
+
+
+async def body(response):
+    return b"".join([chunk async for chunk in response.body_iterator])
+
+
+def render(content):
+    """read_response and the streamed body in one event loop, as in a request"""
+    async def request():
+        return await body(await read_response(content))
+    return asyncio.run(request())
+
+
+def test_raw_documents_render_like_dicts():
+    documents = [{"id": "a", "volume": 0.5, "at": datetime(2024, 1, 2, 3, 4, 5)}, {"id": "b", "tags": ["x"]}]
+    rendered = json.loads(FastJSONResponse([raw(d) for d in documents]).body)
+    assert rendered == json.loads(FastJSONResponse(documents).body)
+    assert rendered[0]["at"] == "2024-01-02T03:04:05"
+
+
+def test_cursor_sections_stream_in_chunks():
+    content = {"room": {"id": "r"}, "routes": Cursor([raw({"id": str(i)}) for i in range(50)]), "empty": Cursor([])}
+    assert isinstance(asyncio.run(read_response({"routes": Cursor([])})), BSONStreamResponse)
+    data = json.loads(render(content))
+    assert data["room"] == {"id": "r"} and data["empty"] == []
+    assert [d["id"] for d in data["routes"]] == [str(i) for i in range(50)]
+
+
+def test_small_chunks_split_the_body():
+    async def chunks():
+        return [chunk async for chunk in BSONStreamResponse._chunks([{"id": i} for i in range(20)], 16)]
+    parts = asyncio.run(chunks())
+    assert len(parts) > 1 and json.loads(b"".join(parts)) == [{"id": i} for i in range(20)]
+
+
+def test_query_errors_raise_before_the_response_starts():
+    with pytest.raises(RuntimeError, match="cursor died"):
+        asyncio.run(read_response({"routes": Cursor([], fail_after=0)}))
+
+
+def test_errors_after_the_headers_are_logged_and_abort_the_body(caplog):
+    with caplog.at_level(logging.ERROR, logger="responses"), pytest.raises(RuntimeError, match="cursor died"):
+        render(Cursor([{"id": 1}, {"id": 2}], fail_after=1))
+    assert "Streamed response aborted" in caplog.text
@@ -0,0 +1,37 @@
+import asyncio
+
+from models import RoomCreate, RoomJoin, VideoSourceUpdate
+from routes import room_routes, video_routes
+from services.room_service import room_service
+from services.sfu_service import sfu_service
+from services.video_service import video_service
+
+
+def test_source_and_membership_changes_reach_the_sfu(memory_db, monkeypatch):
+    calls = []
+
+    async def refresh_room(room_id):
+        calls.append(("refresh", room_id))
+
+    async def remove_participant(room_id, participant_id):
+        calls.append(("leave", participant_id))
+
+    async def remove_room(room_id):
+        calls.append(("remove", room_id))
+
+    monkeypatch.setattr(sfu_service, "refresh_room", refresh_room)
+    monkeypatch.setattr(sfu_service, "remove_participant", remove_participant)
+    monkeypatch.setattr(sfu_service, "remove_room", remove_room)
+
+    async def scenario():
+        room = await room_service.create_room(RoomCreate(name="Studio"), "director")
+        ana = await room_routes.join_room(RoomJoin(room_code=room.invite_code, participant_name="ana"))
+        camera = (await video_service.get_video_sources(room.id))[0]
+        await video_routes.toggle_video_source(camera.id)
+        await video_routes.update_video_source(camera.id, VideoSourceUpdate(is_enabled=True))
+        await room_routes.leave_room(room.id, ana.id)
+        await room_routes.delete_room(room.id, "director")
+        return room.id, ana.id
+
+    room_id, ana_id = asyncio.run(scenario())
+    assert calls == [("refresh", room_id)] * 3 + [("leave", ana_id), ("refresh", room_id), ("remove", room_id)]
@@ -0,0 +1,50 @@
+import asyncio
+
+from services.room_expiry import RoomExpiryScheduler
+
+
+def test_rooms_expire_in_deadline_order_unless_cancelled():
+    async def scenario():
+        expired = []
+        scheduler = RoomExpiryScheduler(expired.append)
+        scheduler.start()
+        scheduler.schedule("late", 0.06)
+        scheduler.schedule("early", 0.02)
+        scheduler.schedule("cancelled", 0.01)
+        scheduler.cancel("cancelled")
+        scheduler.schedule("rescheduled", 0.01)
+        scheduler.schedule("rescheduled", 0.2)  # someone left again later: the newer deadline wins
+        await asyncio.sleep(0.1)
+        remaining = len(scheduler)
+        await scheduler.stop()
+        return expired, remaining
+    expired, remaining = asyncio.run(scenario())
+    assert expired == ["early", "late"] and remaining == 1
+
+
+def test_a_failing_callback_does_not_stop_the_scheduler():
+    async def scenario():
+        expired = []
+
+        def on_expire(room_id):
+            if room_id == "broken":
+                raise RuntimeError("boom")
+            expired.append(room_id)
+        scheduler = RoomExpiryScheduler(on_expire)
+        scheduler.start()
+        scheduler.schedule("broken", 0)
+        scheduler.schedule("fine", 0.01)
+        await asyncio.sleep(0.05)
+        await scheduler.stop()
+        return expired
+    assert asyncio.run(scenario()) == ["fine"]
+
+
+def test_stale_entries_are_compacted():
+    async def scenario():
+        scheduler = RoomExpiryScheduler(lambda room_id: None)
+        for _ in range(200):
+            scheduler.schedule("busy", 60)
+        return len(scheduler._heap), len(scheduler)
+    heap_size, scheduled = asyncio.run(scenario())
+    assert scheduled == 1 and heap_size <= 2 + 64
@@ -0,0 +1,113 @@
+import asyncio
+
+from models import RoomCreate, Route
+from services.room_service import room_service
+from services.routing_graph import RoutingGraph, build_graph
+from services.routing_service import routing_service
+
+ROOM = "room-1"
+SOURCES = [
+    {"id": "mic-ana", "participant_id": "ana"},
+    {"id": "mic-bea", "participant_id": "bea"},
+    {"id": "music", "participant_id": None},
+]
+
+
+def route(route_id, source_id, destinations, **fields):
+    return {"id": route_id, "room_id": ROOM, "type": "audio", "source_id": source_id,
+            "destinations": destinations, "volume": 0.8, "is_active": True, **fields}
+
+
+def test_who_hears_whom_and_mix_minus():
+    graph = build_graph(ROOM, [
+        route("r1", "mic-ana", ["bea", "obs_main"]),
+        route("r2", "mic-bea", ["ana"], volume=0.5),
+        route("r3", "music", ["ana", "bea"], volume=0.3),
+    ], SOURCES)
+    assert graph.who_hears_whom() == {"ana": ["bea"], "bea": ["ana"]}
+    assert graph.mix_minus() == {"ana": {"mic-bea": 0.5, "music": 0.30000001192092896},
+                                 "bea": {"mic-ana": 0.800000011920929, "music": 0.30000001192092896}}
+    assert sorted(graph.destinations_of("mic-ana")) == ["bea", "obs_main"]
+    assert sorted(graph.sources_for("ana")) == ["mic-bea", "music"]
+    assert graph.self_monitoring() == []
+
+
+def test_route_updates_toggle_and_remove():
+    graph = build_graph(ROOM, [route("r1", "mic-ana", ["bea", "ana"])], SOURCES)
+    assert graph.self_monitoring() == [("ana", "mic-ana")]
+
+    graph.put_route(route("r1", "mic-ana", ["bea", "ana"], is_active=False))
+    assert graph.destinations_of("mic-ana") == [] and graph.self_monitoring() == []
+
+    graph.put_route(route("r1", "mic-ana", ["obs_main"]))
+    assert graph.destinations_of("mic-ana") == ["obs_main"]
+
+    graph.remove_route("r1")
+    assert graph.destinations_of("mic-ana") == [] and graph.routes == {}
+
+
+def test_overlapping_routes_count_links():
+    graph = build_graph(ROOM, [route("r1", "mic-ana", ["bea"]), route("r2", "mic-ana", ["bea"])], SOURCES)
+    graph.remove_route("r1")
+    assert graph.destinations_of("mic-ana") == ["bea"]
+    graph.disconnect("r2", "bea")
+    assert graph.destinations_of("mic-ana") == []
+
+
+def test_feedback_cycles_and_growth():
+    graph = RoutingGraph(ROOM, capacity=2)
+    nodes = [f"n{i}" for i in range(100)]
+    for i, node in enumerate(nodes):
+        graph.put_route(route(f"r{i}", node, [nodes[(i + 1) % len(nodes)]]))
+    graph.put_route(route("loop", "solo", ["solo"]))
+    graph.put_route(route("tail", "x", ["y"]))
+    cycles = graph.feedback_cycles()
+    assert sorted(len(cycle) for cycle in cycles) == [1, 100]
+    assert ["solo"] in cycles
+    assert graph.owner.shape[0] >= len(graph.ids)
+
+
+def test_feedback_cycles_follow_participants_to_their_sources():
+    one_way = build_graph(ROOM, [route("r1", "mic-ana", ["bea", "obs_main"]), route("r2", "music", ["ana", "bea"])],
+                          SOURCES)
+    assert one_way.feedback_cycles() == []
+
+    monitoring = build_graph(ROOM, [route("r1", "mic-ana", ["ana"])], SOURCES)
+    assert [sorted(cycle) for cycle in monitoring.feedback_cycles()] == [["ana", "mic-ana"]]
+
+    two_way = build_graph(ROOM, [route("r1", "mic-ana", ["bea"]), route("r2", "mic-bea", ["ana"]),
+                                 route("r3", "music", ["ana"])], SOURCES)
+    assert [sorted(cycle) for cycle in two_way.feedback_cycles()] == [["ana", "bea", "mic-ana", "mic-bea"]]
+    assert two_way.feedback_cycles("video") == []
+
+
+def test_document():
+    graph = build_graph(ROOM, [route("r1", "mic-ana", ["bea"]), route("r2", "music", ["ana"]),
+                               route("r3", "music", ["obs_main"])], SOURCES)
+    document = graph.to_document()
+    assert document["room_id"] == ROOM and len(document["routes"]) == 3
+
+
+def test_leave_room_deletes_routes_the_local_graph_never_saw(memory_db):
+    async def scenario():
+        room = await room_service.create_room(RoomCreate(name="Studio"), "director")
+        ana = await room_service.join_room(room.invite_code, "ana")
+        bea = await room_service.join_room(room.invite_code, "bea")
+        # This worker caches the graph, then another worker writes routes straight to the database
+        await routing_service.get_routing_graph(room.id)
+        bea_mic = (await memory_db.audio_sources.find_one({"participant_id": bea.id}))["id"]
+        ana_mic = (await memory_db.audio_sources.find_one({"participant_id": ana.id}))["id"]
+        await memory_db.routes.insert_many([
+            Route(room_id=room.id, type="audio", source_id=bea_mic, destinations=["obs_audio2"]).dict(),
+            Route(room_id=room.id, type="audio", source_id=ana_mic, destinations=[bea.id]).dict(),
+        ])
+
+        assert await room_service.leave_room(room.id, bea.id)
+
+        routes = await memory_db.routes.find({"room_id": room.id}).to_list(None)
+        assert routes, "ana's routes to OBS remain"
+        assert not [r for r in routes if r["source_id"] == bea_mic or bea.id in r["destinations"]]
+        graph = await routing_service.get_routing_graph(room.id)
+        assert bea.id not in graph.who_hears_whom()
+
+    asyncio.run(scenario())
@@ -0,0 +1,75 @@
+import asyncio
+
+from models import RoomCreate
+from services.room_service import room_service
+from services.routing_matrix import RoutingMatrixService, apply_ops, diff_documents
+
+
+def test_diff_then_apply_reproduces_the_new_section():
+    old = {"r1": {"id": "r1", "volume": 0.5, "label": "a"}, "r/2": {"id": "r/2", "volume": 1.0}}
+    new = {"r1": {"id": "r1", "volume": 0.8, "muted~": True}, "r3": {"id": "r3", "volume": 0.1}}
+    ops = diff_documents("routes", old, new)
+    assert {"op": "replace", "path": "/routes/r1/volume", "value": 0.8} in ops
+    assert {"op": "remove", "path": "/routes/r~12"} in ops
+    sections = {"routes": {key: dict(value) for key, value in old.items()}}
+    apply_ops(sections, ops)
+    assert sections["routes"] == new
+    apply_ops(sections, ops)  # patches are idempotent
+    assert sections["routes"] == new
+
+
+def seed_room():
+    async def create():
+        room = await room_service.create_room(RoomCreate(name="Studio"), "director")
+        await room_service.join_room(room.invite_code, "ana")
+        return room.id
+    return asyncio.run(create())
+
+
+def test_workers_share_epoch_version_and_patches(memory_db):
+    room_id = seed_room()
+
+    async def scenario():
+        first, second = RoutingMatrixService(), RoutingMatrixService()
+        snapshot = await first.get_snapshot(room_id)
+        # The first audio source is the room's background music, muted by default
+        assert (await second.get_snapshot(room_id))["epoch"] == snapshot["epoch"]
+        source_id = next(iter(snapshot["audio_sources"]))
+
+        await first.set_fields(room_id, [("audio_sources", source_id, {"volume": 0.25})])
+        await second.set_fields(room_id, [("audio_sources", source_id, {"is_muted": False})])
+
+        # A client of the first worker at version 1 reconnects to the second one, or to a restarted process
+        # (which loads the documents from the database, where the control channel writes them)
+        for worker in (second, first):
+            changes = await worker.get_changes(room_id, since=1, epoch=snapshot["epoch"])
+            assert "snapshot" not in changes and changes["version"] == 2
+            assert changes["patches"] == [{"version": 2, "ops": [
+                {"op": "replace", "path": f"/audio_sources/{source_id}/is_muted", "value": False}]}]
+            source = (await worker.get_snapshot(room_id))["audio_sources"][source_id]
+            assert source["volume"] == 0.25 and source["is_muted"] is False
+        restarted = await RoutingMatrixService().get_changes(room_id, since=1, epoch=snapshot["epoch"])
+        assert restarted["version"] == 2 and [p["version"] for p in restarted["patches"]] == [2]
+
+    asyncio.run(scenario())
+
+
+def test_clients_outside_the_history_or_epoch_get_a_snapshot(memory_db):
+    room_id = seed_room()
+
+    async def scenario():
+        worker = RoutingMatrixService(history_size=2)
+        snapshot = await worker.get_snapshot(room_id)
+        source_id = next(iter(snapshot["audio_sources"]))
+        for volume in (0.1, 0.2, 0.3):
+            await worker.set_fields(room_id, [("audio_sources", source_id, {"volume": volume})])
+
+        behind = await RoutingMatrixService(history_size=2).get_changes(room_id, since=0, epoch=snapshot["epoch"])
+        assert behind["snapshot"]["audio_sources"][source_id]["volume"] == 0.3
+        assert [p["version"] for p in (await worker.get_changes(room_id, 1, snapshot["epoch"]))["patches"]] == [2, 3]
+        assert "snapshot" in await worker.get_changes(room_id, 3, "another-epoch")
+
+        await worker.delete_room(room_id)
+        assert (await worker.get_snapshot(room_id))["epoch"] != snapshot["epoch"]
+
+    asyncio.run(scenario())
@@ -0,0 +1,33 @@
+import asyncio
+
+from models import SessionUpdate
+from services.session_service import session_service
+
+
+def test_changes_are_stored_as_literals(memory_db):
+    async def scenario():
+        await session_service.create_session("room")
+        session = await session_service._upsert("room", {"id": "$room_id"})
+        assert session.id == "$room_id"
+        stored = await memory_db.sessions.find_one({"room_id": "room"})
+        assert stored["id"] == "$room_id"
+
+    asyncio.run(scenario())
+
+
+def test_recording_state_and_timestamp_follow_updates_and_toggles(memory_db):
+    async def scenario():
+        session = await session_service.update_session("room", SessionUpdate(is_recording=True))
+        assert session.is_recording and session.recording_start_time is not None
+        assert not session.is_streaming and session.streaming_start_time is None
+
+        session = await session_service.toggle_recording("room")
+        assert not session.is_recording and session.recording_start_time is None
+
+        session = await session_service.toggle_recording("room")
+        assert session.is_recording and session.recording_start_time is not None
+
+        session = await session_service.stop_recording("room")
+        assert not session.is_recording and session.recording_start_time is None
+
+    asyncio.run(scenario())